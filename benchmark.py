@@ -0,0 +1,253 @@
+"""
+效能基準：產生合成平面圖，分別量測各階段耗時、三角形產出速度與峰值記憶體，
+輸出 JSON 作為基準線，並可與舊的基準線比較找出效能退步（不需要 Qt）
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from mesh_io import MESH_FORMATS, write_mesh
+from overlay import OverlayRenderer
+from pipeline import (
+    DEFAULT_SIMPLIFY_TOLERANCE, MESH_MODES, ContourCache, ContourIndex, calculate_contour_area, extrude_single_contour,
+    process_threshold, select_contours, threshold_contours, to_gray
+)
+from simplify import simplify_contours
+
+
+def generate_plan(rooms_x=8, rooms_y=6, room_size=200, wall=8, columns=2, seed=0):
+    """
+    合成平面圖（白底黑線）：牆圍出的房間（內洞）、門洞、房間內的空心柱（外輪廓 + 內洞）
+    與柱心的實心柱（巢狀外輪廓）
+    :param room_size: 房間邊長（像素），控制解析度
+    :param columns: 每個房間的柱子數，控制輪廓數量
+    :return: (H, W, 3) uint8 BGR 影像
+    """
+    rng = np.random.default_rng(seed)
+    margin = room_size // 4
+    height = rooms_y * room_size + 2 * margin + wall
+    width = rooms_x * room_size + 2 * margin + wall
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    black = (0, 0, 0)
+
+    # **牆：外框 + 格狀隔間**
+    for i in range(rooms_x + 1):
+        x = margin + i * room_size
+        cv2.rectangle(image, (x, margin), (x + wall - 1, margin + rooms_y * room_size + wall - 1), black, -1)
+    for j in range(rooms_y + 1):
+        y = margin + j * room_size
+        cv2.rectangle(image, (margin, y), (margin + rooms_x * room_size + wall - 1, y + wall - 1), black, -1)
+
+    # **門洞：隨機打通部分內牆（房間會合併成不規則的內洞）**
+    door = room_size // 4
+    for i in range(1, rooms_x):
+        for j in range(rooms_y):
+            if rng.random() < 0.3:
+                x = margin + i * room_size
+                y = margin + j * room_size + int(rng.integers(wall, room_size - door))
+                cv2.rectangle(image, (x, y), (x + wall - 1, y + door), (255, 255, 255), -1)
+
+    # **柱子：空心方柱，柱心再放一根實心柱**
+    column = max(room_size // 8, 6)
+    for i in range(rooms_x):
+        for j in range(rooms_y):
+            x0, y0 = margin + i * room_size + wall, margin + j * room_size + wall
+            for _ in range(columns):
+                cx = x0 + int(rng.integers(column, room_size - wall - 2 * column))
+                cy = y0 + int(rng.integers(column, room_size - wall - 2 * column))
+                cv2.rectangle(image, (cx, cy), (cx + column, cy + column), black, max(column // 6, 1))
+                inner = column // 3
+                cv2.rectangle(image, (cx + inner, cy + inner), (cx + column - inner, cy + column - inner), black, -1)
+    return image
+
+
+def _best_of(repeat, fn, *args, **kwargs):
+    """執行 repeat 次取最短時間，回傳 (秒數, 最後一次的結果)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _peak_memory(fn, *args, **kwargs):
+    """以 tracemalloc 量測一次呼叫的峰值記憶體（bytes，含 numpy 配置）"""
+    tracemalloc.start()
+    try:
+        result = fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, result
+
+
+def _extrude_all(contour_ids, contours, hierarchy, index, z_height, grid_size, mode):
+    return [extrude_single_contour(i, contours, hierarchy, z_height, grid_size, mode, index=index)
+            for i in contour_ids]
+
+
+def run_benchmark(image, threshold_value=200, min_contour_area=100, z_height=100, grid_size=10,
+                  modes=("surface", "exact"), formats=(".stl",), repeat=3):
+    """
+    分階段量測
+    :return: {"plan": 影像資訊, "stages": {階段: {"seconds": ..., ...}}}
+    """
+    stages = {}
+    height, width = image.shape[:2]
+
+    seconds, gray = _best_of(repeat, to_gray, image)
+    stages["gray"] = {"seconds": seconds}
+
+    seconds, (contours, hierarchy) = _best_of(repeat, threshold_contours, gray, threshold_value)
+    stages["threshold_find_contours"] = {"seconds": seconds, "contours": len(contours)}
+
+    seconds, index = _best_of(repeat, ContourIndex, contours, hierarchy)
+    stages["hierarchy_index"] = {"seconds": seconds}
+
+    seconds, (contour_dict, _) = _best_of(repeat, select_contours, contours, hierarchy, min_contour_area, index)
+    stages["select_contours"] = {"seconds": seconds, "outers": len(contour_dict)}
+
+    seconds, simplified = _best_of(repeat, simplify_contours, contours, index, DEFAULT_SIMPLIFY_TOLERANCE)
+    stages["simplify"] = {
+        "seconds": seconds,
+        "vertices": int(sum(len(c) for c in contours)),
+        "simplified_vertices": int(sum(len(c) for c in simplified)),
+    }
+
+    outer_ids = list(contour_dict)
+    seconds, _ = _best_of(repeat, lambda: [calculate_contour_area(i, contours, hierarchy, index) for i in outer_ids])
+    stages["calculate_contour_area"] = {"seconds": seconds, "calls": len(outer_ids)}
+
+    # **update_processing 的無 Qt 部分：冷快取下的 threshold 處理 + 疊圖**
+    def update_processing():
+        result = process_threshold(ContourCache(image), threshold_value, min_contour_area)
+        overlay = OverlayRenderer(image)
+        overlay.set_contours(result["contours"], result["contour_dict"], result["index"].bboxes)
+        return overlay.update({})
+
+    seconds, _ = _best_of(repeat, update_processing)
+    stages["update_processing"] = {"seconds": seconds}
+
+    overlay = OverlayRenderer(image)
+    overlay.set_contours(contours, contour_dict, index.bboxes)
+    overlay.update({})
+    toggled = outer_ids[len(outer_ids) // 2] if outer_ids else None
+    states = [{toggled: False}, {}]
+    seconds, _ = _best_of(repeat, lambda: [overlay.update(s) for s in states])
+    stages["overlay_toggle"] = {"seconds": seconds / 2}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in modes:
+            seconds, faces = _best_of(repeat, _extrude_all, outer_ids, contours, hierarchy, index,
+                                      z_height, grid_size, mode)
+            peak, _ = _peak_memory(_extrude_all, outer_ids, contours, hierarchy, index, z_height, grid_size, mode)
+            triangles = int(sum(len(f) for f in faces))
+            stages[f"extrude_{mode}"] = {
+                "seconds": seconds,
+                "triangles": triangles,
+                "triangles_per_second": triangles / seconds if seconds else 0.0,
+                "peak_bytes": peak,
+            }
+
+            for ext in formats:
+                path = os.path.join(tmp, f"bench_{mode}{ext}")
+                # **每個輪廓一批，與 GUI / CLI 的串流寫入相同**
+                seconds, count = _best_of(repeat, lambda: write_mesh(path, iter(faces)))
+                peak, _ = _peak_memory(write_mesh, path, iter(faces))
+                stages[f"write_{mode}_{ext.lstrip('.')}"] = {
+                    "seconds": seconds,
+                    "triangles": int(count),
+                    "triangles_per_second": count / seconds if seconds else 0.0,
+                    "peak_bytes": peak,
+                    "bytes": os.path.getsize(path),
+                }
+
+    return {
+        "plan": {"width": width, "height": height, "contours": len(contours), "outers": len(outer_ids)},
+        "stages": stages,
+    }
+
+
+def compare(report, baseline, tolerance=1.25):
+    """
+    與基準線比較各階段的 seconds
+    :return: [(階段, 舊秒數, 新秒數, 倍率)]，只列出慢於 tolerance 倍的階段
+    """
+    regressions = []
+    for name, stage in report["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old or not old.get("seconds"):
+            continue
+        ratio = stage["seconds"] / old["seconds"]
+        if ratio > tolerance:
+            regressions.append((name, old["seconds"], stage["seconds"], ratio))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the plan-to-mesh pipeline on synthetic floor plans.")
+    parser.add_argument("--rooms", type=int, nargs=2, default=(8, 6), metavar=("X", "Y"), help="room grid size")
+    parser.add_argument("--room-size", type=int, default=200, help="room edge length in pixels (resolution)")
+    parser.add_argument("--columns", type=int, default=2, help="hollow columns per room (contour count)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for doors and columns")
+    parser.add_argument("--grid-size", type=int, default=10, help="voxel grid size in pixels")
+    parser.add_argument("--modes", nargs="+", choices=MESH_MODES, default=["surface", "exact"], help="mesh modes")
+    parser.add_argument("--formats", nargs="+", choices=[ext.lstrip(".") for ext in MESH_FORMATS], default=["stl"],
+                        help="export formats")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage (best time is reported)")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against a previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown ratio against the baseline")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    image = generate_plan(args.rooms[0], args.rooms[1], args.room_size, columns=args.columns, seed=args.seed)
+    report = run_benchmark(image, grid_size=args.grid_size, modes=args.modes,
+                           formats=[f".{fmt}" for fmt in args.formats], repeat=max(1, args.repeat))
+    report["config"] = {
+        "rooms": list(args.rooms), "room_size": args.room_size, "columns": args.columns, "seed": args.seed,
+        "grid_size": args.grid_size, "repeat": args.repeat,
+    }
+    report["environment"] = {
+        "python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+        "machine": platform.machine(), "processor": platform.processor(),
+    }
+
+    plan = report["plan"]
+    print(f"Plan {plan['width']}x{plan['height']}, {plan['contours']} contours, {plan['outers']} outers")
+    for name, stage in report["stages"].items():
+        extra = ""
+        if "triangles_per_second" in stage:
+            extra = (f"  {stage['triangles']} tris, {stage['triangles_per_second'] / 1e6:.2f} Mtris/s, "
+                     f"peak {stage['peak_bytes'] / 2 ** 20:.1f} MiB")
+        print(f"{name:28s} {stage['seconds'] * 1000:10.2f} ms{extra}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, old, new, ratio in regressions:
+            print(f"REGRESSION {name}: {old * 1000:.2f} ms -> {new * 1000:.2f} ms ({ratio:.2f}x)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""批次轉換：不開 GUI，以多個行程平行處理大量平面圖"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import instrument
+from pipeline import DEFAULT_MIN_CELL_SIZE, DEFAULT_SIMPLIFY_TOLERANCE, MESH_MODES, convert_plan
+from tiles import RASTER_EXTENSIONS
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff") + RASTER_EXTENSIONS
+
+
+def collect_images(inputs):
+    """展開輸入：資料夾取其中所有圖片，其餘當作 glob 樣式"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(item, name))
+        else:
+            paths.extend(sorted(glob.glob(item)))
+    # **去除重複但保持順序**
+    return list(dict.fromkeys(paths))
+
+
+def output_path_for(image_path, output_dir, mesh_format):
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(output_dir or os.path.dirname(image_path), f"{name}.{mesh_format}")
+
+
+def parse_shape(text):
+    """解析 .raw 點陣形狀，例如 "20000x30000" 或 "20000x30000x3"（高 x 寬 [x 通道]）"""
+    try:
+        shape = tuple(int(v) for v in text.lower().split("x"))
+    except ValueError:
+        shape = ()
+    if len(shape) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"invalid raster shape: {text!r} (expected HxW or HxWxC)")
+    return shape
+
+
+def _init_worker(trace, log_level):
+    # **每個行程只用單執行緒的 OpenCV，避免和行程池搶 CPU**
+    import cv2
+    cv2.setNumThreads(1)
+    instrument.enable_tracing(trace)
+    if log_level:
+        instrument.configure_logging(log_level)
+
+
+def _convert(image_path, output_path, options):
+    """子行程執行的工作，錯誤轉成狀態回傳，不讓單張圖中斷整批（trace 開啟時一併送回 span）"""
+    try:
+        result, error = convert_plan(image_path, output_path, **options), None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    return image_path, output_path, result, error, instrument.recorder.drain()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert floor-plan images to extruded meshes.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", help="output directory (default: next to each image)")
+    parser.add_argument("-t", "--threshold", type=int, default=200, help="binary threshold (0-255)")
+    parser.add_argument("--min-area", type=float, default=100, help="minimum contour area in pixels")
+    parser.add_argument("--simplify", type=float, default=DEFAULT_SIMPLIFY_TOLERANCE,
+                        help="contour simplification tolerance in pixels (0 disables)")
+    parser.add_argument("--height", type=float, default=100, help="extrusion height")
+    parser.add_argument("--grid-size", type=int, default=10, help="voxel grid size in pixels")
+    parser.add_argument("--mode", choices=MESH_MODES, default="surface", help="mesh mode")
+    parser.add_argument("--min-cell-size", type=float, default=DEFAULT_MIN_CELL_SIZE,
+                        help="smallest boundary cell in pixels (quadtree mode; --grid-size is the largest)")
+    parser.add_argument("--format", choices=("stl", "ply", "obj"), default="stl", help="output mesh format")
+    parser.add_argument("--no-base", action="store_true", help="do not fill the base (exact mode)")
+    parser.add_argument("--no-top", action="store_true", help="do not fill the top (exact mode)")
+    parser.add_argument("--tile-size", type=int, help="process in memory-mapped tiles of this size "
+                                                      "(always used for .npy/.raw rasters)")
+    parser.add_argument("--raw-shape", type=parse_shape, help="shape of .raw rasters, HxW or HxWxC (uint8)")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"), help="enable logging to stderr")
+    parser.add_argument("--trace", help="write timing spans of all workers to this file")
+    parser.add_argument("--trace-format", choices=instrument.TRACE_FORMATS, default="chrome",
+                        help="trace file format (Chrome trace or plain span list)")
+    parser.add_argument("--cache-dir", help="persistent cache directory; plans already converted with the same "
+                                            "parameters are copied from it instead of recomputed")
+    parser.add_argument("--extrude-jobs", type=int, default=1,
+                        help="worker processes for extruding the contours of one plan (useful for few large plans)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.log_level:
+        instrument.configure_logging(args.log_level)
+    if args.trace:
+        instrument.enable_tracing()
+
+    images = collect_images(args.inputs)
+    if not images:
+        print("No images found.", file=sys.stderr)
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    options = {
+        "threshold_value": args.threshold,
+        "min_contour_area": args.min_area,
+        "simplify_tolerance": args.simplify,
+        "z_height": args.height,
+        "grid_size": args.grid_size,
+        "mode": args.mode,
+        "min_cell_size": args.min_cell_size,
+        "workers": args.extrude_jobs,
+        "cache_dir": args.cache_dir,
+        "fill_base": not args.no_base,
+        "fill_top": not args.no_top,
+        "tile_size": args.tile_size,
+        "raster_shape": args.raw_shape,
+    }
+
+    start = time.perf_counter()
+    failures = 0
+    total_facets = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=_init_worker,
+                             initargs=(instrument.recorder.enabled, args.log_level)) as pool:
+        futures = [
+            pool.submit(_convert, path, output_path_for(path, args.output_dir, args.format), options)
+            for path in images
+        ]
+        for future in as_completed(futures):
+            image_path, output_path, result, error, spans = future.result()
+            instrument.recorder.extend(spans)
+            if error:
+                failures += 1
+                print(f"FAIL {image_path}: {error}")
+            else:
+                total_facets += result["facets"]
+                print(f"OK   {image_path} -> {output_path} "
+                      f"({result['contours']} contours, {result['facets']} facets, {result['seconds']:.2f}s"
+                      f"{', cached' if result['cached'] else ''})")
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(images) - failures}/{len(images)} converted, {total_facets} facets, {elapsed:.2f}s total")
+    if args.trace:
+        count = instrument.save_trace(args.trace, args.trace_format)
+        print(f"Trace: {count} spans -> {args.trace}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
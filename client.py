@@ -0,0 +1,175 @@
+"""
+轉換服務（server.py）的用戶端，只用標準函式庫，不必載入 cv2：上傳圖片、把回傳的網格串流寫入檔案，
+服務回 503（佇列已滿）時依 Retry-After 等待後重試
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+DEFAULT_RETRIES = 10
+CHUNK_SIZE = 256 * 1024
+
+
+class ServiceError(Exception):
+    """服務回傳錯誤"""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+def _error_message(error):
+    try:
+        return json.loads(error.read())["error"]
+    except (ValueError, KeyError, TypeError):
+        return error.reason
+
+
+def convert_remote(url, image_path, output_path, retries=DEFAULT_RETRIES, timeout=None, **params):
+    """
+    請服務轉換一張圖，網格寫到 output_path（格式依副檔名），寫完才取代既有的檔案
+    :param params: 查詢參數（threshold、min_area、simplify、height、grid_size、mode、min_cell_size、fill_base、fill_top），
+                   None 表示用服務的預設值
+    :param retries: 佇列已滿（503）時最多重試幾次
+    :return: {"contours", "facets", "seconds"（服務端轉換時間）, "cached", "retries"}；失敗時拋出 ServiceError
+    """
+    query = {name: int(value) if isinstance(value, bool) else value
+             for name, value in params.items() if value is not None}
+    query["format"] = os.path.splitext(output_path)[1].lstrip(".").lower() or "stl"
+    size = os.path.getsize(image_path)
+
+    for attempt in range(retries + 1):
+        with open(image_path, "rb") as body:
+            request = Request(f"{url.rstrip('/')}/convert?{urlencode(query)}", data=body, method="POST",
+                              headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)})
+            try:
+                response = urlopen(request, timeout=timeout)
+            except HTTPError as e:
+                with e:
+                    if e.code == 503 and attempt < retries:
+                        time.sleep(float(e.headers.get("Retry-After") or 1))
+                        continue
+                    raise ServiceError(e.code, _error_message(e)) from None
+        with response:
+            _save_stream(response, output_path)
+            headers = response.headers
+        return {
+            "contours": int(headers["X-Plan2Mesh-Contours"]),
+            "facets": int(headers["X-Plan2Mesh-Facets"]),
+            "seconds": float(headers["X-Plan2Mesh-Seconds"]),
+            "cached": headers["X-Plan2Mesh-Cached"] == "1",
+            "retries": attempt,
+        }
+
+
+def _save_stream(response, output_path):
+    """回應內容分塊寫進同資料夾的暫存檔，讀完才改名（中斷時不留下半個檔案）"""
+    directory, name = os.path.split(os.path.abspath(output_path))
+    # **以 0666 建立，權限由 umask 決定（mkstemp 固定是 0600，改名後會沿用）**
+    tmp = os.path.join(directory, f".{name}-{uuid.uuid4().hex[:8]}")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+        os.replace(tmp, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def fetch_stats(url, timeout=None):
+    """:return: 服務的 /stats（計數、吞吐量與延遲）"""
+    with urlopen(f"{url.rstrip('/')}/stats", timeout=timeout) as response:
+        return json.load(response)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert floor-plan images through a running conversion server.")
+    parser.add_argument("inputs", nargs="*", help="image files or glob patterns")
+    parser.add_argument("--url", default=DEFAULT_URL, help="server address")
+    parser.add_argument("-o", "--output-dir", help="output directory (default: next to each image)")
+    parser.add_argument("-t", "--threshold", type=int, help="binary threshold (0-255)")
+    parser.add_argument("--min-area", type=float, help="minimum contour area in pixels")
+    parser.add_argument("--simplify", type=float, help="contour simplification tolerance in pixels (0 disables)")
+    parser.add_argument("--height", type=float, help="extrusion height")
+    parser.add_argument("--grid-size", type=int, help="voxel grid size in pixels")
+    parser.add_argument("--mode", help="mesh mode")
+    parser.add_argument("--min-cell-size", type=float, help="smallest boundary cell in pixels (quadtree mode)")
+    parser.add_argument("--format", choices=("stl", "ply", "obj"), default="stl", help="output mesh format")
+    parser.add_argument("--no-base", action="store_true", help="do not fill the base (exact mode)")
+    parser.add_argument("--no-top", action="store_true", help="do not fill the top (exact mode)")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="concurrent requests")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="retries when the server queue is full")
+    parser.add_argument("--stats", action="store_true", help="print the server statistics afterwards")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    images = list(dict.fromkeys(path for item in args.inputs for path in sorted(glob.glob(item))))
+    if not images and not args.stats:
+        print("No images found.", file=sys.stderr)
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    params = {
+        "threshold": args.threshold,
+        "min_area": args.min_area,
+        "simplify": args.simplify,
+        "height": args.height,
+        "grid_size": args.grid_size,
+        "mode": args.mode,
+        "min_cell_size": args.min_cell_size,
+        "fill_base": False if args.no_base else None,
+        "fill_top": False if args.no_top else None,
+    }
+
+    def convert(image_path):
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        output_path = os.path.join(args.output_dir or os.path.dirname(image_path), f"{name}.{args.format}")
+        start = time.perf_counter()
+        try:
+            result, error = convert_remote(args.url, image_path, output_path, args.retries, **params), None
+        except (ServiceError, OSError) as e:
+            result, error = None, str(e)
+        return image_path, output_path, result, error, time.perf_counter() - start
+
+    start = time.perf_counter()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        for image_path, output_path, result, error, seconds in pool.map(convert, images):
+            if error:
+                failures += 1
+                print(f"FAIL {image_path}: {error}")
+            else:
+                print(f"OK   {image_path} -> {output_path} "
+                      f"({result['contours']} contours, {result['facets']} facets, {seconds:.2f}s"
+                      f"{', cached' if result['cached'] else ''}"
+                      f"{', %d retries' % result['retries'] if result['retries'] else ''})")
+
+    if images:
+        print(f"{len(images) - failures}/{len(images)} converted, {time.perf_counter() - start:.2f}s total")
+    if args.stats:
+        print(json.dumps(fetch_stats(args.url), indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""輪廓列表的 Model：可勾選、以 role 取得輪廓 ID，輪廓改變時只套用差異"""
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSize, Qt, pyqtSignal
+
+CONTOUR_ID_ROLE = Qt.UserRole + 1
+ROW_HEIGHT = 25
+
+
+class ContourListModel(QAbstractListModel):
+    """
+    每列是一個外輪廓（含其內洞），文字與勾選狀態在 view 要畫時才產生，
+    搭配 setUniformItemSizes 的 QListView，列數再多每次重繪的成本也固定
+    """
+
+    check_state_changed = pyqtSignal(int, int)  # (contour_id, Qt.CheckState)
+
+    def __init__(self, checkbox_states, parent=None):
+        """
+        :param checkbox_states: 與 UI 共用的 {contour_id: True/False}，勾選時直接更新
+        """
+        super().__init__(parent)
+        self.checkbox_states = checkbox_states
+        self._ids = []  # 列 → 外輪廓 ID
+        self._holes = {}  # {外輪廓: [內洞列表]}
+        self._vertices = None  # (簡化前, 簡化後) 各輪廓頂點數，None 時不顯示
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._ids):
+            return None
+        contour_id = self._ids[index.row()]
+        if role == Qt.DisplayRole:
+            holes = self._holes[contour_id]
+            text = f"Contour = {contour_id}, Holes = [{', '.join(map(str, holes))}]" if holes else f"Contour = {contour_id}"
+            if self._vertices is not None:
+                group = [contour_id] + holes
+                before, after = (int(counts[group].sum()) for counts in self._vertices)
+                text += f" (V: {before} → {after})"
+            return text
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checkbox_states.get(contour_id, True) else Qt.Unchecked
+        if role == CONTOUR_ID_ROLE:
+            return contour_id
+        if role == Qt.SizeHintRole:
+            return QSize(0, ROW_HEIGHT)
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        contour_id = self._ids[index.row()]
+        state = Qt.Checked if value == Qt.Checked else Qt.Unchecked
+        self.checkbox_states[contour_id] = state == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.check_state_changed.emit(contour_id, state)
+        return True
+
+    def set_contours(self, contour_dict, vertex_counts=None):
+        """
+        換成新的輪廓組：保留前後相同的列，只移除 / 插入中間不同的部分，
+        內洞改變的列只發出 dataChanged
+        :param vertex_counts: (簡化前, 簡化後) 各輪廓頂點數，顯示在每列文字後
+        """
+        new_ids = list(contour_dict)
+        old_ids = self._ids
+
+        # **頭尾相同的列不動**
+        limit = min(len(old_ids), len(new_ids))
+        head = 0
+        while head < limit and old_ids[head] == new_ids[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old_ids[-1 - tail] == new_ids[-1 - tail]:
+            tail += 1
+
+        changed_rows = [row for row in range(head) if self._holes[old_ids[row]] != contour_dict[new_ids[row]]]
+        changed_rows += [len(new_ids) - 1 - i for i in range(tail)
+                         if self._holes[old_ids[-1 - i]] != contour_dict[new_ids[-1 - i]]]
+
+        if len(old_ids) - tail > head:
+            self.beginRemoveRows(QModelIndex(), head, len(old_ids) - tail - 1)
+            self._ids = old_ids[:head] + old_ids[len(old_ids) - tail:]
+            self.endRemoveRows()
+        self._holes = contour_dict
+        if len(new_ids) - tail > head:
+            self.beginInsertRows(QModelIndex(), head, len(new_ids) - tail - 1)
+            self._ids = new_ids
+            self.endInsertRows()
+        self._ids = new_ids
+
+        # **頂點數改變時整個列表的文字都可能不同**
+        old_vertices, self._vertices = self._vertices, vertex_counts
+        if (old_vertices is not vertex_counts) and new_ids:
+            self.dataChanged.emit(self.index(0), self.index(len(new_ids) - 1), [Qt.DisplayRole])
+            return
+        for row in changed_rows:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
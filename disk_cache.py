@@ -0,0 +1,249 @@
+"""
+持久化快取：輪廓、勾選狀態與輸出過的網格檔存到快取資料夾，
+以圖片內容雜湊 + 處理參數為 key，重開同一張圖不必重算、重新輸出只是複製檔案；
+總大小超過上限時刪除最久沒用到的檔案（LRU，以檔案修改時間記錄最後使用）
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+from instrument import get_logger, span
+
+CACHE_VERSION = 1  # 快取內容的格式或演算法改變時遞增，舊的項目自然不再命中
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+MAX_ENTRY_FRACTION = 0.25  # 單一檔案超過上限的這個比例就不存，避免一個大網格把其他項目全部擠掉
+HASH_BAND_ROWS = 1024  # 計算雜湊時每次讀取的列數
+
+log = get_logger("cache")
+
+
+def default_cache_dir():
+    """PLAN2MESH_CACHE_DIR，否則為 $XDG_CACHE_HOME/plan2mesh（預設 ~/.cache/plan2mesh）"""
+    path = os.environ.get("PLAN2MESH_CACHE_DIR")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "plan2mesh")
+
+
+def image_hash(image):
+    """
+    圖片像素內容的雜湊（形狀與型別也計入），與檔名、壓縮格式無關；
+    逐條帶讀取，記憶體映射的大點陣也不會整張載入
+    """
+    with span("image_hash", shape=image.shape[:2]):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{image.shape}{image.dtype}".encode())
+        for top in range(0, image.shape[0], HASH_BAND_ROWS):
+            h.update(np.ascontiguousarray(image[top:top + HASH_BAND_ROWS]).data)
+        return h.hexdigest()
+
+
+def params_key(**params):
+    """處理參數的雜湊；數值一律當 float，100 與 100.0 視為相同"""
+    normalized = {name: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+                  for name, value in params.items()}
+    text = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{CACHE_VERSION}:{text}".encode(), digest_size=8).hexdigest()
+
+
+class DiskCache:
+    """
+    快取資料夾中的每個項目是一個檔案：
+        <圖片雜湊>-contours-<參數>.npz   輪廓點（串接）、各輪廓長度與 hierarchy
+        <圖片雜湊>-session.npz           上次的 threshold、簡化容差與勾選狀態
+        <圖片雜湊>-mesh-<參數>.<格式>     輸出過的網格檔（與 .json 的輪廓數 / 面片數成對）
+    寫入先寫暫存檔再改名，多執行緒同時讀寫也不會讀到一半的檔案
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, image_key, kind, ext, params=None):
+        suffix = f"-{params_key(**params)}" if params is not None else ""
+        return os.path.join(self.directory, f"{image_key}-{kind}{suffix}{ext}")
+
+    @staticmethod
+    def _touch(path):
+        """命中時更新修改時間，LRU 淘汰依此排序"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _entry(path):
+        """同一個項目的檔案（網格的各種格式與它的 .json）一起保留、一起淘汰"""
+        return os.path.splitext(path)[0]
+
+    def _too_large(self, size):
+        return size > self.max_bytes * MAX_ENTRY_FRACTION
+
+    def _write(self, path, write, evict=True):
+        """
+        write(f) 寫入暫存檔後原子地換上，再檢查總大小（不淘汰剛寫入的項目）
+        :return: 是否寫入（太大時不存）
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            size = os.path.getsize(tmp)
+            if self._too_large(size):
+                os.unlink(tmp)
+                log.debug("Not caching %s (%d bytes)", os.path.basename(path), size)
+                return False
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        if evict:
+            self.evict(keep=self._entry(path))
+        return True
+
+    def _entries(self):
+        """[(修改時間, 大小, 路徑)]，不含寫入中的暫存檔"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # **其他執行緒剛刪除**
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @property
+    def nbytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """
+        總大小超過 max_bytes 時由最久沒用到的項目開始刪除（同一項目的檔案一起刪）
+        :param keep: 不刪除的項目（剛寫入的）
+        """
+        with self._lock:
+            entries = {}  # {項目: (最後使用時間, 總大小, [路徑])}
+            for mtime, size, path in self._entries():
+                last, total, paths = entries.get(self._entry(path), (0, 0, []))
+                entries[self._entry(path)] = (max(last, mtime), total + size, paths + [path])
+            total = sum(size for _, size, _ in entries.values())
+            for entry, (_, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+                if total <= self.max_bytes:
+                    break
+                if entry == keep:
+                    continue
+                for path in paths:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                total -= size
+                log.debug("Evicted %s (%d bytes)", os.path.basename(entry), size)
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def load_contours(self, image_key, **params):
+        """
+        :param params: 產生輪廓的參數（threshold、簡化容差 ...）
+        :return: (contours, hierarchy)，沒有或檔案損壞時回傳 None
+        """
+        path = self._path(image_key, "contours", ".npz", params)
+        try:
+            with span("disk_cache_load", kind="contours"), np.load(path) as data:
+                points, lengths = data["points"], data["lengths"]
+                hierarchy = data["hierarchy"] if len(lengths) else None
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+        self._touch(path)
+        contours = tuple(np.split(points.reshape(-1, 1, 2), np.cumsum(lengths)[:-1])) if len(lengths) else ()
+        return contours, hierarchy
+
+    def save_contours(self, image_key, contours, hierarchy, **params):
+        path = self._path(image_key, "contours", ".npz", params)
+        lengths = np.array([len(c) for c in contours], dtype=np.int64)
+        points = (np.concatenate([c.reshape(-1, 2) for c in contours]).astype(np.int32) if len(contours)
+                  else np.empty((0, 2), dtype=np.int32))
+        hierarchy = hierarchy if hierarchy is not None else np.empty((0, 4), dtype=np.int32)
+        with span("disk_cache_save", kind="contours"):
+            self._write(path, lambda f: np.savez(f, points=points, lengths=lengths, hierarchy=hierarchy))
+
+    def load_session(self, image_key):
+        """:return: {"threshold", "tolerance", "checkbox_states"}，沒有時回傳 None"""
+        path = self._path(image_key, "session", ".npz")
+        try:
+            with np.load(path) as data:
+                session = {
+                    "threshold": int(data["threshold"]),
+                    "tolerance": float(data["tolerance"]),
+                    "checkbox_states": dict(zip(data["ids"].tolist(), data["checked"].tolist())),
+                }
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+        self._touch(path)
+        return session
+
+    def save_session(self, image_key, threshold_value, tolerance, checkbox_states):
+        path = self._path(image_key, "session", ".npz")
+        ids = np.fromiter(checkbox_states.keys(), dtype=np.int64, count=len(checkbox_states))
+        checked = np.fromiter(checkbox_states.values(), dtype=bool, count=len(checkbox_states))
+        self._write(path, lambda f: np.savez(f, threshold=threshold_value, tolerance=tolerance, ids=ids,
+                                             checked=checked))
+
+    def copy_mesh(self, image_key, output_path, **params):
+        """
+        已輸出過相同參數的網格時，直接複製到 output_path
+        :param params: 影響網格內容的所有參數（含選取的輪廓）
+        :return: {"contours", "facets"}；沒有時回傳 None
+        """
+        ext = os.path.splitext(output_path)[1].lower()
+        path = self._path(image_key, "mesh", ext, params)
+        info_path = self._path(image_key, "mesh", ".json", params)
+        try:
+            with open(info_path) as f:
+                info = json.load(f)
+            with span("disk_cache_copy", path=output_path):
+                shutil.copyfile(path, output_path)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        self._touch(info_path)
+        return info
+
+    def store_mesh(self, image_key, mesh_path, contours, facets, **params):
+        """
+        把剛輸出的網格檔複製進快取（與 copy_mesh 使用相同的參數）；網格與 .json 成對寫入，寫完才淘汰
+        :return: 是否存入（網格檔太大時不存）
+        """
+        if self._too_large(os.path.getsize(mesh_path)):
+            log.debug("Not caching mesh %s (too large for the cache)", mesh_path)
+            return False
+        ext = os.path.splitext(mesh_path)[1].lower()
+        path = self._path(image_key, "mesh", ext, params)
+        info = json.dumps({"contours": contours, "facets": facets}).encode()
+        with open(mesh_path, "rb") as src:
+            if not self._write(path, lambda f: shutil.copyfileobj(src, f), evict=False):
+                return False
+        # **先有網格才寫 .json：copy_mesh 以 .json 判斷是否命中**
+        self._write(self._path(image_key, "mesh", ".json", params), lambda f: f.write(info), evict=False)
+        self.evict(keep=self._entry(path))
+        return True
@@ -0,0 +1,147 @@
+"""
+背景輸出網格：逐個輪廓拉伸並串流寫入暫存檔，完成後才換成輸出檔，
+進度以格列（輪廓外框高度 / 格子大小）計算，取消時刪除寫到一半的檔案
+"""
+import os
+import threading
+import uuid
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from instrument import get_logger, span
+from mesh_io import write_mesh
+from pipeline import DEFAULT_MIN_CELL_SIZE, ContourIndex, iter_extruded_faces
+
+PROGRESS_STEPS = 1000  # 進度訊號最多送出的次數（千分比改變時才送）
+
+log = get_logger("export")
+
+
+class ExportCancelled(Exception):
+    """輸出被取消"""
+
+
+def cell_rows(contour_ids, index, grid_size):
+    """各輪廓的格列數（外框高度 / 格子大小，至少 1），作為進度的權重"""
+    heights = index.bboxes[list(contour_ids), 3] if len(contour_ids) else []
+    return [max(1, -(-int(h) // grid_size)) for h in heights]
+
+
+def export_mesh(output_path, contour_ids, contours, hierarchy, z_height, grid_size, mode="surface", fill_base=True,
+                fill_top=True, index=None, min_cell_size=DEFAULT_MIN_CELL_SIZE, workers=1, progress=None,
+                is_cancelled=None):
+    """
+    拉伸 contour_ids 並寫入 output_path（格式依副檔名），寫完才取代既有的檔案
+    :param workers: > 1 時由行程池平行拉伸（輸出相同）
+    :param progress: progress(完成的格列, 總格列, 完成的輪廓數)，每個輪廓完成後呼叫
+    :param is_cancelled: 每個輪廓開始前檢查，回傳 True 時停止並刪除暫存檔，拋出 ExportCancelled
+    :return: 寫入的面片數
+    """
+    if index is None:
+        index = ContourIndex(contours, hierarchy)
+    contour_ids = list(contour_ids)
+    weights = cell_rows(contour_ids, index, grid_size)
+    total = sum(weights)
+
+    if workers > 1:
+        from parallel import iter_extruded_faces_parallel  # **parallel 依賴 pipeline，只在需要時載入**
+        faces = iter_extruded_faces_parallel(contour_ids, contours, hierarchy, z_height, grid_size, mode,
+                                             fill_base, fill_top, index, min_cell_size, workers)
+    else:
+        faces = iter_extruded_faces(contour_ids, contours, hierarchy, z_height, grid_size, mode, fill_base, fill_top,
+                                    index, min_cell_size)
+
+    def tracked():
+        done = 0
+        for k, weight in enumerate(weights):
+            if is_cancelled is not None and is_cancelled():
+                raise ExportCancelled(output_path)
+            yield next(faces)
+            done += weight
+            if progress is not None:
+                progress(done, total, k + 1)
+
+    # **暫存檔與輸出檔在同一個資料夾（同一個檔案系統才能直接改名），副檔名相同以決定格式**
+    directory, name = os.path.split(os.path.abspath(output_path))
+    stem, ext = os.path.splitext(name)
+    # **以 0666 建立，權限由 umask 決定，與一般新建的檔案相同（mkstemp 固定是 0600，改名後會沿用）**
+    tmp = os.path.join(directory, f".{stem}-{uuid.uuid4().hex[:8]}{ext}")
+    os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+    try:
+        with span("export", mode=mode, contours=len(contour_ids), workers=workers):
+            count = write_mesh(tmp, tracked())
+        os.replace(tmp, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    finally:
+        faces.close()  # **提早結束時關掉行程池**
+    return count
+
+
+class ExportJob(QThread):
+    """
+    在背景執行 export_mesh；輪廓與參數在建立時就固定，UI 之後的編輯不影響這次輸出
+    """
+
+    progress = pyqtSignal(int, int, int)  # (完成的格列, 總格列, 完成的輪廓數)
+    succeeded = pyqtSignal(str, int)  # (輸出路徑, 面片數)
+    failed = pyqtSignal(str, str)  # (輸出路徑, 錯誤訊息)
+    cancelled = pyqtSignal(str)  # 輸出路徑
+
+    def __init__(self, output_path, contour_ids, contours, hierarchy, options, index=None, parent=None):
+        """
+        :param options: export_mesh 的其他參數（z_height、grid_size、mode ...）
+        """
+        super().__init__(parent)
+        self.output_path = output_path
+        self.contour_ids = list(contour_ids)
+        self.contours = contours
+        self.hierarchy = hierarchy
+        self.index = index
+        self.options = options
+        self._cancel = threading.Event()
+        self._reported = -1
+        self._cache = None  # (DiskCache, 圖片雜湊, 網格參數)
+
+    def cache_result(self, disk_cache, image_key, mesh_params):
+        """
+        輸出成功後在背景執行緒把網格檔複製進持久化快取（大檔複製不佔用 UI 執行緒）
+        :param mesh_params: copy_mesh / store_mesh 的參數（含 contour_ids）
+        """
+        self._cache = (disk_cache, image_key, mesh_params)
+
+    def cancel(self):
+        """要求取消（目前的輪廓做完後停止）"""
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def _report(self, done, total, contours_done):
+        # **只在千分比改變時送出，輪廓很多時不塞滿 UI 的事件佇列**
+        step = done * PROGRESS_STEPS // max(total, 1)
+        if step != self._reported:
+            self._reported = step
+            self.progress.emit(done, total, contours_done)
+
+    def run(self):
+        try:
+            count = export_mesh(self.output_path, self.contour_ids, self.contours, self.hierarchy,
+                                index=self.index, progress=self._report, is_cancelled=self._cancel.is_set,
+                                **self.options)
+        except ExportCancelled:
+            self.cancelled.emit(self.output_path)
+        except Exception as e:
+            self.failed.emit(self.output_path, f"{type(e).__name__}: {e}")
+        else:
+            self.succeeded.emit(self.output_path, count)
+            if self._cache is not None:
+                disk_cache, image_key, mesh_params = self._cache
+                try:
+                    disk_cache.store_mesh(image_key, self.output_path, len(self.contour_ids), count, **mesh_params)
+                except OSError as e:
+                    log.warning("Could not write mesh cache: %s", e)
@@ -0,0 +1,195 @@
+"""
+影像顯示：只以視窗大小繪製（裁切可見範圍後縮放進預先配置的緩衝區），
+緩衝區直接包成 BGR888 的 QImage 畫出，不轉 RGB、不建整張圖的 QPixmap；支援滾輪縮放與拖曳平移
+"""
+import cv2
+import numpy as np
+from PyQt5.QtCore import QPoint, Qt
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from instrument import span
+
+MAX_ZOOM = 64.0  # 相對於「整張圖剛好放進視窗」的最大放大倍率
+ZOOM_STEP = 1.25  # 滾輪每一格的縮放倍率
+BACKGROUND = (48, 48, 48)  # 圖片以外區域的顏色 (BGR)
+
+
+class Viewport:
+    """
+    視窗與圖片座標的換算（不依賴 Qt）：zoom = 1 時整張圖等比例放進視窗，
+    center 為視窗中心對應的原圖座標；render 只讀取可見範圍、輸出視窗大小的影像
+    """
+
+    def __init__(self):
+        self.image_size = (0, 0)  # 原圖 (寬, 高)
+        self.view_size = (1, 1)  # 視窗 (寬, 高)
+        self.zoom = 1.0
+        self.center = (0.0, 0.0)
+        self.buffer = None  # **視窗大小的輸出緩衝區，只在視窗大小改變時重新配置**
+
+    def set_image_size(self, width, height):
+        """換圖（大小不同）時回到整張圖的檢視"""
+        if (width, height) != self.image_size:
+            self.image_size = (width, height)
+            self.reset()
+
+    def set_view_size(self, width, height):
+        self.view_size = (max(int(width), 1), max(int(height), 1))
+        if self.buffer is None or self.buffer.shape[:2] != (self.view_size[1], self.view_size[0]):
+            self.buffer = np.empty((self.view_size[1], self.view_size[0], 3), dtype=np.uint8)
+        self._clamp()
+
+    def reset(self):
+        """回到整張圖的檢視"""
+        self.zoom = 1.0
+        self.center = (self.image_size[0] / 2, self.image_size[1] / 2)
+        self._clamp()
+
+    @property
+    def scale(self):
+        """視窗像素 / 原圖像素"""
+        (iw, ih), (vw, vh) = self.image_size, self.view_size
+        if not iw or not ih:
+            return 1.0
+        return min(vw / iw, vh / ih) * self.zoom
+
+    def to_image(self, x, y):
+        """視窗座標 → 原圖座標"""
+        scale = self.scale
+        return (self.center[0] + (x - self.view_size[0] / 2) / scale,
+                self.center[1] + (y - self.view_size[1] / 2) / scale)
+
+    def zoom_at(self, x, y, factor):
+        """以視窗座標 (x, y) 為定點縮放"""
+        ix, iy = self.to_image(x, y)
+        self.zoom = min(max(self.zoom * factor, 1.0), MAX_ZOOM)
+        scale = self.scale
+        self.center = (ix - (x - self.view_size[0] / 2) / scale, iy - (y - self.view_size[1] / 2) / scale)
+        self._clamp()
+
+    def pan(self, dx, dy):
+        """依視窗像素位移平移（拖曳方向與圖片移動方向相同）"""
+        scale = self.scale
+        self.center = (self.center[0] - dx / scale, self.center[1] - dy / scale)
+        self._clamp()
+
+    def _clamp(self):
+        """可見範圍不超出圖片；圖片比視窗小的方向置中"""
+        scale = self.scale
+        center = []
+        for c, image, view in zip(self.center, self.image_size, self.view_size):
+            half = view / (2 * scale)
+            center.append(image / 2 if 2 * half >= image else min(max(c, half), image - half))
+        self.center = tuple(center)
+
+    def render(self, image, image_scale=1):
+        """
+        把 image 的可見範圍縮放進緩衝區（最近鄰，成本只與視窗大小有關）
+        :param image: (H, W, 3) BGR；可以是縮小的預覽圖
+        :param image_scale: 原圖像素 / image 像素（預覽層級為 2 ** level）
+        :return: 緩衝區 (view_h, view_w, 3)
+        """
+        vw, vh = self.view_size
+        scale = self.scale
+        x0, y0 = self.to_image(0, 0)
+
+        # **可見範圍（原圖座標）與圖片的交集，換成 image 的整數像素範圍**
+        height, width = image.shape[:2]
+        sx0, sy0 = max(int(x0 / image_scale), 0), max(int(y0 / image_scale), 0)
+        sx1 = min(int(np.ceil((x0 + vw / scale) / image_scale)), width)
+        sy1 = min(int(np.ceil((y0 + vh / scale) / image_scale)), height)
+
+        # **交集在視窗中的位置**
+        dx0 = max(int(round((sx0 * image_scale - x0) * scale)), 0)
+        dy0 = max(int(round((sy0 * image_scale - y0) * scale)), 0)
+        dx1 = min(int(round((sx1 * image_scale - x0) * scale)), vw)
+        dy1 = min(int(round((sy1 * image_scale - y0) * scale)), vh)
+
+        if sx1 <= sx0 or sy1 <= sy0 or dx1 <= dx0 or dy1 <= dy0:
+            self.buffer[:] = BACKGROUND
+            return self.buffer
+        if dx0 > 0 or dy0 > 0 or dx1 < vw or dy1 < vh:
+            self.buffer[:] = BACKGROUND
+        cv2.resize(image[sy0:sy1, sx0:sx1], (dx1 - dx0, dy1 - dy0), dst=self.buffer[dy0:dy1, dx0:dx1],
+                   interpolation=cv2.INTER_NEAREST)
+        return self.buffer
+
+
+class ImageView(QWidget):
+    """
+    顯示影像的元件：set_image 只標記需要重畫，實際繪製在 paintEvent（連續多次更新只畫一次）；
+    滾輪縮放、左鍵拖曳平移、雙擊回到整張圖
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.viewport = Viewport()
+        self.image = None
+        self.image_scale = 1
+        self._qimage = None  # **包住 viewport.buffer 的 QImage（共用記憶體）**
+        self._drag_origin = None
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setMinimumSize(1, 1)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def set_image(self, image, image_scale=1):
+        """
+        :param image: (H, W, 3) BGR，顯示時才讀取（呼叫後不可在背景執行緒修改）
+        :param image_scale: 原圖像素 / image 像素，預覽圖與原圖共用同一個檢視範圍
+        """
+        self.image = image
+        self.image_scale = image_scale
+        height, width = image.shape[:2]
+        # **預覽圖放大回原圖大小時可能差一個像素，只在差距超過一個預覽像素時才視為換圖**
+        iw, ih = self.viewport.image_size
+        if abs(iw - width * image_scale) >= image_scale or abs(ih - height * image_scale) >= image_scale:
+            self.viewport.set_image_size(width * image_scale, height * image_scale)
+        self.update()
+
+    def _buffer_image(self):
+        """視窗大小改變時重新配置緩衝區與包住它的 QImage"""
+        buffer = self.viewport.buffer
+        self.viewport.set_view_size(self.width(), self.height())
+        if self._qimage is None or self.viewport.buffer is not buffer:
+            buffer = self.viewport.buffer
+            height, width = buffer.shape[:2]
+            self._qimage = QImage(buffer.data, width, height, buffer.strides[0], QImage.Format_BGR888)
+        return self._qimage
+
+    def paintEvent(self, event):
+        qimage = self._buffer_image()
+        if self.image is None:
+            self.viewport.buffer[:] = BACKGROUND
+        else:
+            with span("display", view=self.viewport.view_size):
+                self.viewport.render(self.image, self.image_scale)
+        painter = QPainter(self)
+        painter.drawImage(QPoint(0, 0), qimage)
+        painter.end()
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if steps:
+            pos = event.pos()
+            self.viewport.zoom_at(pos.x(), pos.y(), ZOOM_STEP ** steps)
+            self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_origin = event.pos()
+
+    def mouseMoveEvent(self, event):
+        if self._drag_origin is not None:
+            delta = event.pos() - self._drag_origin
+            self._drag_origin = event.pos()
+            self.viewport.pan(delta.x(), delta.y())
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_origin = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.viewport.reset()
+        self.update()
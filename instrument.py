@@ -0,0 +1,163 @@
+"""
+執行期量測：分級 log（預設不輸出）與區段計時（span），可匯出 JSON 或 Chrome trace
+
+不改程式即可開啟：
+    PLAN2MESH_LOG=debug                 log 輸出到 stderr
+    PLAN2MESH_TRACE=session.json        結束時寫出所有 span
+    PLAN2MESH_TRACE_FORMAT=chrome|json  trace 格式（預設 chrome，可用 chrome://tracing / Perfetto 開啟）
+"""
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOGGER_NAME = "plan2mesh"
+TRACE_FORMATS = ("chrome", "json")
+
+log = logging.getLogger(LOGGER_NAME)
+log.addHandler(logging.NullHandler())
+
+
+def get_logger(name=None):
+    """取得子 logger，例如 get_logger("gui") → plan2mesh.gui"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}") if name else log
+
+
+def configure_logging(level):
+    """
+    開啟 log 輸出到 stderr
+    :param level: "debug" / "info" / "warning" ... 或 logging 的等級常數
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level: {level}")
+    if not any(getattr(h, "_plan2mesh", False) for h in log.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+        handler._plan2mesh = True
+        log.addHandler(handler)
+    log.setLevel(level)
+
+
+class SpanRecorder:
+    """收集 span：名稱、開始時間與長度（微秒，perf_counter 時鐘，跨行程可比較）、行程 / 執行緒與參數"""
+
+    def __init__(self):
+        self.enabled = False
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start_ns, duration_ns, args):
+        record = {
+            "name": name,
+            "start_us": start_ns / 1000,
+            "duration_us": duration_ns / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self._spans.append(record)
+
+    def extend(self, spans):
+        """合併其他行程送回來的 span"""
+        with self._lock:
+            self._spans.extend(spans)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def drain(self):
+        """取出並清空目前的 span（子行程每做完一個工作就送回主行程）"""
+        with self._lock:
+            spans, self._spans = self._spans, []
+        return spans
+
+    def clear(self):
+        with self._lock:
+            self._spans = []
+
+
+recorder = SpanRecorder()
+
+
+@contextmanager
+def span(name, **args):
+    """
+    量測一段程式的耗時；沒有開啟 trace 也沒有 debug log 時不做任何事
+    :param args: 附加在 span 上的參數（例如 contour_id、mode）
+    """
+    debug = log.isEnabledFor(logging.DEBUG)
+    if not recorder.enabled and not debug:
+        yield
+        return
+
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter_ns() - start
+        if recorder.enabled:
+            recorder.add(name, start, duration, args)
+        if debug:
+            log.debug("%s took %.3f ms %s", name, duration / 1e6, args or "")
+
+
+def enable_tracing(enabled=True):
+    recorder.enabled = enabled
+
+
+def to_chrome_trace(spans):
+    """轉成 Chrome trace event 格式（complete event，ph = "X"）"""
+    return {
+        "traceEvents": [
+            {
+                "name": s["name"],
+                "ph": "X",
+                "ts": s["start_us"],
+                "dur": s["duration_us"],
+                "pid": s["pid"],
+                "tid": s["tid"],
+                "args": s["args"],
+            }
+            for s in spans
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+
+def save_trace(path, fmt="chrome", spans=None):
+    """
+    寫出 span
+    :param fmt: "chrome"（Chrome trace）或 "json"（span 列表）
+    :return: 寫出的 span 數
+    """
+    if fmt not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {fmt}")
+    spans = recorder.spans() if spans is None else spans
+    data = to_chrome_trace(spans) if fmt == "chrome" else {"spans": spans}
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return len(spans)
+
+
+def configure_from_env(environ=os.environ):
+    """依環境變數開啟 log 與 trace；trace 檔只由主行程在結束時寫出"""
+    level = environ.get("PLAN2MESH_LOG")
+    if level:
+        configure_logging(level)
+
+    trace_path = environ.get("PLAN2MESH_TRACE")
+    if trace_path:
+        enable_tracing()
+        if multiprocessing.parent_process() is None:
+            atexit.register(save_trace, trace_path, environ.get("PLAN2MESH_TRACE_FORMAT", "chrome"))
+
+
+configure_from_env()
@@ -1,6 +1,6 @@
+import os
 import sys
 import cv2
-import numpy as np
 
 # from OpenGL.GL import glClear, GL_COLOR_BUFFER_BIT
 # from OpenGL.GLUT import glutInit
@@ -8,36 +8,80 @@ from PyQt5.QtWidgets import QMessageBox
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QVBoxLayout, QHBoxLayout,
-    QPushButton, QWidget, QCheckBox, QGroupBox, QFileDialog, QSlider, QListWidget, QListWidgetItem,
-    QSizePolicy, QSpinBox
+    QPushButton, QWidget, QCheckBox, QGroupBox, QFileDialog, QSlider, QListView,
+    QSpinBox, QDoubleSpinBox, QComboBox, QProgressBar
 )
 
-from PyQt5.QtCore import Qt, QSize, QTimer
-from PyQt5.QtGui import QPixmap, QImage
-# from scipy.spatial import Delaunay  # **三角剖分**
+from PyQt5.QtCore import Qt, QTimer
+
+from contour_model import CONTOUR_ID_ROLE, ContourListModel
+from disk_cache import DiskCache
+from export import ExportJob
+from image_view import ImageView
+from instrument import get_logger, span
+from mesh_io import MESH_FORMATS
+from overlay import OverlayRenderer
+from pipeline import (
+    DEFAULT_SIMPLIFY_TOLERANCE, ContourCache, ContourIndex, calculate_contour_area, extrude_single_contour, load_image, preview_level,
+    process_threshold, pyramid_level, select_contours
+)
+from worker import LatestJobWorker
+
+log = get_logger("gui")
 
 class PolygonSimplifierApp(QMainWindow):
     def __init__(self, image_path):
         super().__init__()
         self.image_path = image_path
-        self.original_image = cv2.imread(image_path)
-        if self.original_image is None:
-            raise FileNotFoundError(f"Cannot load image: {image_path}")
+        self.original_image = load_image(image_path)
         self.processed_image = self.original_image.copy()
 
+        # **快取：灰階只算一次，各 threshold 的輪廓結果以 LRU 保存；原圖結果同時存到磁碟，重開同一張圖直接讀回**
+        self.disk_cache = self.open_disk_cache()
+        self.contour_cache = ContourCache(self.original_image, disk=self.disk_cache)
+        self.contour_hierarchy_map = {}  # {外輪廓: [內洞列表]}
+        self.contour_index = None  # **目前輪廓的層級索引（ContourIndex）**
+        self.overlay = OverlayRenderer(self.original_image)  # **底圖與輪廓筆畫快取**
+        self.preview_overlay = None  # **拖動時用的縮小底圖疊圖（第一次預覽時才建立）**
+        self.active_overlay = self.overlay
+        self.preview_active = False  # **目前顯示的是否為預覽層級的結果**
+        self.contours_threshold = None  # **產生目前輪廓的 threshold 與簡化容差（不一定等於 UI 上的值）**
+        self.contours_tolerance = None
+
         # 預設參數
         self.threshold_value = 200
         self.show_vertices = False  # 是否顯示頂點
-        self.fill_alpha = 100  # 內部填充透明度（固定）
         self.min_contour_area = 100
         self.invalid_contours = set()  # **存放過小輪廓的 ID**
 
         # 儲存 Checkbox 狀態
-        self.contour_checkboxes = {}
         self.checkbox_states = {}  # 儲存 Checkbox 的狀態，格式為 {contour_id: True/False}
 
+        # **背景輸出：一次只有一個輸出工作，進行中仍可繼續編輯**
+        self.export_job = None
+        self.export_path = None  # **上次輸出的路徑（下次存檔對話框的預設值）**
+
+        # **背景處理：拖動 slider 時合併連續事件，只在背景算最新的 threshold**
+        self.processing_worker = LatestJobWorker(self)
+        self.processing_worker.result_ready.connect(self.on_processing_result)
+        self.processing_worker.job_failed.connect(self.on_processing_failed)
+        self.processing_worker.start()
+        self.applied_generation = self.processing_worker.generation  # **目前顯示的結果是哪一次請求**
+
+        self.processing_timer = QTimer(self)
+        self.processing_timer.setSingleShot(True)
+        self.processing_timer.setInterval(30)  # ms，拖動中最多每 30 ms 算一次預覽
+        self.processing_timer.timeout.connect(self.submit_preview)
+
+        # **停止拖動一段時間後，自動以原圖解析度重算**
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(300)  # ms
+        self.settle_timer.timeout.connect(self.submit_processing)
+
         # 初始化 UI
         self.init_ui()
+        self.restore_session()
         self.update_processing()
 
     def init_ui(self):
@@ -45,24 +89,40 @@ class PolygonSimplifierApp(QMainWindow):
         self.setGeometry(100, 100, 1400, 800)
         self.setMinimumSize(1400, 800)
 
-        # **左側圖片顯示區**
-        self.image_label = QLabel(self)
-        self.image_label.setAlignment(Qt.AlignCenter)
-        self.image_label.setScaledContents(True)
+        # **左側圖片顯示區：只以視窗大小繪製，滾輪縮放、拖曳平移、雙擊回到整張圖**
+        self.image_view = ImageView(self)
 
         # **右側下半部：輪廓列表**
-        self.contour_list = QListWidget(self)
+        # **Model/View：列只在顯示時才產生內容，輪廓改變時只套用差異**
+        self.contour_model = ContourListModel(self.checkbox_states, self)
+        self.contour_model.check_state_changed.connect(self.update_checkbox_state)
+        self.contour_list = QListView(self)
+        self.contour_list.setModel(self.contour_model)
+        self.contour_list.setUniformItemSizes(True)
         self.contour_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        self.contour_list.currentRowChanged.connect(self.on_row_changed)
+        self.contour_list.selectionModel().currentRowChanged.connect(self.on_row_changed)
 
         # **右側上半部：參數調整區**
         sliders_layout = QVBoxLayout()
-        sliders_layout.addWidget(self.create_slider("Threshold", 0, 255, self.threshold_value, self.update_processing))
+        threshold_slider = self.create_slider("Threshold", 0, 255, self.threshold_value, self.schedule_processing)
+        self.threshold_slider = threshold_slider.findChild(QSlider)
+        sliders_layout.addWidget(threshold_slider)
+
+        # **輪廓簡化容差（像素），0 為不簡化；列表中顯示簡化前後的頂點數**
+        simplify_layout = QHBoxLayout()
+        simplify_layout.addWidget(QLabel("Simplify (px)"))
+        self.simplify_input = QDoubleSpinBox()
+        self.simplify_input.setRange(0, 20)
+        self.simplify_input.setSingleStep(0.5)
+        self.simplify_input.setValue(DEFAULT_SIMPLIFY_TOLERANCE)
+        self.simplify_input.valueChanged.connect(self.schedule_processing)
+        simplify_layout.addWidget(self.simplify_input)
+        sliders_layout.addLayout(simplify_layout)
 
         # **Checkbox：是否顯示頂點**
         self.vertex_checkbox = QCheckBox("Show Vertices")
         self.vertex_checkbox.setChecked(self.show_vertices)
-        self.vertex_checkbox.stateChanged.connect(self.update_processing)
+        self.vertex_checkbox.stateChanged.connect(self.redraw_overlay)
         sliders_layout.addWidget(self.vertex_checkbox)
 
         # **Extrude 設定區域**
@@ -88,10 +148,37 @@ class PolygonSimplifierApp(QMainWindow):
         self.fill_top_checkbox = QCheckBox("Fill Top (封頂)")
         self.fill_top_checkbox.setChecked(True)  # 預設勾選
 
+        # **網格模式：立方體 / 只輸出外表面（剔除內部面並合併成大矩形）/ 精確三角剖分**
+        self.mesh_mode_combo = QComboBox()
+        self.mesh_mode_combo.addItem("Surface Voxel (合併表面)", "surface")
+        self.mesh_mode_combo.addItem("Exact (三角剖分)", "exact")
+        self.mesh_mode_combo.addItem("Voxel (立方體)", "voxel")
+        self.mesh_mode_combo.addItem("Quadtree Voxel (自適應)", "quadtree")
+
+        # **多核心輸出：各組輪廓分給行程池平行拉伸**
+        self.parallel_checkbox = QCheckBox("Parallel Export (多核心)")
+        self.parallel_checkbox.setChecked((os.cpu_count() or 1) > 1)
+
         # **加入參數區**
         sliders_layout.addLayout(extrude_layout)
         sliders_layout.addWidget(self.fill_base_checkbox)
         sliders_layout.addWidget(self.fill_top_checkbox)
+        sliders_layout.addWidget(self.mesh_mode_combo)
+        sliders_layout.addWidget(self.parallel_checkbox)
+
+        # **輸出進度與取消**
+        export_layout = QHBoxLayout()
+        self.export_progress = QProgressBar()
+        self.export_progress.setRange(0, 1)
+        self.export_progress.setValue(0)
+        self.export_cancel_button = QPushButton("Cancel", self)
+        self.export_cancel_button.setEnabled(False)
+        self.export_cancel_button.clicked.connect(self.cancel_export)
+        export_layout.addWidget(self.export_progress)
+        export_layout.addWidget(self.export_cancel_button)
+        sliders_layout.addLayout(export_layout)
+        self.export_status = QLabel("")
+        sliders_layout.addWidget(self.export_status)
 
         # **按鈕區域**
         buttons_layout = QVBoxLayout()
@@ -110,7 +197,7 @@ class PolygonSimplifierApp(QMainWindow):
 
         # **主佈局（左側圖片 + 右側控件）**
         main_layout = QHBoxLayout()
-        main_layout.addWidget(self.image_label, stretch=3)  # 左側圖片區
+        main_layout.addWidget(self.image_view, stretch=3)  # 左側圖片區
         main_layout.addLayout(right_layout, stretch=2)  # 右側控制區
 
         container = QWidget()
@@ -136,230 +223,162 @@ class PolygonSimplifierApp(QMainWindow):
         setattr(self, f"{slider_name.lower().replace(' ', '_')}_value", value)
         callback()
 
-    def save_stl(self, faces, filename):
-        """將三角形面片寫入 STL 檔案"""
-        with open(filename, "w") as f:
-            f.write("solid extruded_mesh\n")
-
-            for tri in faces:
-                f.write("  facet normal 0.0 0.0 0.0\n")
-                f.write("    outer loop\n")
-                for vertex in tri:
-                    f.write(f"      vertex {vertex[0]} {vertex[1]} {vertex[2]}\n")
-                f.write("    endloop\n")
-                f.write("  endfacet\n")
-
-            f.write("endsolid extruded_mesh\n")
-
-    def create_cube(self, x, y, size, height):
-        """建立一個立方體（修正三角形方向）"""
-        p0 = (x, y, 0)
-        p1 = (x + size, y, 0)
-        p2 = (x + size, y + size, 0)
-        p3 = (x, y + size, 0)
-        
-        p4 = (x, y, height)
-        p5 = (x + size, y, height)
-        p6 = (x + size, y + size, height)
-        p7 = (x, y + size, height)
-
-        # **修正所有面為逆時針順序 (CCW)**
-        faces = [
-            [p0, p2, p1], [p0, p3, p2],  # **底部 (XY 平面)**
-            [p4, p5, p6], [p4, p6, p7],  # **頂部 (XY 平面)**
-            [p0, p1, p5], [p0, p5, p4],  # **前面**
-            [p1, p2, p6], [p1, p6, p5],  # **右側**
-            [p2, p3, p7], [p2, p7, p6],  # **後面**
-            [p3, p0, p4], [p3, p4, p7]   # **左側**
-        ]
-        return faces
-    
-    def extrude_single_contour(self, contour_id, contours, hierarchy, z_height, grid_size):
-        """拉伸單個輪廓（包含內孔洞），回傳 STL 面片"""
-        outer_contour = contours[contour_id]  # **外輪廓**
-        hole_contours = [contours[i] for i, h in enumerate(hierarchy) if h[3] == contour_id]  # **內孔洞**
-
-        print(f"[DEBUG] Extruding Contour ID: {contour_id}, Found {len(hole_contours)} holes")
-
-        # **計算棋盤範圍**
-        x_min, y_min = np.min(outer_contour[:, 0, :], axis=0)
-        x_max, y_max = np.max(outer_contour[:, 0, :], axis=0)
-
-        print(f"[DEBUG] Grid Boundary: X=({x_min}, {x_max}), Y=({y_min}, {y_max})")
-
-        faces = []  # **儲存 STL 面片**
-
-        # **遍歷棋盤格，判斷哪些方格在輪廓內**
-        for x in range(x_min, x_max, grid_size):
-            for y in range(y_min, y_max, grid_size):
-                cell_center = (x + grid_size / 2, y + grid_size / 2)
-
-                # **檢查是否在外輪廓內**
-                inside_outer = cv2.pointPolygonTest(outer_contour, cell_center, measureDist=False) >= 0
-                inside_hole = any(cv2.pointPolygonTest(h, cell_center, measureDist=False) >= 0 for h in hole_contours)
-
-                if inside_outer and not inside_hole:
-                    cube_faces = self.create_cube(x, y, grid_size, z_height)
-                    faces.extend(cube_faces)
-
-        return faces
-
-    def extrude_contour(self):
-        """拉伸所有勾選的輪廓，生成 STL"""
+    def extrude_single_contour(self, contour_id, contours, hierarchy, z_height, grid_size, mode="voxel",
+                               fill_base=True, fill_top=True):
+        """
+        拉伸單個輪廓（包含內孔洞），回傳 (N, 3, 3) 面片陣列
+        :param mode: "voxel" 逐格立方體、"surface" 只輸出合併後的外表面、"exact" 依輪廓三角剖分精確拉伸、
+                     "quadtree" 內部大格、邊界細分
+        :param fill_base: 是否封底（僅 "exact" 模式，體素模式永遠封閉）
+        :param fill_top: 是否封頂（僅 "exact" 模式）
+        """
+        index = self.contour_index if contours is self.contours else ContourIndex(contours, hierarchy)
+        log.debug("Extruding Contour ID: %s, Mode: %s, Bounding Box: %s", contour_id, mode,
+                  index.bboxes[contour_id].tolist())
+
+        return extrude_single_contour(contour_id, contours, hierarchy, z_height, grid_size, mode, fill_base, fill_top,
+                                      index)
+
+    def extrude_contour(self, output_path=None):
+        """
+        拉伸所有勾選的輪廓並在背景輸出網格
+        :param output_path: 輸出檔（副檔名決定格式），沒有時開啟存檔對話框
+        """
+        if self.export_job is not None:
+            log.debug("Export already running, ignoring request")
+            return
         z_height = self.extrude_height_input.value()
         grid_size = 10  # 棋盤格大小
+        mode = self.mesh_mode_combo.currentData()
+        fill_base = self.fill_base_checkbox.isChecked()
+        fill_top = self.fill_top_checkbox.isChecked()
+
+        log.debug("Extruding all checked contours, Height: %s, Grid Size: %s, Mode: %s", z_height, grid_size, mode)
 
-        print(f"[DEBUG] Extruding all checked contours, Height: {z_height}, Grid Size: {grid_size}")
+        # **拖動中顯示的是預覽輪廓，輸出前一定要換成原圖解析度的結果**
+        self.ensure_full_resolution()
 
         # **確保 contours 存在**
         if not self.contours:
-            print("[DEBUG] No contours available, skipping extrusion.")
+            log.debug("No contours available, skipping extrusion.")
             return
 
-        faces = []
-
-        # **遍歷所有勾選的輪廓**
-        for contour_id in self.checkbox_states:
-            if self.checkbox_states[contour_id]:  # **只處理勾選的輪廓**
-                if contour_id >= len(self.contours):  # **檢查是否超出範圍**
-                    print(f"[DEBUG] Skipping invalid contour ID: {contour_id}")
-                    continue
-
-                faces.extend(self.extrude_single_contour(contour_id, self.contours, self.hierarchy, z_height, grid_size))
+        if output_path is None:
+            output_path = self.ask_export_path()
+            if not output_path:
+                return
+        self.export_path = output_path
+
+        # **只輸出目前列表中勾選的外輪廓（勾選狀態表裡可能留有其他 threshold 的舊 ID）**
+        contour_ids = [contour_id for contour_id in self.contour_hierarchy_map
+                       if self.checkbox_states.get(contour_id, True)]
+
+        # **同一張圖、同樣的參數與選取已輸出過：直接複製快取中的檔案**
+        # **快取鍵用產生這組輪廓的參數，不用 UI 上可能已經改掉的值**
+        image_key = self.contour_cache.image_key
+        mesh_params = dict(threshold=self.contours_threshold, min_area=self.min_contour_area,
+                           tolerance=self.contours_tolerance, z_height=z_height, grid_size=grid_size, mode=mode,
+                           fill_base=fill_base, fill_top=fill_top, contour_ids=contour_ids)
+        if self.disk_cache is not None and image_key is not None:
+            info = self.disk_cache.copy_mesh(image_key, output_path, **mesh_params)
+            if info is not None:
+                log.info("Mesh copied from cache: %s (%d facets)", output_path, info["facets"])
+                self.export_status.setText(f"Saved {os.path.basename(output_path)} ({info['facets']} facets, cached)")
+                return
 
-        # **儲存 STL**
-        self.save_stl(faces, "extruded_voxel_mesh_all.stl")
-        print("[DEBUG] STL file saved: extruded_voxel_mesh_all.stl")
-            
-    def on_checkbox_state_changed(self, contour_id, state):
-        """
-        處理 Checkbox 狀態變化。
-        """
-        is_checked = state == Qt.Checked  # 判斷是否勾選
-        print(f"Checkbox for Contour {contour_id} changed to {'Checked' if is_checked else 'Unchecked'}")
-        self.update_processing()  # 更新畫面
+        # **輪廓與參數在這裡固定，輸出期間改 threshold 或勾選不影響這次輸出**
+        options = dict(z_height=z_height, grid_size=grid_size, mode=mode, fill_base=fill_base, fill_top=fill_top,
+                       workers=(os.cpu_count() or 1) if self.parallel_checkbox.isChecked() else 1)
+        job = ExportJob(output_path, contour_ids, self.contours, self.hierarchy, options, self.contour_index, self)
+        if self.disk_cache is not None and image_key is not None:
+            job.cache_result(self.disk_cache, image_key, mesh_params)
+        job.progress.connect(self.on_export_progress)
+        job.succeeded.connect(self.on_export_succeeded)
+        job.failed.connect(self.on_export_failed)
+        job.cancelled.connect(self.on_export_cancelled)
+        job.finished.connect(self.on_export_finished)
+        self.export_job = job
+
+        self.extrude_button.setEnabled(False)
+        self.export_cancel_button.setEnabled(True)
+        self.export_progress.setRange(0, 1)
+        self.export_progress.setValue(0)
+        self.export_status.setText(f"Exporting {len(contour_ids)} contours...")
+        job.start()
+
+    def ask_export_path(self):
+        """存檔對話框：預設為上次的路徑，或圖片旁同名的 .stl"""
+        default = self.export_path or os.path.splitext(self.image_path)[0] + ".stl"
+        filters = [f"{name} (*{ext})" for ext, name in MESH_FORMATS.items()]
+        selected = next((f for f in filters if f.endswith(f"(*{os.path.splitext(default)[1].lower()})")), filters[0])
+        path, chosen = QFileDialog.getSaveFileName(self, "Export Mesh", default, ";;".join(filters), selected)
+        if path and os.path.splitext(path)[1].lower() not in MESH_FORMATS:
+            path += chosen[chosen.index("(*") + 2:-1]  # **沒打副檔名時用所選的格式**
+        return path
+
+    def cancel_export(self):
+        if self.export_job is not None:
+            log.debug("Cancelling export to %s", self.export_job.output_path)
+            self.export_job.cancel()
+            self.export_cancel_button.setEnabled(False)
+            self.export_status.setText("Cancelling...")
+
+    def on_export_progress(self, done_rows, total_rows, contours_done):
+        self.export_progress.setRange(0, max(total_rows, 1))
+        self.export_progress.setValue(done_rows)
+        total = len(self.export_job.contour_ids) if self.export_job is not None else contours_done
+        self.export_status.setText(f"Exporting... {contours_done}/{total} contours, {done_rows}/{total_rows} rows")
+
+    def on_export_succeeded(self, output_path, count):
+        log.info("Mesh saved: %s (%d facets)", output_path, count)
+        self.export_status.setText(f"Saved {os.path.basename(output_path)} ({count} facets)")
+        self.save_session()
+
+    def on_export_failed(self, output_path, message):
+        log.warning("Export to %s failed: %s", output_path, message)
+        self.export_status.setText(f"Export failed: {message}")
+
+    def on_export_cancelled(self, output_path):
+        log.info("Export to %s cancelled", output_path)
+        self.export_progress.setValue(0)
+        self.export_status.setText("Export cancelled")
+
+    def on_export_finished(self):
+        self.export_job = None
+        self.extrude_button.setEnabled(True)
+        self.export_cancel_button.setEnabled(False)
 
     def update_checkbox_state(self, contour_id, state):
         """
-        更新狀態表中對應 Checkbox 的狀態。
+        Model 已更新狀態表，這裡只負責重畫。
         """
         is_checked = state == Qt.Checked
         self.checkbox_states[contour_id] = is_checked  # 更新狀態表
-        print(f"Checkbox state for Contour {contour_id} updated to {'Checked' if is_checked else 'Unchecked'}")
-        self.update_processing()  # 重新繪製畫面
-
-    def force_row_update(self):
-        """強制觸發 `currentRowChanged` 事件"""
-        current_row = self.contour_list.currentRow()
-        if current_row != -1:
-            temp_row = 0 if current_row != 0 else 1  # 避免 out of range
-            print(f"[DEBUG] Forcing row change: {current_row} -> {temp_row} -> {current_row}")
-            self.contour_list.setCurrentRow(temp_row)
-            self.contour_list.setCurrentRow(current_row)
-
-    def on_row_changed(self, current_row):
-        """當選中行變更時觸發"""
-        print(f"[DEBUG] on_row_changed() called with current_row: {current_row}")
-
-        if current_row == -1:
-            print("[DEBUG] No row selected.")
-            return
+        log.debug("Checkbox state for Contour %s updated to %s", contour_id, "Checked" if is_checked else "Unchecked")
+        self.redraw_overlay()  # 只重畫，不重新找輪廓
 
-        item = self.contour_list.item(current_row)
-        if item is None:
-            print("[DEBUG] item is None, skipping update.")
-            return
+    def on_row_changed(self, current, previous=None):
+        """當選中行變更時觸發，輪廓 ID 直接由 model 的 role 取得"""
+        log.debug("on_row_changed() called with current_row: %d", current.row())
 
-        # 嘗試獲取 item 對應的 QWidget
-        widget = self.contour_list.itemWidget(item)
-        if widget is None:
-            print("[DEBUG] itemWidget() is None, skipping update.")
+        if not current.isValid():
+            log.debug("No row selected.")
             return
 
-        # 從 QWidget 內部取得 QLabel 的文字
-        label = widget.layout().itemAt(1).widget()  # QLabel 在 HBoxLayout 的第二個位置
-        if label is None:
-            print("[DEBUG] QLabel not found in widget, skipping update.")
+        contour_id = current.data(CONTOUR_ID_ROLE)
+        if contour_id is None:
+            log.debug("No contour ID for row, skipping update.")
             return
+        log.debug("Selected Contour ID: %s", contour_id)
 
-        contour_text = label.text().strip()
-        print(f"[DEBUG] Selected row text from QLabel: '{contour_text}'")
-
-        if not contour_text:
-            print("[DEBUG] Empty row text, skipping update.")
-            return
-
-        try:
-            if "Contour =" in contour_text:
-                contour_id_part = contour_text.split('=')[1].strip()
-                contour_id = int(contour_id_part.split(',')[0])
-                print(f"[DEBUG] Extracted Contour ID: {contour_id}")
-            else:
-                print("[DEBUG] Contour text format is incorrect.")
-                return
-        except Exception as e:
-            print(f"[DEBUG] Error parsing contour text: {e}")
-            return
-
-        if hasattr(self, "selected_contour_id") and self.selected_contour_id == contour_id:
-            print("[DEBUG] Contour ID has not changed, skipping update.")
+        if getattr(self, "selected_contour_id", None) == contour_id:
+            log.debug("Contour ID has not changed, skipping update.")
             return
 
         self.selected_contour_id = contour_id
 
-        print("[DEBUG] Calling update_processing()")
-        self.update_processing()
+        self.redraw_overlay()
 
-    def add_checkbox_item(self, contour_id, text):
-        """
-        為列表項目動態加入一個 Checkbox 和標籤，並將狀態存入狀態表。
-        """
-        item_widget = QWidget(self)
-        layout = QHBoxLayout()
-
-        # 創建 Checkbox（不設置文字）
-        checkbox = QCheckBox()
-        checkbox.setChecked(self.checkbox_states.get(contour_id, True))  # 預設為 True
-        checkbox.stateChanged.connect(lambda state: self.update_checkbox_state(contour_id, state))
-        checkbox.setFixedSize(30, 16)  # 強制縮小 Checkbox 的尺寸
-        # checkbox.setStyleSheet("""
-        #     QCheckBox::indicator {
-        #         width: 16px;
-        #         height: 16px;
-        #     }
-        #     QCheckBox {
-        #         spacing: 2px;  /* 控制 Checkbox 圖標和文字的距離 */
-        #     }
-        # """)
-
-        # 使用 QLabel 單獨顯示文字
-        label = QLabel(text)
-        label.setStyleSheet("margin: 0px; padding: 0px;")  # 移除內外邊距
-        label.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed)  # 壓縮寬度占用
-
-        # 添加到布局
-        layout.addWidget(checkbox)
-        layout.addWidget(label)
-
-        # 調整布局的間距
-        layout.setContentsMargins(0, 0, 0, 0)  # 移除內邊距
-        layout.setSpacing(2)  # 減少 Checkbox 與文字的距離
-
-        # 設置布局到 item_widget
-        item_widget.setLayout(layout)
-
-        # 添加到 QListWidget
-        list_item = QListWidgetItem()
-        self.contour_list.addItem(list_item)
-        list_item.setSizeHint(QSize(0, 25))  # 手動設置寬高，高度設置為 25
-
-        # 綁定 Checkbox 與 Widget
-        self.contour_list.setItemWidget(list_item, item_widget)
-
-        # 儲存 Checkbox 對應到 contour_id
-        self.contour_checkboxes[contour_id] = checkbox
-        return checkbox
-    
     def calculate_contour_area(self, contour_id, contours, hierarchy):
         """
         計算指定輪廓 ID 的面積，考慮內洞的影響
@@ -368,178 +387,217 @@ class PolygonSimplifierApp(QMainWindow):
         :param hierarchy: 層級結構
         :return: 計算後的有效面積（內洞會被扣除）
         """
-        # hierarchy = hierarchy[0]  # 提取層級資訊
-        total_area = cv2.contourArea(contours[contour_id])  # 先計算外輪廓面積
+        index = self.contour_index if contours is self.contours else None
+        return calculate_contour_area(contour_id, contours, hierarchy, index)
 
-        # **扣除內洞面積**
-        for i, h in enumerate(hierarchy):
-            if h[3] == contour_id:  # **找到屬於這個外輪廓的內洞**
-                total_area -= cv2.contourArea(contours[i])
+    def update_contour_list(self, contours, hierarchy, contour_dict=None, invalid_contours=None, vertex_counts=None):
+        """
+        更新輪廓列表（只把差異套用到 model）
+        :param contour_dict: 已在背景算好的 {外輪廓: [內洞列表]}，沒有時在這裡計算
+        :param invalid_contours: 與 contour_dict 一起算好的過小輪廓 ID 集合
+        :param vertex_counts: (簡化前, 簡化後) 各輪廓頂點數
+        """
+        log.debug("update_contour_list() called")
 
-        return total_area
+        if not contours or hierarchy is None:
+            log.debug("No contours found, clearing contour_list")
+            self.contour_model.set_contours({})
+            return
 
-    def update_contour_list(self, contours, hierarchy):
-        """更新輪廓列表，確保 `QCheckBox` 正確顯示"""
-        print("[DEBUG] update_contour_list() called")
+        # **只加入足夠大的輪廓，過小的記錄到 invalid_contours**
+        if contour_dict is None:
+            index = self.contour_index if contours is self.contours else None
+            contour_dict, invalid_contours = select_contours(contours, hierarchy, self.min_contour_area, index)
+        self.invalid_contours = invalid_contours
+
+        # **確保 checkbox 狀態被正確存入（未點擊過的預設勾選）**
+        for outer in contour_dict:
+            self.checkbox_states.setdefault(outer, True)
+
+        with span("contour_list", rows=len(contour_dict)):
+            self.contour_model.set_contours(contour_dict, vertex_counts)
+        log.debug("Contour list count after update: %d", self.contour_model.rowCount())
+
+    def schedule_processing(self):
+        """slider 變動時：拖動中定時算縮小的預覽，停下來後再算原圖"""
+        # **預覽節流而不是防抖：計時中不重新計時，持續拖動時也會定時更新，時間到才讀最新的值**
+        if not self.processing_timer.isActive():
+            self.processing_timer.start()
+        self.settle_timer.start()
+
+    def submit_preview(self):
+        """拖動中：在金字塔的縮小層級上計算，延遲與原圖大小無關"""
+        level = preview_level(self.original_image.shape)
+        if not level:
+            return  # 原圖已經夠小，直接等原圖解析度的計算
+        generation = self.processing_worker.submit(
+            process_threshold, self.contour_cache, self.threshold_value, self.min_contour_area, level,
+            self.simplify_input.value()
+        )
+        log.debug("Submitted preview threshold %d at level %d (job %d)", self.threshold_value, level, generation)
+
+    def submit_processing(self):
+        """把最新的 threshold 交給背景執行緒（覆蓋尚未開始的舊請求）"""
+        self.processing_timer.stop()
+        generation = self.processing_worker.submit(
+            process_threshold, self.contour_cache, self.threshold_value, self.min_contour_area,
+            tolerance=self.simplify_input.value()
+        )
+        log.debug("Submitted threshold %d (job %d)", self.threshold_value, generation)
+
+    def ensure_full_resolution(self):
+        """
+        輸出前確認目前的輪廓是原圖解析度的最新結果，否則同步重算：
+        顯示的是預覽、計時器還沒送出請求，或最新的請求還在背景計算（結果尚未套用）都算過期
+        """
+        pending = self.applied_generation != self.processing_worker.generation
+        if self.preview_active or pending or self.settle_timer.isActive() or self.processing_timer.isActive():
+            log.debug("Preview or pending result, running full-resolution pass")
+            self.update_processing()
 
-        if not contours or hierarchy is None:
-            print("[DEBUG] No contours found, clearing contour_list")
-            self.contour_list.clear()
+    def on_processing_result(self, generation, result):
+        """背景結果回到 UI 執行緒：之後又送出過新工作的結果直接丟棄"""
+        if self.processing_worker.is_stale(generation):
+            log.debug("Dropping stale result for threshold %d (job %d)", result["threshold"], generation)
             return
+        self.applied_generation = generation
+        self.apply_processing_result(result)
 
-        # **清空之前的 invalid_contours**
-        self.invalid_contours.clear()
-        self.contour_list.clear()  # 清空列表
-        hierarchy = hierarchy[0]
-
-        contour_dict = {}
-        for i, h in enumerate(hierarchy):
-            parent = h[3]
-            if parent == -1:
-                area = self.calculate_contour_area(i, contours, hierarchy)
-                if area >= self.min_contour_area:  # **只加入足夠大的輪廓**
-                    contour_dict[i] = []
-                    child = h[2]
-                    while child != -1:
-                        contour_dict[i].append(child)
-                        child = hierarchy[child][0]
-                else:
-                    self.invalid_contours.add(i)
-
-        for outer, holes in contour_dict.items():
-            text = f"Contour = {outer}, Holes = [{', '.join(map(str, holes))}]" if holes else f"Contour = {outer}"
-            checkbox = self.add_checkbox_item(outer, text)
-
-            # **確保 checkbox 狀態被正確存入**
-            self.checkbox_states[outer] = checkbox.isChecked()  # **這行讓未點擊的也會有狀態**
-
-        print("[DEBUG] Updated checkbox_states =", self.checkbox_states)
-
-        # for outer, holes in contour_dict.items():
-        #     text = f"Contour = {outer}, Holes = [{', '.join(map(str, holes))}]" if holes else f"Contour = {outer}"
-            
-        #     print(f"[DEBUG] Creating item for: '{text}'")
-
-        #     # **使用 `add_checkbox_item()` 來確保 `QCheckBox` 仍然存在**
-        #     checkbox = self.add_checkbox_item(outer, text)
-        #     checkbox.setChecked(self.checkbox_states.get(outer, True))
-
-        # print(f"[DEBUG] Contour list count after update: {self.contour_list.count()}")
-
-        # **確認 `QCheckBox` 是否正常添加**
-        for i in range(self.contour_list.count()):
-            item = self.contour_list.item(i)
-            widget = self.contour_list.itemWidget(item)
-            if widget:
-                label = widget.layout().itemAt(1).widget()  # 取得 QLabel
-                print(f"[DEBUG] Contour list item {i}: '{label.text()}' (Widget: {widget})")
-            else:
-                print(f"[DEBUG] Contour list item {i}: '{item.text()}' (No Widget)")
+    def on_processing_failed(self, generation, message):
+        log.warning("Processing job %d failed: %s", generation, message)
 
     def update_processing(self):
-        print("[DEBUG] update_processing() called")
-
-        gray = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-        _, binary = cv2.threshold(gray, self.threshold_value, 255, cv2.THRESH_BINARY_INV)
-        self.contours, _hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+        """threshold 或圖片改變時：同步取得（快取的）輪廓、更新列表並重畫"""
+        log.debug("update_processing() called")
+
+        # **同步算好最新結果，背景中尚未送回的舊結果一律作廢**
+        self.processing_timer.stop()
+        self.settle_timer.stop()
+        self.processing_worker.cancel()
+        self.applied_generation = self.processing_worker.generation
+        self.apply_processing_result(
+            process_threshold(self.contour_cache, self.threshold_value, self.min_contour_area,
+                              tolerance=self.simplify_input.value())
+        )
+
+    def apply_processing_result(self, result):
+        """套用 process_threshold 的結果：更新輪廓、列表與疊圖"""
+        self.contours, _hierarchy = result["contours"], result["hierarchy"]
+        self.contours_threshold, self.contours_tolerance = result["threshold"], result["tolerance"]
+        self.preview_active = result["level"] > 0
+        self.active_overlay = self.get_overlay(result["level"])
+        self.contour_index = result["index"]
+        log.debug("Contour cache: %d entries, %d bytes, hits=%d, misses=%d", len(self.contour_cache),
+                  self.contour_cache.nbytes, self.contour_cache.hits, self.contour_cache.misses)
 
         if not self.contours or _hierarchy is None:
-            print("[DEBUG] No contours found.")
-            self.contour_list.clear()
-            self.processed_image = self.original_image.copy()
+            log.debug("No contours found.")
+            self.contour_model.set_contours({})
+            self.hierarchy = None
+            self.contour_hierarchy_map = {}
+            self.active_overlay.set_contours([], {})
+            self.processed_image = self.active_overlay.image
             self.update_display()
             return
 
-        print(f"[DEBUG] Found {len(self.contours)} contours")
-        self.update_contour_list(self.contours, _hierarchy)
-
-        output_image = self.original_image.copy()
-        self.hierarchy = _hierarchy[0]  # 確保 `hierarchy` 正確展開
-
-        # **建立輪廓與內洞對應關係**
-        contour_hierarchy_map = {}  # {外輪廓: [內洞列表]}
-        hole_to_parent = {}  # {內洞: 外輪廓}
-
-        for i, h in enumerate(self.hierarchy):
-
-            if i in self.invalid_contours:
-                print(f"[DEBUG] Skipping small contour ID {i}")
-                continue  # **跳過小輪廓**
-
-            parent = h[3]
-            if parent == -1:
-                contour_hierarchy_map[i] = []
-                child = h[2]
-                while child != -1:
-                    contour_hierarchy_map[i].append(child)
-                    hole_to_parent[child] = i
-                    child = self.hierarchy[child][0]
-
-        # **根據 Checkbox 狀態決定哪些輪廓要顯示**
-        for outer, holes in contour_hierarchy_map.items():
-            if outer in self.checkbox_states and not self.checkbox_states[outer]:
-                print(f"[DEBUG] Skipping Contour {outer} (Checkbox Unchecked)")
-                continue  # 不畫出該外輪廓
-
-            # 畫外輪廓
-            cv2.polylines(output_image, [self.contours[outer]], isClosed=True, color=(0, 255, 0), thickness=2)
-
-            # 畫內洞
-            for hole in holes:
-                if hole in self.checkbox_states and not self.checkbox_states[hole]:
-                    print(f"[DEBUG] Skipping Hole {hole} (Checkbox Unchecked)")
-                    continue  # 不畫出該內洞
-                cv2.polylines(output_image, [self.contours[hole]], isClosed=True, color=(0, 0, 255), thickness=2)
-
-        # **高亮顯示完整輪廓組（包括 contour 和 holes）**
-        if hasattr(self, "selected_contour_id"):
-            highlight_id = self.selected_contour_id
-            highlight_group = set()
-
-            # **如果選中的是外輪廓，包含其所有內洞**
-            if highlight_id in contour_hierarchy_map and self.checkbox_states.get(highlight_id, True):
-                highlight_group.add(highlight_id)
-                highlight_group.update(contour_hierarchy_map[highlight_id])
-
-            # **如果選中的是內洞，回溯到外輪廓並包含整組**
-            # elif highlight_id in hole_to_parent:
-            #     parent_id = hole_to_parent[highlight_id]
-            #     highlight_group.add(parent_id)
-            #     highlight_group.update(contour_hierarchy_map[parent_id])
-
-            # **過濾掉 Checkbox 取消選取的輪廓**
-            # highlight_group = {cid for cid in highlight_group if self.checkbox_states.get(cid, True)}
-
-            if highlight_group:
-                print(f"[DEBUG] Highlighting Contour Group: {highlight_group}")
-                for cid in highlight_group:
-                    cv2.polylines(output_image, [self.contours[cid]], isClosed=True, color=(0, 255, 255), thickness=3)
-            else:
-                print("[DEBUG] No contours to highlight (All Checkboxes Unchecked)")
-
-        self.processed_image = output_image
+        log.debug("Found %d contours", len(self.contours))
+        self.update_contour_list(self.contours, _hierarchy, result["contour_dict"], result["invalid_contours"],
+                                 result["vertex_counts"])
+        before, after = (int(counts.sum()) for counts in result["vertex_counts"])
+        log.debug("Simplified %d -> %d vertices (tolerance %.1f px)", before, after, result["tolerance"])
+        self.hierarchy = _hierarchy
+
+        # **外輪廓與內洞對應關係（已排除過小輪廓），只在輪廓改變時重建**
+        self.contour_hierarchy_map = result["contour_dict"]
+        self.active_overlay.set_contours(self.contours, self.contour_hierarchy_map, self.contour_index.bboxes)
+        self.redraw_overlay()
+
+    def get_overlay(self, level):
+        """level 0 用原圖疊圖，預覽層級用縮小底圖的疊圖（底圖每張圖只縮一次）"""
+        if not level:
+            return self.overlay
+        if self.preview_overlay is None or self.preview_overlay.level != level:
+            self.preview_overlay = OverlayRenderer(pyramid_level(self.original_image, level), level)
+        return self.preview_overlay
+
+    def redraw_overlay(self):
+        """Checkbox、選取變更時只重畫有變動的輪廓，不重新二值化與找輪廓"""
+        selected_contour_id = getattr(self, "selected_contour_id", None)
+        self.processed_image = self.active_overlay.update(self.checkbox_states, selected_contour_id)
+        log.debug("Overlay redrawn (selected: %s)", selected_contour_id)
         self.update_display()
 
     def update_display(self):
-        rgb_image = cv2.cvtColor(self.processed_image, cv2.COLOR_BGR2RGB)
-        height, width, channel = rgb_image.shape
-        q_image = QImage(rgb_image.data, width, height, width * 3, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_image)
-        self.image_label.setPixmap(pixmap)
-        self.image_label.setScaledContents(True)
+        """交給 ImageView 在下次重繪時裁切、縮放（預覽圖與原圖共用同一個檢視範圍）"""
+        self.image_view.set_image(self.processed_image, 1 << self.active_overlay.level)
+
+    def open_disk_cache(self):
+        """開啟持久化快取資料夾，無法建立時（例如唯讀）只用記憶體快取"""
+        try:
+            return DiskCache()
+        except OSError as e:
+            log.warning("Persistent cache disabled: %s", e)
+            return None
+
+    def restore_session(self):
+        """讀回這張圖上次的 threshold、簡化容差與勾選狀態（沒有時全部預設勾選）"""
+        self.checkbox_states.clear()  # **輪廓 ID 只對同一張圖有意義**
+        image_key = self.contour_cache.image_key
+        session = self.disk_cache.load_session(image_key) if self.disk_cache and image_key else None
+        if session is None:
+            return
+        log.debug("Restoring session for image %s", image_key)
+        self.checkbox_states.update(session["checkbox_states"])
+        self.threshold_slider.setValue(session["threshold"])
+        self.simplify_input.setValue(session["tolerance"])
+
+    def save_session(self):
+        image_key = self.contour_cache.image_key
+        if self.disk_cache is None or image_key is None:
+            return
+        try:
+            self.disk_cache.save_session(image_key, self.threshold_value, self.simplify_input.value(),
+                                         self.checkbox_states)
+        except OSError as e:
+            log.warning("Could not save session: %s", e)
 
     def load_new_image(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Load Image", "", "Image Files (*.png *.jpg *.jpeg *.bmp)")
         if file_path:
-            self.original_image = cv2.imread(file_path)
+            # **先讀圖，讀不到（不是圖片或已損壞）時保留目前的圖與狀態**
+            try:
+                image = load_image(file_path)
+            except FileNotFoundError as e:
+                log.warning("%s", e)
+                QMessageBox.warning(self, "Load Image", f"Cannot load image:\n{file_path}")
+                return
+            self.save_session()
+            self.image_path = file_path
+            self.original_image = image
+            self.contour_cache.set_image(self.original_image)
+            self.overlay.set_base(self.original_image)
+            self.preview_overlay = None
+            self.restore_session()
             self.update_processing()
 
+    def closeEvent(self, event):
+        if self.export_job is not None:
+            # **關閉視窗時取消輸出，暫存檔由工作自行刪除**
+            self.export_job.cancel()
+            self.export_job.wait()
+        self.save_session()
+        self.processing_timer.stop()
+        self.settle_timer.stop()
+        self.processing_worker.stop()
+        super().closeEvent(event)
+
     def save_results(self):
+        self.ensure_full_resolution()
         cv2.imwrite("detected_polygons.jpg", self.processed_image)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = PolygonSimplifierApp("input.png")
+    window = PolygonSimplifierApp(sys.argv[1] if len(sys.argv) > 1 else "input.png")
     window.show()
     sys.exit(app.exec_())
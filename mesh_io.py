@@ -0,0 +1,172 @@
+"""網格輸出：Binary STL、Binary PLY、OBJ（支援逐批串流寫入）"""
+import os
+
+import numpy as np
+
+from instrument import span
+
+# **Binary STL 每個面片 50 bytes：法向量、三個頂點、屬性**
+STL_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+
+# **PLY 面片：頂點數 (uchar) + 三個索引 (int)**
+PLY_FACE_DTYPE = np.dtype([
+    ("count", "u1"),
+    ("indices", "<i4", (3,)),
+])
+
+OBJ_CHUNK_ROWS = 65536  # OBJ 每次格式化、寫出的列數
+
+MESH_FORMATS = {
+    ".stl": "Binary STL",
+    ".ply": "Binary PLY",
+    ".obj": "Wavefront OBJ",
+}
+
+
+def as_triangles(faces):
+    """把面片（陣列或 [[p0, p1, p2], ...] 列表）轉為 (N, 3, 3) float32"""
+    tris = np.asarray(faces, dtype=np.float32)
+    return tris.reshape(-1, 3, 3)
+
+
+def iter_batches(faces):
+    """
+    統一輸入：單一陣列 / 面片列表視為一批，其他可迭代物件（例如 generator）視為多批
+    """
+    if isinstance(faces, (np.ndarray, list, tuple)):
+        batches = [faces]
+    else:
+        batches = faces
+    for batch in batches:
+        tris = as_triangles(batch)
+        if len(tris):
+            yield tris
+
+
+def face_normals(tris):
+    """向量化計算單位法向量，退化三角形的法向量為 0"""
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, length, out=normals, where=length > 0)
+    return normals
+
+
+def write_stl(filename, faces):
+    """
+    寫入 Binary STL，每批面片組成結構化陣列後一次寫出，最後回填面片數
+    :return: 寫入的面片數
+    """
+    count = 0
+    with open(filename, "wb") as f:
+        f.write(b"extruded_mesh".ljust(80, b" "))
+        f.write(np.uint32(0).tobytes())
+
+        for tris in iter_batches(faces):
+            records = np.zeros(len(tris), dtype=STL_DTYPE)
+            records["normal"] = face_normals(tris)
+            records["vertices"] = tris
+            f.write(records.tobytes())
+            count += len(tris)
+
+        f.seek(80)
+        f.write(np.uint32(count).tobytes())
+    return count
+
+
+def _unique_points(points):
+    """
+    不重複的頂點與反查索引；每個頂點以 12 bytes 的 void 檢視當成一個鍵排序，
+    比 np.unique(axis=0) 的逐欄 lexsort 快得多
+    :return: (vertices (V, 3) float32, inverse (P,) int32)
+    """
+    # **+0 讓 -0.0 變成 0.0，兩者的位元不同但是同一個點**
+    points = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, 3) + np.float32(0)
+    unique, inverse = np.unique(points.view(np.dtype((np.void, 12))).ravel(), return_inverse=True)
+    return unique.view(np.float32).reshape(-1, 3), inverse.reshape(-1).astype(np.int32)
+
+
+def weld_vertices(faces):
+    """
+    合併重複頂點（例如相鄰方格共用的角點），每批先各自合併，有多批時最後再整體合併一次
+    :return: (vertices (V, 3) float32, indices (N, 3) int32)
+    """
+    batch_vertices, batch_indices = [], []
+    for tris in iter_batches(faces):
+        unique, inverse = _unique_points(tris)
+        batch_vertices.append(unique)
+        batch_indices.append(inverse.reshape(-1, 3))
+
+    if not batch_vertices:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.int32)
+    if len(batch_vertices) == 1:
+        return batch_vertices[0], batch_indices[0]
+
+    vertices, inverse = _unique_points(np.concatenate(batch_vertices))
+
+    indices = []
+    offset = 0
+    for unique, local in zip(batch_vertices, batch_indices):
+        indices.append(inverse[offset + local])
+        offset += len(unique)
+    return vertices, np.concatenate(indices)
+
+
+def write_ply(filename, faces):
+    """寫入 Binary PLY（頂點合併後以索引表示面片）"""
+    vertices, indices = weld_vertices(faces)
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {len(vertices)}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        f"element face {len(indices)}\n"
+        "property list uchar int vertex_indices\n"
+        "end_header\n"
+    )
+    records = np.empty(len(indices), dtype=PLY_FACE_DTYPE)
+    records["count"] = 3
+    records["indices"] = indices
+
+    with open(filename, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(vertices.astype("<f4").tobytes())
+        f.write(records.tobytes())
+    return len(indices)
+
+
+def _write_rows(f, template, rows):
+    """逐塊把每列格式化成文字寫出（輸出與 np.savetxt 相同，但不必逐列呼叫 write）"""
+    for start in range(0, len(rows), OBJ_CHUNK_ROWS):
+        f.write("".join([template.format(*row) for row in rows[start:start + OBJ_CHUNK_ROWS].tolist()]))
+
+
+def write_obj(filename, faces):
+    """寫入 OBJ（頂點合併後以索引表示面片，索引從 1 開始）"""
+    vertices, indices = weld_vertices(faces)
+    with open(filename, "w") as f:
+        f.write("# extruded_mesh\n")
+        _write_rows(f, "v {:.9g} {:.9g} {:.9g}\n", vertices)
+        _write_rows(f, "f {} {} {}\n", indices + 1)
+    return len(indices)
+
+
+_WRITERS = {
+    ".stl": write_stl,
+    ".ply": write_ply,
+    ".obj": write_obj,
+}
+
+
+def write_mesh(filename, faces):
+    """依副檔名選擇輸出格式，回傳寫入的面片數"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in _WRITERS:
+        raise ValueError(f"Unsupported mesh format: {ext}")
+    with span("write_mesh", format=ext):
+        return _WRITERS[ext](filename, faces)
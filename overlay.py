@@ -0,0 +1,126 @@
+"""輪廓疊圖：快取底圖與每個輪廓的筆畫，勾選 / 選取變更時只重畫有變動的輪廓"""
+import cv2
+import numpy as np
+
+from instrument import span
+
+# **圖層依序疊加，後面的蓋過前面的：外輪廓、內洞、高亮**
+LAYER_OUTER, LAYER_HOLE, LAYER_HIGHLIGHT = range(3)
+LAYER_COLORS = np.array([
+    (0, 255, 0),    # 外輪廓：綠
+    (0, 0, 255),    # 內洞：紅
+    (0, 255, 255),  # 高亮：黃
+], dtype=np.uint8)
+LAYER_THICKNESS = (2, 2, 3)
+
+
+class OverlayRenderer:
+    """
+    每個像素記錄各圖層有幾個輪廓畫到它，切換輪廓時只加減該輪廓筆畫的像素，
+    再把這些像素一次向量化合成回輸出圖，不必複製整張圖重畫所有輪廓
+    """
+
+    def __init__(self, base_image, level=0):
+        """
+        :param level: 底圖是原圖第幾層金字塔（預覽用），輪廓座標仍是原圖座標，繪製時才縮小
+        """
+        self.level = level
+        self.set_base(base_image)
+
+    def set_base(self, base_image):
+        """換底圖：清空所有輪廓與快取"""
+        self.base = base_image
+        self._base_flat = base_image.reshape(-1, base_image.shape[2])
+        self.set_contours([], {})
+
+    def set_contours(self, contours, contour_dict, bboxes=None):
+        """
+        換一組輪廓（threshold 改變後）
+        :param contour_dict: {外輪廓: [內洞列表]}，只有其中的輪廓會被畫出
+        :param bboxes: 已算好的外框 (N, 4) [x, y, w, h]（例如 ContourIndex.bboxes），省去逐一計算
+        """
+        height, width = self.base.shape[:2]
+        self.contours = contours
+        self.contour_dict = contour_dict
+        self.bboxes = bboxes
+        self.image = self.base.copy()
+        self._image_flat = self.image.reshape(-1, self.image.shape[2])
+        self._counts = np.zeros((len(LAYER_COLORS), height * width), dtype=np.uint8)
+        self._strokes = {}  # {(contour_id, thickness): 筆畫像素的平面索引}
+        self._drawn = set()  # {(contour_id, layer)}
+
+    def _stroke(self, contour_id, thickness):
+        """輪廓筆畫覆蓋的像素（只在輪廓外框範圍內繪製，結果快取）"""
+        key = (contour_id, thickness)
+        indices = self._strokes.get(key)
+        if indices is not None:
+            return indices
+
+        height, width = self.base.shape[:2]
+        points = self.contours[contour_id].reshape(-1, 2) >> self.level
+        if self.bboxes is not None:
+            x, y, w, h = self.bboxes[contour_id].tolist()
+            x_min, y_min = x >> self.level, y >> self.level
+            x_max, y_max = (x + w - 1) >> self.level, (y + h - 1) >> self.level
+        else:
+            x_min, y_min = points.min(axis=0).tolist()
+            x_max, y_max = points.max(axis=0).tolist()
+        x0, y0 = max(x_min - thickness, 0), max(y_min - thickness, 0)
+        x1, y1 = min(x_max + thickness + 1, width), min(y_max + thickness + 1, height)
+
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.polylines(mask, [points - (x0, y0)], isClosed=True, color=1, thickness=thickness)
+        ys, xs = np.nonzero(mask)
+        indices = (ys + y0) * width + (xs + x0)
+        self._strokes[key] = indices
+        return indices
+
+    def visible_layers(self, checkbox_states, selected_contour_id=None):
+        """依勾選狀態與選取的輪廓，列出要畫的 {(contour_id, layer)}"""
+        wanted = set()
+        for outer, holes in self.contour_dict.items():
+            if not checkbox_states.get(outer, True):
+                continue  # 外輪廓沒勾選時整組都不畫
+            wanted.add((outer, LAYER_OUTER))
+            wanted.update((hole, LAYER_HOLE) for hole in holes if checkbox_states.get(hole, True))
+
+        # **高亮選取的整組輪廓（外輪廓 + 所有內洞）**
+        if selected_contour_id in self.contour_dict and checkbox_states.get(selected_contour_id, True):
+            wanted.add((selected_contour_id, LAYER_HIGHLIGHT))
+            wanted.update((hole, LAYER_HIGHLIGHT) for hole in self.contour_dict[selected_contour_id])
+        return wanted
+
+    def update(self, checkbox_states, selected_contour_id=None):
+        """
+        只更新與上次不同的輪廓並回傳輸出圖（同一個陣列，原地更新）
+        :return: (N, M, 3) 疊好輪廓的影像
+        """
+        with span("overlay", contours=len(self.contours)):
+            return self._update(checkbox_states, selected_contour_id)
+
+    def _update(self, checkbox_states, selected_contour_id):
+        wanted = self.visible_layers(checkbox_states, selected_contour_id)
+        added = wanted - self._drawn
+        removed = self._drawn - wanted
+        if not added and not removed:
+            return self.image
+
+        dirty = []
+        for contour_id, layer in removed:
+            indices = self._stroke(contour_id, LAYER_THICKNESS[layer])
+            self._counts[layer, indices] -= 1
+            dirty.append(indices)
+        for contour_id, layer in added:
+            # **同一輪廓的筆畫索引不重複，可以直接用索引加減**
+            indices = self._stroke(contour_id, LAYER_THICKNESS[layer])
+            self._counts[layer, indices] += 1
+            dirty.append(indices)
+        self._drawn = wanted
+
+        # **只合成變動的像素：先還原底圖，再依圖層順序蓋上顏色（重複索引寫入的值相同，不必去重）**
+        dirty = np.concatenate(dirty)
+        pixels = self._base_flat[dirty].copy()
+        for layer, color in enumerate(LAYER_COLORS):
+            pixels[self._counts[layer, dirty] > 0] = color
+        self._image_flat[dirty] = pixels
+        return self.image
@@ -0,0 +1,143 @@
+"""
+平行拉伸：外輪廓 + 內洞為一組，分批交給多個行程；輪廓點放在共享記憶體，
+工作只傳遞各環在共享陣列中的區段，結果依輸入順序合併（輸出與單行程相同）
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from instrument import recorder, span
+from pipeline import DEFAULT_MIN_CELL_SIZE, ContourIndex, _extrude, iter_extruded_faces
+
+GROUPS_PER_WORKER = 8  # 每個行程平均分到幾批，批次越小負載越平均
+MAX_CHUNK = 32  # 每批最多幾組輪廓
+
+_attached = {}  # 子行程：{共享記憶體名稱: (SharedMemory, points)}
+
+
+class SharedContours:
+    """
+    把輪廓點依序串成一個 (P, 1, 2) int32 陣列放進共享記憶體
+    :param contours: 依打包順序排列的輪廓
+    """
+
+    def __init__(self, contours):
+        lengths = np.array([len(c) for c in contours], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.total = int(self.offsets[-1])
+        self.shm = shared_memory.SharedMemory(create=True, size=max(self.total * 8, 1))
+        points = np.ndarray((self.total, 1, 2), dtype=np.int32, buffer=self.shm.buf)
+        if contours:
+            np.concatenate([c.reshape(-1, 1, 2) for c in contours], out=points, casting="same_kind")
+        del points
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spans(self, first, count):
+        """第 first 個起連續 count 個輪廓的 [(start, end)]"""
+        return [(int(self.offsets[i]), int(self.offsets[i + 1])) for i in range(first, first + count)]
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _init_worker():
+    # **每個行程只用單執行緒的 OpenCV；fork 時帶過來的 span 不屬於這個行程**
+    import cv2
+    cv2.setNumThreads(1)
+    recorder.clear()
+
+
+def _points(name, total):
+    """子行程取得共享的輪廓點（同一塊共享記憶體只連接一次，換新的時放掉舊的）"""
+    entry = _attached.get(name)
+    if entry is None:
+        for old_name in list(_attached):
+            shm, _ = _attached.pop(old_name)
+            try:
+                shm.close()
+            except BufferError:
+                pass  # **仍有殘留的 view 時交給行程結束回收**
+        shm = shared_memory.SharedMemory(name=name)
+        entry = _attached[name] = (shm, np.ndarray((total, 1, 2), dtype=np.int32, buffer=shm.buf))
+    return entry[1]
+
+
+def _extrude_chunk(name, total, chunk, z_height, grid_size, mode, fill_base, fill_top, min_cell_size):
+    """
+    子行程執行的一批工作
+    :param chunk: [(contour_id, [(start, end)] 外輪廓在前、內洞在後)]
+    :return: ([面片陣列], 這批工作的 span)
+    """
+    points = _points(name, total)
+    faces = []
+    for contour_id, spans in chunk:
+        rings = [points[start:end] for start, end in spans]
+        with span("extrude", contour_id=contour_id, mode=mode):
+            faces.append(_extrude(rings[0], rings[1:], z_height, grid_size, mode, fill_base, fill_top, min_cell_size))
+        del rings
+    return faces, recorder.drain()
+
+
+def iter_extruded_faces_parallel(contour_ids, contours, hierarchy, z_height, grid_size, mode="voxel",
+                                 fill_base=True, fill_top=True, index=None, min_cell_size=DEFAULT_MIN_CELL_SIZE,
+                                 workers=None):
+    """
+    與 iter_extruded_faces 相同，但分給多個行程計算；依 contour_ids 順序逐個輪廓產生面片批次，
+    同時在途的批次有上限，記憶體不會隨輪廓數增加
+    :param workers: 行程數，預設為 CPU 數；只有一個行程或只有一個輪廓時直接在本行程計算
+    """
+    contour_ids = [int(i) for i in contour_ids]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(contour_ids) <= 1:
+        yield from iter_extruded_faces(contour_ids, contours, hierarchy, z_height, grid_size, mode,
+                                       fill_base, fill_top, index, min_cell_size)
+        return
+    if index is None:
+        index = ContourIndex(contours, hierarchy)
+
+    # **只打包要拉伸的輪廓：每組外輪廓後面緊接著它的內洞**
+    groups = [[contour_id] + index.holes.get(contour_id, []) for contour_id in contour_ids]
+    packed = [contours[i] for group in groups for i in group]
+    chunk_size = max(1, min(MAX_CHUNK, len(groups) // (workers * GROUPS_PER_WORKER)))
+
+    with SharedContours(packed) as shared, \
+            ProcessPoolExecutor(max_workers=min(workers, len(groups)), initializer=_init_worker) as pool:
+        tasks = []
+        first = 0
+        for group in groups:
+            tasks.append((group[0], shared.spans(first, len(group))))
+            first += len(group)
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+        def submit(chunk):
+            return pool.submit(_extrude_chunk, shared.name, shared.total, chunk, z_height, grid_size, mode,
+                               fill_base, fill_top, min_cell_size)
+
+        # **最多 2 倍行程數的批次在途，依提交順序取回結果**
+        window = 2 * workers
+        pending = [submit(chunk) for chunk in chunks[:window]]
+        try:
+            for k in range(len(chunks)):
+                faces, spans = pending[k].result()
+                pending[k] = None
+                if k + window < len(chunks):
+                    pending.append(submit(chunks[k + window]))
+                recorder.extend(spans)
+                yield from faces
+        finally:
+            # **中途停止（例如取消輸出）時，尚未開始的批次不必再算**
+            for future in pending:
+                if future is not None:
+                    future.cancel()
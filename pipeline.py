@@ -0,0 +1,474 @@
+"""不依賴 Qt 的核心流程：灰階 → 二值化 → 找輪廓 → 拉伸 → 輸出網格"""
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from disk_cache import DiskCache, image_hash
+from instrument import get_logger, span
+from mesh_io import write_mesh
+from simplify import simplify_contours
+from tiles import DEFAULT_TILE_SIZE, RASTER_EXTENSIONS, open_raster, tiled_contours
+from triangulate import extrude_polygon
+from voxel import contour_occupancy, cube_mesh, quadtree_depth, quadtree_mesh, surface_mesh
+
+MESH_MODES = ("surface", "exact", "voxel", "quadtree")
+DEFAULT_MIN_CELL_SIZE = 2  # 四分樹模式最小格子（像素）
+PREVIEW_PIXELS = 1024 * 1024  # 預覽層級的像素上限，拖動時的延遲與原圖大小無關
+DEFAULT_SIMPLIFY_TOLERANCE = 1.0  # 輪廓簡化的容差（像素）
+
+log = get_logger("pipeline")
+
+
+def load_image(image_path):
+    """讀取圖片，失敗時拋出 FileNotFoundError"""
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"Cannot load image: {image_path}")
+    return image
+
+
+def to_gray(image):
+    """轉為灰階（已是單通道則直接回傳）"""
+    if image.ndim != 3:
+        return image
+    with span("gray", shape=image.shape[:2]):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def threshold_contours(gray, threshold_value):
+    """
+    對灰階圖二值化並找出輪廓（RETR_CCOMP：外輪廓 + 內洞兩層）
+    :return: (contours, hierarchy)，hierarchy 為 (N, 4) 陣列；沒有輪廓時為 None
+    """
+    with span("threshold", threshold=threshold_value):
+        _, binary = cv2.threshold(gray, threshold_value, 255, cv2.THRESH_BINARY_INV)
+    with span("find_contours"):
+        contours, hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours or hierarchy is None:
+        return contours, None
+    return contours, hierarchy[0]
+
+
+def find_contours(image, threshold_value):
+    """二值化並找出輪廓，見 threshold_contours"""
+    return threshold_contours(to_gray(image), threshold_value)
+
+
+def preview_level(shape, max_pixels=PREVIEW_PIXELS):
+    """影像金字塔中第一個不超過 max_pixels 的層級（0 為原圖，每層長寬減半）"""
+    height, width = shape[:2]
+    level = 0
+    while height * width > max_pixels and min(height, width) > 1:
+        height, width = (height + 1) // 2, (width + 1) // 2
+        level += 1
+    return level
+
+
+def pyramid_level(image, level):
+    """以 pyrDown 縮小 level 次（先模糊再取樣，細線不會直接消失）"""
+    for _ in range(level):
+        image = cv2.pyrDown(image)
+    return image
+
+
+def scale_contours(contours, level):
+    """把第 level 層的輪廓座標放大回原圖（取每個像素區塊的中心）"""
+    if not level:
+        return contours
+    scale = 1 << level
+    return tuple(c * scale + scale // 2 for c in contours)
+
+
+class ContourIndex:
+    """
+    每次 findContours 結果只建一次的層級索引：
+    外輪廓 → 內洞、內洞 → 外輪廓、各輪廓面積與外框（一次向量化算完）
+    """
+
+    def __init__(self, contours, hierarchy):
+        count = len(contours) if hierarchy is not None else 0
+        self.parent = hierarchy[:, 3].copy() if count else np.empty(0, dtype=np.int32)
+        self.areas, self.bboxes = self._measure(contours[:count])
+
+        # **沿著 first_child → next 鏈走一次，每個內洞只會被走到一次，總共 O(N)**
+        self.holes = {}  # {外輪廓: [內洞列表]}
+        self.hole_to_parent = {}  # {內洞: 外輪廓}
+        for i in np.flatnonzero(self.parent == -1).tolist():
+            holes = []
+            child = hierarchy[i][2]
+            while child != -1:
+                holes.append(int(child))
+                self.hole_to_parent[int(child)] = i
+                child = hierarchy[child][0]
+            self.holes[i] = holes
+
+        # **淨面積 = 外輪廓面積 - 所有內洞面積（以 bincount 一次加總）**
+        is_hole = self.parent >= 0
+        hole_sum = np.bincount(self.parent[is_hole], weights=self.areas[is_hole], minlength=count)
+        self.net_areas = self.areas - hole_sum
+
+    @staticmethod
+    def _measure(contours):
+        """
+        所有輪廓串在一起，以 reduceat 一次算出面積（鞋帶公式）與外框
+        :return: (面積 (N,) float64, 外框 (N, 4) int32 [x, y, w, h]，與 cv2.boundingRect 相同)
+        """
+        if not len(contours):
+            return np.empty(0), np.empty((0, 4), dtype=np.int32)
+
+        lengths = np.array([len(c) for c in contours])
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+        # **每點的下一點；各輪廓最後一點接回自己的起點**
+        following = np.arange(1, len(points) + 1)
+        following[starts + lengths - 1] = starts
+        x = points[:, 0].astype(np.float64)
+        y = points[:, 1].astype(np.float64)
+        cross = x * y[following] - x[following] * y
+        areas = np.abs(np.add.reduceat(cross, starts)) / 2
+
+        mins = np.minimum.reduceat(points, starts)
+        maxs = np.maximum.reduceat(points, starts)
+        bboxes = np.concatenate((mins, maxs - mins + 1), axis=1).astype(np.int32)
+        return areas, bboxes
+
+    @property
+    def outer_ids(self):
+        return list(self.holes)
+
+    @property
+    def nbytes(self):
+        return self.parent.nbytes + self.areas.nbytes + self.bboxes.nbytes + self.net_areas.nbytes
+
+    def select(self, min_contour_area):
+        """
+        挑出淨面積足夠的外輪廓
+        :return: ({外輪廓: [內洞列表]}, 過小輪廓的 ID 集合)
+        """
+        contour_dict = {}
+        invalid_contours = set()
+        for i, holes in self.holes.items():
+            if self.net_areas[i] >= min_contour_area:
+                contour_dict[i] = holes
+            else:
+                invalid_contours.add(i)
+        return contour_dict, invalid_contours
+
+
+class ContourCache:
+    """
+    以 threshold 為 key 的 LRU 快取（二值化 + findContours 的結果），
+    灰階圖每張圖只算一次；總記憶體超過 max_bytes 時淘汰最久沒用到的結果。
+    可同時被 UI 與背景執行緒使用，計算過程不持有鎖。
+    指定 disk（DiskCache）時，原圖解析度的結果也以圖片雜湊存到磁碟，重開同一張圖直接讀回
+    """
+
+    def __init__(self, image=None, max_bytes=256 * 1024 * 1024, disk=None):
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.image_key = None  # **圖片內容雜湊（有 disk 時才計算）**
+        self.gray = None
+        self._levels = {}  # {金字塔層級: 灰階圖}
+        self._entries = OrderedDict()  # {(level, threshold, tolerance): (contours, hierarchy, index, nbytes)}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if image is not None:
+            self.set_image(image)
+
+    def set_image(self, image):
+        """換圖：重新計算灰階並清空快取"""
+        gray = to_gray(image)
+        # **輪廓只由灰階決定，雜湊灰階即可（資料量為彩色的 1/3）**
+        image_key = image_hash(gray) if self.disk is not None else None
+        with self._lock:
+            self.image_key = image_key
+            self.gray = gray
+            self._levels = {0: gray}
+            self._entries.clear()
+            self._bytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, threshold_value):
+        return (0, threshold_value, 0) in self._entries
+
+    def level_gray(self, level):
+        """第 level 層的灰階圖（每層只縮一次）"""
+        with self._lock:
+            levels = self._levels
+            gray = levels.get(level)
+        if gray is None:
+            gray = pyramid_level(levels[0], level)
+            levels[level] = gray
+        return gray
+
+    def get(self, threshold_value, level=0, tolerance=0):
+        """回傳 (contours, hierarchy)，命中時不重新計算"""
+        contours, hierarchy, _ = self.get_indexed(threshold_value, level, tolerance)
+        return contours, hierarchy
+
+    def get_indexed(self, threshold_value, level=0, tolerance=0):
+        """
+        回傳 (contours, hierarchy, ContourIndex)，索引與輪廓一起快取
+        :param level: 金字塔層級，> 0 時在縮小的圖上計算，輪廓座標仍放大回原圖
+        :param tolerance: 簡化容差（像素），> 0 時回傳簡化後的輪廓（hierarchy 不變）
+        """
+        key = (level, threshold_value, tolerance)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[:3]
+            self.misses += 1
+            gray = self.gray
+            image_key = self.image_key
+
+        # **預覽層級算得很快，只有原圖解析度的結果存到磁碟**
+        disk = self.disk if level == 0 and image_key is not None else None
+        stored = disk.load_contours(image_key, threshold=threshold_value, tolerance=tolerance, tiled=False) if disk else None
+        if stored is not None:
+            contours, hierarchy = stored
+        elif tolerance > 0:
+            # **簡化建立在未簡化的結果上（同樣會被快取）**
+            contours, hierarchy, index = self.get_indexed(threshold_value, level)
+            with span("simplify", tolerance=tolerance):
+                contours = simplify_contours(contours, index, tolerance)
+        else:
+            contours, hierarchy = threshold_contours(self.level_gray(level) if level else gray, threshold_value)
+            contours = scale_contours(contours, level)
+        if disk and stored is None:
+            _save_contours(disk, image_key, contours, hierarchy, threshold=threshold_value, tolerance=tolerance,
+                           tiled=False)
+        with span("hierarchy_index", contours=len(contours)):
+            index = ContourIndex(contours, hierarchy)
+        # **簡化後的項目與未簡化的共用 hierarchy，不重複計入**
+        shared = tolerance > 0 or hierarchy is None
+        nbytes = sum(c.nbytes for c in contours) + (0 if shared else hierarchy.nbytes) + index.nbytes
+
+        with self._lock:
+            # **計算期間換了圖就不存入（結果屬於舊圖）**
+            if self.gray is not gray:
+                return contours, hierarchy, index
+            if key not in self._entries:
+                self._entries[key] = (contours, hierarchy, index, nbytes)
+                self._bytes += nbytes
+
+            # **超過記憶體上限時淘汰最舊的結果（至少保留這一筆）**
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, _, old_bytes) = self._entries.popitem(last=False)
+                self._bytes -= old_bytes
+        return contours, hierarchy, index
+
+
+def calculate_contour_area(contour_id, contours, hierarchy, index=None):
+    """
+    計算外輪廓扣除內洞後的面積
+    :param index: 已建好的 ContourIndex（沒有時臨時建立）
+    """
+    if index is None:
+        index = ContourIndex(contours, hierarchy)
+    return float(index.net_areas[contour_id])
+
+
+def select_contours(contours, hierarchy, min_contour_area, index=None):
+    """
+    挑出面積足夠的外輪廓
+    :return: ({外輪廓: [內洞列表]}, 過小輪廓的 ID 集合)
+    """
+    if index is None:
+        index = ContourIndex(contours, hierarchy)
+    return index.select(min_contour_area)
+
+
+def vertex_counts(contours):
+    """各輪廓的頂點數 (N,)"""
+    return np.array([len(c) for c in contours], dtype=np.int64)
+
+
+def process_threshold(cache, threshold_value, min_contour_area, level=0, tolerance=0):
+    """
+    一次完成 threshold 改變後需要的計算（可在背景執行緒執行）
+    :param level: 金字塔層級，拖動時用縮小的圖預覽，0 為原圖
+    :param tolerance: 簡化容差（像素），0 為不簡化；疊圖與拉伸都使用簡化後的輪廓
+    :return: {"threshold", "level", "tolerance", "contours", "hierarchy", "index", "contour_dict",
+              "invalid_contours", "vertex_counts": (簡化前, 簡化後)}
+    """
+    contours, hierarchy, index = cache.get_indexed(threshold_value, level, tolerance)
+    original = cache.get(threshold_value, level)[0] if tolerance > 0 else contours
+    contour_dict, invalid_contours = index.select(min_contour_area)
+    return {
+        "threshold": threshold_value,
+        "level": level,
+        "tolerance": tolerance,
+        "vertex_counts": (vertex_counts(original), vertex_counts(contours)),
+        "contours": contours,
+        "hierarchy": hierarchy,
+        "index": index,
+        "contour_dict": contour_dict,
+        "invalid_contours": invalid_contours,
+    }
+
+
+def extrude_single_contour(contour_id, contours, hierarchy, z_height, grid_size, mode="voxel",
+                           fill_base=True, fill_top=True, index=None, min_cell_size=DEFAULT_MIN_CELL_SIZE):
+    """
+    拉伸單個輪廓（包含內孔洞），回傳 (N, 3, 3) 面片陣列
+    :param mode: "voxel" 逐格立方體、"surface" 只輸出合併後的外表面、"exact" 依輪廓三角剖分精確拉伸、
+                 "quadtree" 內部用 grid_size 大格，邊界格細分到 min_cell_size
+    :param fill_base: 是否封底（僅 "exact" 模式，體素模式永遠封閉）
+    :param fill_top: 是否封頂（僅 "exact" 模式）
+    :param index: 已建好的 ContourIndex（沒有時臨時建立）
+    :param min_cell_size: 四分樹模式的最小格子（像素）
+    """
+    if index is None:
+        index = ContourIndex(contours, hierarchy)
+    with span("extrude", contour_id=int(contour_id), mode=mode):
+        return _extrude(contours[contour_id], [contours[i] for i in index.holes.get(contour_id, [])],
+                        z_height, grid_size, mode, fill_base, fill_top, min_cell_size)
+
+
+def _extrude(outer_contour, hole_contours, z_height, grid_size, mode, fill_base, fill_top,
+             min_cell_size=DEFAULT_MIN_CELL_SIZE):
+    if mode == "exact":
+        # **直接三角剖分外輪廓與內洞，面數只與頂點數有關**
+        return extrude_polygon(outer_contour, hole_contours, z_height, fill_base, fill_top)
+
+    if mode == "quadtree":
+        # **在最細層算佔據表，再把全滿的 2x2 子格一路合併回 grid_size 大格**
+        depth = quadtree_depth(grid_size, min_cell_size)
+        cell_size = grid_size / (1 << depth)
+        x_min, y_min, occupancy = contour_occupancy(outer_contour, hole_contours, cell_size)
+        return quadtree_mesh(x_min, y_min, occupancy, cell_size, depth, z_height)
+
+    # **一次算出整個棋盤格的佔據表（格中心在外輪廓內且不在內洞內）**
+    x_min, y_min, occupancy = contour_occupancy(outer_contour, hole_contours, grid_size)
+
+    if mode == "surface":
+        # **剔除內部共用面，並合併共平面的方格**
+        return surface_mesh(x_min, y_min, occupancy, grid_size, z_height)
+
+    # **只為被佔據的方格建立立方體（以 x 為外層，順序與逐格掃描相同）**
+    return cube_mesh(x_min, y_min, occupancy, grid_size, z_height)
+
+
+def iter_extruded_faces(contour_ids, contours, hierarchy, z_height, grid_size, mode="voxel",
+                        fill_base=True, fill_top=True, index=None, min_cell_size=DEFAULT_MIN_CELL_SIZE):
+    """逐個輪廓產生面片批次，供 write_mesh 串流寫入"""
+    if index is None:
+        index = ContourIndex(contours, hierarchy)
+    for contour_id in contour_ids:
+        yield extrude_single_contour(contour_id, contours, hierarchy, z_height, grid_size,
+                                     mode, fill_base, fill_top, index, min_cell_size)
+
+
+def convert_plan(image_path, output_path, threshold_value=200, min_contour_area=100, z_height=100,
+                 grid_size=10, mode="surface", fill_base=True, fill_top=True, tile_size=None, raster_shape=None,
+                 simplify_tolerance=DEFAULT_SIMPLIFY_TOLERANCE, min_cell_size=DEFAULT_MIN_CELL_SIZE, workers=1,
+                 cache_dir=None):
+    """
+    將一張平面圖轉成網格檔
+    :param simplify_tolerance: 輪廓簡化容差（像素），0 為不簡化
+    :param min_cell_size: "quadtree" 模式的最小格子（像素）
+    :param workers: 拉伸用的行程數，> 1 時各組輪廓分給行程池平行計算
+    :param cache_dir: 持久化快取資料夾；同一張圖、同樣參數輸出過時只複製快取中的網格檔
+    :param tile_size: 指定時以記憶體映射分塊處理（.npy / .raw 點陣一律分塊）
+    :param raster_shape: .raw 點陣的 (H, W) 或 (H, W, C)
+    :return: {"contours": 輸出的外輪廓數, "facets": 面片數, "seconds": 耗時, "cached": 是否直接複製快取}
+    """
+    start = time.perf_counter()
+    with span("convert_plan", image=image_path):
+        return _convert_plan(image_path, output_path, threshold_value, min_contour_area, z_height, grid_size, mode,
+                             fill_base, fill_top, tile_size, raster_shape, simplify_tolerance, min_cell_size, workers, cache_dir, start)
+
+
+def _convert_plan(image_path, output_path, threshold_value, min_contour_area, z_height, grid_size, mode,
+                  fill_base, fill_top, tile_size, raster_shape, simplify_tolerance, min_cell_size, workers,
+                  cache_dir, start):
+    tiled = bool(tile_size) or image_path.lower().endswith(RASTER_EXTENSIONS)
+    # **峰值記憶體只與區塊大小有關，不必整張圖讀進記憶體**
+    image = open_raster(image_path, raster_shape) if tiled else to_gray(load_image(image_path))
+
+    disk = DiskCache(cache_dir) if cache_dir else None
+    image_key = image_hash(image) if disk else None
+    # **影響網格內容的所有參數（分塊與否、行程數不影響）**
+    mesh_params = dict(threshold=threshold_value, min_area=min_contour_area, tolerance=simplify_tolerance,
+                       z_height=z_height, grid_size=grid_size, mode=mode, fill_base=fill_base, fill_top=fill_top,
+                       min_cell_size=min_cell_size)
+    if disk:
+        info = disk.copy_mesh(image_key, output_path, **mesh_params)
+        if info is not None:
+            return {**info, "seconds": time.perf_counter() - start, "cached": True}
+
+    # **分塊的輪廓順序與整張圖不同，分開快取**
+    contours, hierarchy = _stored_contours(
+        disk, image_key,
+        lambda: (tiled_contours(image, threshold_value, tile_size or DEFAULT_TILE_SIZE) if tiled
+                 else find_contours(image, threshold_value)),
+        threshold=threshold_value, tolerance=0, tiled=tiled,
+    )
+    index = ContourIndex(contours, hierarchy)
+    if simplify_tolerance > 0:
+        def simplify():
+            with span("simplify", tolerance=simplify_tolerance):
+                return simplify_contours(contours, index, simplify_tolerance), hierarchy
+
+        contours, hierarchy = _stored_contours(disk, image_key, simplify, threshold=threshold_value,
+                                               tolerance=simplify_tolerance, tiled=tiled)
+        index = ContourIndex(contours, hierarchy)
+    contour_ids = list(index.select(min_contour_area)[0])
+
+    if workers > 1:
+        from parallel import iter_extruded_faces_parallel  # **parallel 依賴本模組，延遲匯入避免循環**
+        faces = iter_extruded_faces_parallel(contour_ids, contours, hierarchy, z_height, grid_size, mode,
+                                             fill_base, fill_top, index, min_cell_size, workers)
+    else:
+        faces = iter_extruded_faces(contour_ids, contours, hierarchy, z_height, grid_size, mode, fill_base, fill_top,
+                                    index, min_cell_size)
+    facets = write_mesh(output_path, faces)
+    if disk:
+        try:
+            disk.store_mesh(image_key, output_path, len(contour_ids), facets, **mesh_params)
+        except OSError as e:
+            log.warning("Could not write mesh cache: %s", e)
+    return {
+        "contours": len(contour_ids),
+        "facets": facets,
+        "seconds": time.perf_counter() - start,
+        "cached": False,
+    }
+
+
+def _stored_contours(disk, image_key, compute, **params):
+    """有持久化快取時先讀取，沒有才呼叫 compute() 並存入"""
+    stored = disk.load_contours(image_key, **params) if disk else None
+    if stored is not None:
+        return stored
+    contours, hierarchy = compute()
+    if disk:
+        _save_contours(disk, image_key, contours, hierarchy, **params)
+    return contours, hierarchy
+
+
+def _save_contours(disk, image_key, contours, hierarchy, **params):
+    """寫入持久化快取失敗（例如磁碟已滿）只記錄警告，不影響結果"""
+    try:
+        disk.save_contours(image_key, contours, hierarchy, **params)
+    except OSError as e:
+        log.warning("Could not write contour cache: %s", e)
@@ -0,0 +1,442 @@
+"""
+本機轉換服務：常駐的 HTTP 伺服器 + 預先載入流程的行程池，省去每次轉換啟動 Python、匯入 cv2 的成本；
+排隊中的請求有上限（滿了回 503 讓用戶端稍後重試），網格檔分塊串流回傳，/stats 提供吞吐量與延遲統計
+
+    POST /convert?threshold=200&mode=surface&format=stl   內容為圖片檔（PNG / JPEG ...）
+    GET  /stats                                           計數與延遲（JSON）
+    GET  /health                                          行程數與佇列上限（JSON）
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import instrument
+from mesh_io import MESH_FORMATS
+from pipeline import MESH_MODES, convert_plan, threshold_contours
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 16  # 除了執行中的請求之外，最多再排隊幾個
+DEFAULT_MAX_UPLOAD = 256 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024  # 上傳 / 回傳時每次讀寫的大小
+LATENCY_WINDOW = 1024  # 延遲百分位數依最近幾筆請求計算
+REQUEST_TIMEOUT = 60  # 連線閒置超過幾秒就放棄（避免慢速上傳佔住執行緒）
+
+log = instrument.get_logger("server")
+
+
+def _flag(text):
+    if text.lower() in ("1", "true", "yes", "on"):
+        return True
+    if text.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"invalid boolean: {text!r}")
+
+
+def _mode(text):
+    if text not in MESH_MODES:
+        raise ValueError(f"unknown mode: {text!r}")
+    return text
+
+
+# **查詢參數 → convert_plan 的參數（名稱與 cli.py 的選項相同）**
+CONVERT_PARAMS = {
+    "threshold": ("threshold_value", int),
+    "min_area": ("min_contour_area", float),
+    "simplify": ("simplify_tolerance", float),
+    "height": ("z_height", float),
+    "grid_size": ("grid_size", int),
+    "mode": ("mode", _mode),
+    "min_cell_size": ("min_cell_size", float),
+    "fill_base": ("fill_base", _flag),
+    "fill_top": ("fill_top", _flag),
+}
+
+
+def parse_convert_query(query):
+    """
+    解析 /convert 的查詢字串
+    :return: (convert_plan 的參數, 輸出副檔名)；參數錯誤時拋出 ValueError
+    """
+    options = {}
+    mesh_format = ".stl"
+    for name, values in parse_qs(query, keep_blank_values=True).items():
+        value = values[-1]
+        if name == "format":
+            mesh_format = f".{value.lower().lstrip('.')}"
+            if mesh_format not in MESH_FORMATS:
+                raise ValueError(f"unknown format: {value!r}")
+        elif name in CONVERT_PARAMS:
+            key, parse = CONVERT_PARAMS[name]
+            try:
+                options[key] = parse(value)
+            except ValueError as e:
+                raise ValueError(f"{name}: {e}") from None
+        else:
+            raise ValueError(f"unknown parameter: {name!r}")
+    return options, mesh_format
+
+
+class ServiceStats:
+    """請求計數、傳輸量與延遲（處理執行緒共用，以 lock 保護）"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.monotonic()
+        self.accepted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._latencies = deque(maxlen=window)  # 收到請求 → 回傳完成（秒）
+        self._service_times = deque(maxlen=window)  # 工作行程內的轉換時間（秒）
+        self._lock = threading.Lock()
+
+    def accept(self):
+        with self._lock:
+            self.accepted += 1
+            self.in_flight += 1
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def finish(self, ok, latency, service_time=None, bytes_in=0, bytes_out=0):
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self.completed += 1
+                self._latencies.append(latency)
+                if service_time is not None:
+                    self._service_times.append(service_time)
+            else:
+                self.failed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    @staticmethod
+    def _summary(values):
+        if not values:
+            return {"count": 0}
+        ms = np.asarray(values) * 1000
+        p50, p90, p99 = np.percentile(ms, (50, 90, 99))
+        return {"count": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(p50), "p90_ms": float(p90),
+                "p99_ms": float(p99), "max_ms": float(ms.max())}
+
+    def snapshot(self):
+        """:return: 可轉成 JSON 的統計"""
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            latencies, service_times = list(self._latencies), list(self._service_times)
+            snapshot = {
+                "uptime_seconds": uptime,
+                "accepted": self.accepted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "in_flight": self.in_flight,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "requests_per_second": self.completed / uptime if uptime else 0.0,
+            }
+        snapshot["latency"] = self._summary(latencies)
+        snapshot["service_time"] = self._summary(service_times)
+        return snapshot
+
+
+def _init_worker(trace, log_level):
+    # **每個行程只用單執行緒的 OpenCV，避免和其他請求搶 CPU**
+    import cv2
+    cv2.setNumThreads(1)
+    instrument.enable_tracing(trace)
+    if log_level:
+        instrument.configure_logging(log_level)
+
+
+def _warm_up():
+    """讓工作行程先跑一次 OpenCV（載入與初始化），第一個請求不必付這個成本"""
+    image = np.zeros((16, 16), dtype=np.uint8)
+    image[4:12, 4:12] = 255
+    threshold_contours(image, 128)
+    return os.getpid()
+
+
+def _convert(input_path, output_path, options):
+    """工作行程執行的轉換，錯誤轉成 (型別, 訊息) 回傳（trace 開啟時一併送回 span）"""
+    try:
+        result, error = convert_plan(input_path, output_path, **options), None
+    except Exception as e:
+        result, error = None, (type(e).__name__, str(e))
+    return result, error, instrument.recorder.drain()
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """
+    每個連線一個執行緒；執行中 + 排隊的請求最多 workers + queue_size 個，
+    超過時不排隊、不寫暫存檔，直接回 503（Retry-After）
+    """
+
+    daemon_threads = True
+    request_queue_size = 64  # **listen 的 backlog；真正的上限由名額控制，連線本身不必被拒絕**
+
+    def __init__(self, address, workers=None, queue_size=DEFAULT_QUEUE_SIZE, options=None,
+                 max_upload=DEFAULT_MAX_UPLOAD, spool_dir=None, log_level=None):
+        """
+        :param options: 所有請求共用的 convert_plan 參數（例如 cache_dir），請求的查詢參數優先
+        :param spool_dir: 上傳與輸出的暫存資料夾，預設為系統暫存資料夾下新建的資料夾
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.queue_size = max(0, queue_size)
+        self.options = dict(options or {})
+        self.max_upload = max_upload
+        self.stats = ServiceStats()
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._own_spool = spool_dir is None
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="plan2mesh-server-")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._initargs = (instrument.recorder.enabled, log_level)
+        self._pool_lock = threading.Lock()
+        self.pool = self._new_pool()
+        # **在開 socket、起處理執行緒之前就建好所有行程：子行程不帶著監聽的 socket，也不在多執行緒時 fork**
+        self.warm_up()
+        super().__init__(address, ConversionHandler)
+
+    def _new_pool(self, context=None):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                   initargs=self._initargs)
+
+    def warm_up(self):
+        """一次送出 workers 個暖身工作，所有行程都先建好"""
+        with instrument.span("warm_up", workers=self.workers):
+            pids = {future.result() for future in [self.pool.submit(_warm_up) for _ in range(self.workers)]}
+        log.info("Warmed up %d worker processes", len(pids))
+        return pids
+
+    def run(self, fn, *args):
+        """
+        在工作行程執行 fn 並等待結果；工作行程意外結束（例如大圖被 OOM killer 殺掉）時，
+        整個行程池都不能再用：換一個新的行程池給之後的請求，這個請求拋出 BrokenProcessPool
+        """
+        pool = self.pool
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            raise
+
+    def _replace_pool(self, broken):
+        with self._pool_lock:
+            if self.pool is not broken:
+                return  # **其他請求已經換過了**
+            # **這時已有處理執行緒在跑，新的行程不能用 fork 建立**
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self.pool = self._new_pool(multiprocessing.get_context(method))
+        log.warning("A worker process died; replaced the worker pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def try_acquire(self):
+        """取得一個執行 / 排隊的名額，滿了回傳 False"""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if self._own_spool:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    server_version = "Plan2Mesh"
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
+
+    def log_message(self, fmt, *args):
+        log.debug("%s %s", self.address_string(), fmt % args)
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _discard_body(self, length):
+        """沒讀完的上傳內容讀掉再回應，用戶端才收得到回應而不是連線被重設"""
+        while length > 0:
+            chunk = self.rfile.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/stats":
+            self._send_json(HTTPStatus.OK, self.server.stats.snapshot())
+        elif path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok", "workers": self.server.workers,
+                                            "queue_size": self.server.queue_size})
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"unknown path: {path}")
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if url.path != "/convert":
+            self._discard_body(length)
+            self._send_error(HTTPStatus.NOT_FOUND, f"unknown path: {url.path}")
+            return
+        try:
+            options, mesh_format = parse_convert_query(url.query)
+        except ValueError as e:
+            self._discard_body(length)
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        if length <= 0:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, "request body (image file) with Content-Length required")
+            return
+        if length > self.server.max_upload:
+            self.close_connection = True  # **不讀太大的上傳，回應後直接斷線**
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"image larger than {self.server.max_upload} bytes")
+            return
+
+        # **背壓：名額滿了就拒絕，不讓排隊的請求與暫存檔無限增加**
+        if not self.server.try_acquire():
+            self.server.stats.reject()
+            self._discard_body(length)
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, "conversion queue is full", {"Retry-After": "1"})
+            return
+        self.server.stats.accept()
+        try:
+            self._convert(options, mesh_format, length, start)
+        finally:
+            self.server.release()
+
+    def _convert(self, options, mesh_format, length, start):
+        spool = self.server.spool_dir
+        fd, input_path = tempfile.mkstemp(dir=spool, prefix="upload-")
+        output_path = f"{input_path}{mesh_format}"
+        ok, result, sent = False, None, 0
+        try:
+            # **上傳內容分塊寫進暫存檔，工作行程只收到路徑，不必經由管道傳整張圖**
+            with os.fdopen(fd, "wb") as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError("upload ended early")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+
+            try:
+                result, error, spans = self.server.run(_convert, input_path, output_path,
+                                                       {**self.server.options, **options})
+            except BrokenProcessPool:
+                self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "worker process died during the conversion")
+                return
+            instrument.recorder.extend(spans)
+            if error:
+                name, message = error
+                # **讀不到圖是用戶端的問題（訊息不透露暫存路徑），其他錯誤是伺服器的問題**
+                if name == "FileNotFoundError":
+                    self._send_error(HTTPStatus.BAD_REQUEST, "cannot decode the uploaded image")
+                else:
+                    log.warning("Conversion failed: %s: %s", name, message)
+                    self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{name}: {message}")
+                return
+
+            # **網格檔分塊串流回傳，記憶體與網格大小無關**
+            size = os.path.getsize(output_path)
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.send_header("X-Plan2Mesh-Contours", str(result["contours"]))
+            self.send_header("X-Plan2Mesh-Facets", str(result["facets"]))
+            self.send_header("X-Plan2Mesh-Seconds", f"{result['seconds']:.6f}")
+            self.send_header("X-Plan2Mesh-Cached", "1" if result["cached"] else "0")
+            self.end_headers()
+            with open(output_path, "rb") as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+            ok = True
+        except (ConnectionError, TimeoutError) as e:
+            self.close_connection = True
+            log.info("Client %s went away: %s", self.address_string(), e)
+        finally:
+            latency = time.perf_counter() - start
+            self.server.stats.finish(ok, latency, result["seconds"] if result else None, length, sent)
+            for path in (input_path, output_path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            if ok:
+                log.info("Converted %d bytes -> %d bytes (%d facets) in %.3fs", length, sent, result["facets"],
+                         latency)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve floor-plan to mesh conversion over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (0 picks a free port)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of warm worker processes")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="requests allowed to wait for a worker before new ones get 503")
+    parser.add_argument("--max-upload", type=int, default=DEFAULT_MAX_UPLOAD, help="largest accepted image in bytes")
+    parser.add_argument("--cache-dir", help="persistent cache directory shared by all requests")
+    parser.add_argument("--spool-dir", help="directory for uploaded images and meshes in flight")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"), help="enable logging to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.log_level:
+        instrument.configure_logging(args.log_level)
+
+    options = {"cache_dir": args.cache_dir} if args.cache_dir else {}
+    server = ConversionServer((args.host, args.port), args.jobs, args.queue, options, args.max_upload,
+                              args.spool_dir, args.log_level)
+    # **被 kill 時也走正常關閉，關掉行程池並清掉暫存資料夾**
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        host, port = server.server_address[:2]
+        print(f"Serving on http://{host}:{port} ({server.workers} workers, queue {server.queue_size})", flush=True)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
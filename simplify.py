@@ -0,0 +1,223 @@
+"""
+輪廓簡化：Douglas–Peucker（cv2.approxPolyDP），誤差上限以像素為單位，
+簡化後檢查外輪廓與內洞的拓樸仍然合法，不合法時縮小容差重試
+"""
+import cv2
+import numpy as np
+
+MIN_TOLERANCE = 0.5  # 容差縮到這以下仍不合法，就保留原輪廓
+NEIGHBOUR_CELL = 32  # 找相鄰輪廓的格子大小（像素）
+PIECE_SLACK = 1e-6  # 邊切成小段時外框外擴的量（像素）
+SMALL_EDGE_COUNT = 64  # 邊數不超過這個值時直接兩兩比較
+
+
+def _segments(rings):
+    """所有環的邊，回傳 (起點 (E, 2), 終點 (E, 2)) float64"""
+    lengths = np.array([len(r) for r in rings])
+    starts = np.concatenate([r.reshape(-1, 2) for r in rings]).astype(np.float64)
+    # **每點的下一點；各環最後一點接回自己的起點**
+    following = np.arange(1, len(starts) + 1)
+    ends = np.cumsum(lengths)
+    following[ends - 1] = ends - lengths
+    return starts, starts[following]
+
+
+def _cross(o, a, b):
+    return (a[:, 0] - o[:, 0]) * (b[:, 1] - o[:, 1]) - (a[:, 1] - o[:, 1]) * (b[:, 0] - o[:, 0])
+
+
+def _sorted_unique(values):
+    """排序後去掉重複（整數鍵直接排序比 np.unique 快）"""
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+
+def _pieces(p, q, cell):
+    """
+    把每條邊切成兩個方向都不超過 cell 的小段（長邊的段數與長度成正比）
+    :return: (所屬的邊, 小段外框左上 (M, 2), 小段外框右下 (M, 2))
+    """
+    count = np.maximum(1, np.ceil(np.abs(q - p).max(axis=1) / cell)).astype(np.int64)
+    edge = np.repeat(np.arange(len(p)), count)
+    k = np.arange(len(edge)) - np.repeat(np.cumsum(count) - count, count)
+    step = (q - p)[edge] / count[edge, None]
+    a = p[edge] + step * k[:, None]
+    b = a + step
+    # **外擴一點點：相鄰小段的端點有捨入誤差，落在段與段之間的交點仍會被兩段之一涵蓋**
+    return edge, np.minimum(a, b) - PIECE_SLACK, np.maximum(a, b) + PIECE_SLACK
+
+
+def _cell_keys(lo, hi, cell, columns):
+    """
+    每個外框涵蓋的格子（不超過 cell 的外框最多 4 格）
+    :param columns: 每列的格數（格子編號 = 列 * columns + 欄，座標不可為負）
+    :return: (外框編號, 格子編號)
+    """
+    first = np.floor(lo / cell).astype(np.int64)
+    span = np.floor(hi / cell).astype(np.int64) - first + 1
+    counts = span[:, 0] * span[:, 1]
+    box = np.repeat(np.arange(len(lo)), counts)
+    k = np.arange(len(box)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return box, (first[box, 1] + k // span[box, 0]) * columns + first[box, 0] + k % span[box, 0]
+
+
+def _edge_pairs(p, q):
+    """
+    可能相交的邊對 (i, j)，i < j（相交或相接的邊對一定在內，外框重疊但離得遠的不一定）：
+    邊切成不超過一格的小段登記到格子，只有同一格裡的邊才配對，
+    長邊只和它經過的格子裡的邊配對，不會和整個 x 範圍內的邊都配對
+    """
+    lo, hi = np.minimum(p, q), np.maximum(p, q)
+    if len(p) <= SMALL_EDGE_COUNT:
+        # **邊很少時直接兩兩比較外框，建格子反而比較慢**
+        i, j = np.triu_indices(len(p), 1)
+        keep = np.all((lo[j] <= hi[i]) & (lo[i] <= hi[j]), axis=1)
+        return i[keep], j[keep]
+
+    origin = lo.min(axis=0) - 1
+    p, q = p - origin, q - origin
+    # **格子大小取邊的平均間距：每格平均只有少數幾條邊，長邊切成的段數與長度成正比**
+    width, height = np.maximum(p, q).max(axis=0)
+    cell = max(1.0, float(np.sqrt(width * height / len(p))))
+    columns = int(width // cell) + 2
+
+    edge, piece_lo, piece_hi = _pieces(p, q, cell)
+    piece, key = _cell_keys(piece_lo, piece_hi, cell, columns)
+    entries = _sorted_unique(key * len(p) + edge[piece])  # **同一條邊在同一格只登記一次，並依 (格子, 邊) 排序**
+    key, edge = entries // len(p), entries % len(p)
+
+    # **同一格內每條邊和它之後的邊配對；兩條邊共用好幾格時去掉重複**
+    following = np.searchsorted(key, key, side="right") - np.arange(len(key)) - 1
+    position = np.repeat(np.arange(len(key)), following)
+    partner = position + 1 + np.arange(len(position)) - np.repeat(np.cumsum(following) - following, following)
+    pairs = _sorted_unique(edge[position] * len(p) + edge[partner])
+    i, j = pairs // len(p), pairs % len(p)
+
+    keep = np.all((lo[j] <= hi[i]) & (lo[i] <= hi[j]), axis=1)
+    return i[keep], j[keep]
+
+
+class _RingGrid:
+    """
+    各輪廓實際經過哪些格子（不是外框涵蓋的範圍）：
+    包住整張圖的外輪廓只登記在它的邊經過的格子，查詢某個範圍時不會被當成每個群組的鄰居
+    """
+
+    def __init__(self, contours, cell):
+        self.cell = cell
+        p, q = _segments(contours)
+        owner = np.repeat(np.arange(len(contours)), [len(c) for c in contours])
+        self.columns = int((np.maximum(p, q)[:, 0].max() + PIECE_SLACK) // cell) + 1
+        edge, piece_lo, piece_hi = _pieces(p, q, cell)
+        piece, key = _cell_keys(np.maximum(piece_lo, 0), piece_hi, cell, self.columns)
+        entries = _sorted_unique(key * len(contours) + owner[edge[piece]])
+        self.keys, self.owners = entries // len(contours), entries % len(contours)
+
+    def query(self, x0, y0, x1, y1):
+        """:return: 經過 [x0, x1] x [y0, y1] 範圍內任一格的輪廓 ID（排序、不重複）"""
+        c0, c1 = (min(max(0, int(v // self.cell)), self.columns - 1) for v in (x0, x1))
+        r0, r1 = (max(0, int(v // self.cell)) for v in (y0, y1))
+        rows = np.arange(r0, r1 + 1) * self.columns
+        # **同一列的格子編號連續，每列一次 searchsorted 就取出整段**
+        starts = np.searchsorted(self.keys, rows + c0, side="left")
+        ends = np.searchsorted(self.keys, rows + c1, side="right")
+        counts = ends - starts
+        index = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return _sorted_unique(self.owners[index])
+
+
+def has_crossings(rings, neighbours=()):
+    """
+    環（外輪廓與內洞）之間或自身是否有邊真正交叉（只共用端點或相接不算）
+    先以格子索引找出外框重疊的邊對，再向量化做方向測試
+    :param neighbours: 其他群組的環，只取外框與 rings 重疊的邊一起檢查
+    """
+    p, q = _segments(rings)
+    if len(neighbours):
+        # **相鄰環的邊離這組太遠就不可能相交，先濾掉**
+        lo, hi = np.minimum(p, q).min(axis=0), np.maximum(p, q).max(axis=0)
+        n_p, n_q = _segments(neighbours)
+        near = np.all((np.minimum(n_p, n_q) <= hi) & (np.maximum(n_p, n_q) >= lo), axis=1)
+        p, q = np.concatenate((p, n_p[near])), np.concatenate((q, n_q[near]))
+
+    i, j = _edge_pairs(p, q)
+    d1 = _cross(p[j], q[j], p[i])
+    d2 = _cross(p[j], q[j], q[i])
+    d3 = _cross(p[i], q[i], p[j])
+    d4 = _cross(p[i], q[i], q[j])
+    return bool(np.any((d1 * d2 < 0) & (d3 * d4 < 0)))
+
+
+def _valid(outer, holes, original, neighbours=()):
+    """
+    簡化結果合法：每個環至少三點且方向不變、沒有交叉（包括與相鄰群組的環）、
+    內洞在外輪廓內且不在其他內洞內
+    """
+    rings = [outer] + holes
+    for ring, source in zip(rings, original):
+        if len(ring) < 3 or np.sign(cv2.contourArea(ring, True)) != np.sign(cv2.contourArea(source, True)):
+            return False
+    if has_crossings(rings, neighbours):
+        return False
+
+    if not holes:
+        return True
+    points = np.array([hole[0, 0] for hole in holes], dtype=np.float64)
+    boxes = np.array([cv2.boundingRect(hole) for hole in holes])
+    for k, point in enumerate(map(tuple, points)):
+        if cv2.pointPolygonTest(outer, point, False) < 0:
+            return False
+        # **只檢查外框包含這個點的其他內洞**
+        inside = ((boxes[:, 0] <= point[0]) & (point[0] < boxes[:, 0] + boxes[:, 2])
+                  & (boxes[:, 1] <= point[1]) & (point[1] < boxes[:, 1] + boxes[:, 3]))
+        inside[k] = False
+        if any(cv2.pointPolygonTest(holes[m], point, False) > 0 for m in np.flatnonzero(inside)):
+            return False
+    return True
+
+
+def simplify_group(outer, holes, tolerance, neighbours=()):
+    """
+    簡化一組外輪廓 + 內洞；不合法時容差減半重試，太小仍不合法就保留原輪廓
+    :param neighbours: 外框與這組重疊的其他群組的環（例如內洞裡的島），簡化後不可與它們交叉
+    :return: (外輪廓, [內洞])
+    """
+    epsilon = tolerance
+    while epsilon >= MIN_TOLERANCE:
+        s_outer = cv2.approxPolyDP(outer, epsilon, True)
+        s_holes = [cv2.approxPolyDP(hole, epsilon, True) for hole in holes]
+
+        # **頂點數沒變就是原輪廓，不必檢查**
+        if len(s_outer) == len(outer) and all(len(a) == len(b) for a, b in zip(s_holes, holes)):
+            return outer, holes
+        if _valid(s_outer, s_holes, [outer] + holes, neighbours):
+            return s_outer, s_holes
+        epsilon /= 2
+    return outer, holes
+
+
+def simplify_contours(contours, index, tolerance):
+    """
+    依層級索引逐組簡化所有輪廓（輪廓 ID 與 hierarchy 不變）
+    :param index: ContourIndex
+    :param tolerance: 容差（像素），<= 0 時直接回傳原輪廓
+    """
+    if tolerance <= 0 or not len(contours):
+        return contours
+    simplified = list(contours)
+
+    # **其他群組（已簡化的用簡化結果）也要一起檢查交叉：內洞裡的島是另一個外輪廓。
+    # 簡化後的環離原輪廓不超過容差，兩組都簡化時最多靠近 2 倍容差，
+    # 所以只需要原輪廓經過這組外框（外擴 2 倍容差）附近的輪廓，不必和全部輪廓比較**
+    margin = 2 * tolerance
+    grid = _RingGrid(contours, max(NEIGHBOUR_CELL, margin))
+    for outer_id, hole_ids in index.holes.items():
+        x, y, w, h = index.bboxes[outer_id].tolist()
+        group = {outer_id, *hole_ids}
+        neighbours = [simplified[k] for k in grid.query(x - margin, y - margin, x + w + margin, y + h + margin).tolist()
+                      if k not in group]
+        outer, holes = simplify_group(contours[outer_id], [contours[i] for i in hole_ids], tolerance, neighbours)
+        simplified[outer_id] = outer
+        for i, hole in zip(hole_ids, holes):
+            simplified[i] = hole
+    return tuple(simplified)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def blob_image(seed, shape=(96, 128)):
+    """隨機的黑白平面圖：平滑雜訊二值化，外輪廓、內洞與洞中的島都有"""
+    rng = np.random.default_rng(seed)
+    noise = cv2.GaussianBlur(rng.random(shape).astype(np.float32), (0, 0), 2.5)
+    return np.where(noise > np.median(noise), 255, 0).astype(np.uint8)
+
+
+@pytest.fixture(params=range(8))
+def blobs(request):
+    """二值圖與它的 RETR_CCOMP 輪廓：(image, contours, hierarchy (N, 4))"""
+    image = blob_image(request.param)
+    contours, hierarchy = cv2.findContours(image, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    return image, contours, hierarchy[0]
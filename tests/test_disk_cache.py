@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from disk_cache import MAX_ENTRY_FRACTION, DiskCache
+
+MESH_PARAMS = dict(threshold=200, tolerance=1.0, mode="surface")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "cache"), max_bytes=10000)
+
+
+def _mesh_file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * size)
+    return str(path)
+
+
+def _age(cache, seconds):
+    """把快取中所有檔案的最後使用時間往前推"""
+    for name in os.listdir(cache.directory):
+        path = os.path.join(cache.directory, name)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_contours_round_trip(cache):
+    contours = (np.array([[[0, 0]], [[5, 0]], [[5, 5]]], dtype=np.int32),
+                np.array([[[1, 1]], [[2, 1]], [[2, 2]], [[1, 2]]], dtype=np.int32))
+    hierarchy = np.array([[-1, -1, 1, -1], [-1, -1, -1, 0]], dtype=np.int32)
+    cache.save_contours("img", contours, hierarchy, threshold=200)
+
+    loaded, loaded_hierarchy = cache.load_contours("img", threshold=200)
+    assert [c.tolist() for c in loaded] == [c.tolist() for c in contours]
+    np.testing.assert_array_equal(loaded_hierarchy, hierarchy)
+    assert cache.load_contours("img", threshold=201) is None
+
+
+def test_corrupt_files_are_misses(cache, tmp_path):
+    cache.save_contours("img", (), None, threshold=200)
+    cache.save_session("img", 200, 1.0, {0: True})
+    assert cache.store_mesh("img", _mesh_file(tmp_path, "a.stl", 100), 1, 10, **MESH_PARAMS)
+    for name in os.listdir(cache.directory):
+        with open(os.path.join(cache.directory, name), "wb") as f:
+            f.write(b"not a cache file")
+
+    assert cache.load_contours("img", threshold=200) is None
+    assert cache.load_session("img") is None
+    assert cache.copy_mesh("img", str(tmp_path / "b.stl"), **MESH_PARAMS) is None
+
+
+def test_least_recently_used_entries_are_evicted_with_their_info(cache, tmp_path):
+    for k in range(3):
+        assert cache.store_mesh("img", _mesh_file(tmp_path, "m.stl", 2000), 1, k, **MESH_PARAMS, grid_size=k)
+        _age(cache, 100)
+    # **最舊的項目被用過一次，變成最新的**
+    assert cache.copy_mesh("img", str(tmp_path / "hit.stl"), **MESH_PARAMS, grid_size=0) is not None
+
+    # **再存兩個就超過上限：淘汰最久沒用到的 grid_size=1，而不是更舊但剛用過的 0**
+    for k in range(3, 5):
+        cache.store_mesh("img", _mesh_file(tmp_path, "m.stl", 2000), 1, k, **MESH_PARAMS, grid_size=k)
+    assert cache.nbytes <= cache.max_bytes
+    present = {k for k in range(5) if cache.copy_mesh("img", str(tmp_path / "x.stl"), **MESH_PARAMS, grid_size=k)}
+    assert present == {0, 2, 3, 4}
+
+    # **網格與 .json 一起刪除，不留下孤立的檔案**
+    stems = [os.path.splitext(name)[0] for name in os.listdir(cache.directory)]
+    assert all(stems.count(stem) == 2 for stem in stems)
+
+
+def test_too_large_mesh_is_not_stored(cache, tmp_path):
+    assert cache.store_mesh("img", _mesh_file(tmp_path, "small.stl", 1000), 1, 10, **MESH_PARAMS)
+    size = int(cache.max_bytes * MAX_ENTRY_FRACTION) + 1
+    assert not cache.store_mesh("img", _mesh_file(tmp_path, "big.stl", size), 1, 10, **MESH_PARAMS, grid_size=5)
+
+    assert cache.copy_mesh("img", str(tmp_path / "out.stl"), **MESH_PARAMS, grid_size=5) is None
+    assert cache.copy_mesh("img", str(tmp_path / "out.stl"), **MESH_PARAMS) == {"contours": 1, "facets": 10}
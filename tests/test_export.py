@@ -0,0 +1,43 @@
+import os
+import stat
+
+import cv2
+import numpy as np
+import pytest
+
+from export import ExportCancelled, export_mesh
+
+
+@pytest.fixture
+def plan():
+    image = np.zeros((80, 120), dtype=np.uint8)
+    cv2.rectangle(image, (10, 10), (50, 70), 255, -1)
+    cv2.rectangle(image, (70, 20), (110, 60), 255, -1)
+    contours, hierarchy = cv2.findContours(image, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    return contours, hierarchy[0]
+
+
+def test_export_creates_file_with_umask_mode(tmp_path, plan):
+    contours, hierarchy = plan
+    path = tmp_path / "plan.stl"
+    umask = os.umask(0o027)
+    try:
+        count = export_mesh(str(path), [0, 1], contours, hierarchy, 10, 10)
+    finally:
+        os.umask(umask)
+    assert count > 0
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["plan.stl"]
+
+
+def test_cancelled_export_keeps_existing_file(tmp_path, plan):
+    contours, hierarchy = plan
+    path = tmp_path / "plan.stl"
+    path.write_text("keep")
+    progress = []
+    with pytest.raises(ExportCancelled):
+        export_mesh(str(path), [0, 1], contours, hierarchy, 10, 10, progress=lambda *args: progress.append(args),
+                    is_cancelled=lambda: len(progress) == 1)
+    assert len(progress) == 1
+    assert path.read_text() == "keep"
+    assert os.listdir(tmp_path) == ["plan.stl"]
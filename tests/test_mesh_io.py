@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from mesh_io import PLY_FACE_DTYPE, STL_DTYPE, weld_vertices, write_mesh
+from voxel import cube_mesh
+
+
+@pytest.fixture
+def faces():
+    """2x2 格少一格的 L 形立方體，相鄰方格共用頂點"""
+    occupancy = np.array([[True, True], [True, False]])
+    return cube_mesh(-5, 0, occupancy, 2.5, 4)
+
+
+def _read_stl(path):
+    data = open(path, "rb").read()
+    count = int(np.frombuffer(data, "<u4", 1, 80)[0])
+    records = np.frombuffer(data, STL_DTYPE, count, 84)
+    assert len(data) == 84 + count * STL_DTYPE.itemsize
+    return records["vertices"]
+
+
+def _read_ply(path):
+    data = open(path, "rb").read()
+    end = data.index(b"end_header\n") + len(b"end_header\n")
+    header = data[:end].decode("ascii").split("\n")
+    n_vertices = int(next(line for line in header if line.startswith("element vertex")).split()[-1])
+    n_faces = int(next(line for line in header if line.startswith("element face")).split()[-1])
+    vertices = np.frombuffer(data, "<f4", n_vertices * 3, end).reshape(-1, 3)
+    records = np.frombuffer(data, PLY_FACE_DTYPE, n_faces, end + vertices.nbytes)
+    assert (records["count"] == 3).all()
+    return vertices[records["indices"]]
+
+
+def _read_obj(path):
+    lines = open(path).read().split("\n")
+    vertices = np.array([line.split()[1:] for line in lines if line.startswith("v ")], dtype=np.float32)
+    indices = np.array([line.split()[1:] for line in lines if line.startswith("f ")], dtype=np.int64)
+    return vertices[indices - 1]
+
+
+@pytest.mark.parametrize("ext, read", [(".stl", _read_stl), (".ply", _read_ply), (".obj", _read_obj)])
+def test_round_trip(tmp_path, faces, ext, read):
+    path = str(tmp_path / f"mesh{ext}")
+    # **generator 輸入：逐批串流寫入**
+    assert write_mesh(path, (batch for batch in np.array_split(faces, 3))) == len(faces)
+    np.testing.assert_array_equal(read(path), faces)
+
+
+def test_stl_normals_point_outwards(tmp_path):
+    path = str(tmp_path / "cube.stl")
+    write_mesh(path, cube_mesh(0, 0, np.ones((1, 1), dtype=bool), 2, 3))
+    records = np.fromfile(path, STL_DTYPE, offset=84)
+    outwards = records["vertices"].mean(axis=1) - [1, 1, 1.5]
+    np.testing.assert_allclose(np.linalg.norm(records["normal"], axis=1), 1)
+    assert (np.einsum("ij,ij->i", records["normal"], outwards) > 0).all()
+
+
+def test_weld_merges_shared_corners_across_batches(faces):
+    vertices, indices = weld_vertices(faces)
+    assert len(vertices) == 8 * 2  # **L 形：上下兩層各 8 個角點**
+    np.testing.assert_array_equal(vertices[indices], faces)
+
+    batched_vertices, batched_indices = weld_vertices(iter(np.array_split(faces, 5)))
+    np.testing.assert_array_equal(batched_vertices, vertices)
+    np.testing.assert_array_equal(batched_indices, indices)
+
+
+def test_weld_treats_negative_zero_as_zero():
+    tris = np.array([[[0.0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                     [[-0.0, 0, 0], [0, 1, 0], [1, 0, 0]]], dtype=np.float32)
+    vertices, indices = weld_vertices(tris)
+    assert len(vertices) == 3
+    assert indices[0, 0] == indices[1, 0]
+
+
+def test_empty_input(tmp_path):
+    vertices, indices = weld_vertices(iter([]))
+    assert vertices.shape == (0, 3) and indices.shape == (0, 3)
+    for ext in (".stl", ".ply", ".obj"):
+        assert write_mesh(str(tmp_path / f"empty{ext}"), np.empty((0, 3, 3))) == 0
+    with pytest.raises(ValueError):
+        write_mesh(str(tmp_path / "mesh.dxf"), np.empty((0, 3, 3)))
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from export import export_mesh
+from parallel import iter_extruded_faces_parallel
+from pipeline import MESH_MODES, ContourIndex, iter_extruded_faces
+
+
+@pytest.fixture
+def plan(blobs):
+    _, contours, hierarchy = blobs
+    return contours, hierarchy, ContourIndex(contours, hierarchy).outer_ids
+
+
+@pytest.mark.parametrize("mode", MESH_MODES)
+def test_parallel_batches_match_serial(plan, mode):
+    contours, hierarchy, contour_ids = plan
+    serial = list(iter_extruded_faces(contour_ids, contours, hierarchy, 10, 4, mode, min_cell_size=1))
+    parallel = list(iter_extruded_faces_parallel(contour_ids, contours, hierarchy, 10, 4, mode, min_cell_size=1,
+                                                 workers=2))
+    assert len(parallel) == len(serial)
+    for a, b in zip(parallel, serial):
+        assert a.dtype == b.dtype
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize("ext", [".stl", ".ply", ".obj"])
+def test_parallel_export_is_byte_identical(tmp_path, plan, ext):
+    contours, hierarchy, contour_ids = plan
+    serial, parallel = tmp_path / f"serial{ext}", tmp_path / f"parallel{ext}"
+    export_mesh(str(serial), contour_ids, contours, hierarchy, 10, 4, "surface")
+    export_mesh(str(parallel), contour_ids, contours, hierarchy, 10, 4, "surface", workers=2)
+    assert parallel.read_bytes() == serial.read_bytes()
@@ -0,0 +1,85 @@
+import os
+import signal
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from client import ServiceError, convert_remote, fetch_stats
+from server import ConversionServer
+
+
+@pytest.fixture
+def service(tmp_path):
+    server = ConversionServer(("127.0.0.1", 0), workers=1, queue_size=0, spool_dir=str(tmp_path / "spool"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def plan(tmp_path):
+    image = np.full((80, 120), 255, dtype=np.uint8)
+    cv2.rectangle(image, (10, 10), (50, 70), 0, -1)
+    cv2.rectangle(image, (70, 20), (110, 60), 0, -1)
+    path = tmp_path / "plan.png"
+    cv2.imwrite(str(path), image)
+    return str(path)
+
+
+def test_convert(service, plan, tmp_path):
+    _, url = service
+    output = tmp_path / "plan.stl"
+    result = convert_remote(url, plan, str(output), retries=0)
+    assert result["contours"] == 2
+    assert result["facets"] > 0
+    assert output.stat().st_size == 84 + 50 * result["facets"]
+    assert sorted(os.listdir(tmp_path)) == ["plan.png", "plan.stl", "spool"]
+
+
+def test_bad_request(service, plan, tmp_path):
+    _, url = service
+    with pytest.raises(ServiceError) as e:
+        convert_remote(url, plan, str(tmp_path / "plan.stl"), retries=0, threshold="dark")
+    assert e.value.status == 400
+    not_an_image = tmp_path / "plan.txt"
+    not_an_image.write_text("not an image")
+    with pytest.raises(ServiceError) as e:
+        convert_remote(url, str(not_an_image), str(tmp_path / "plan.stl"), retries=0)
+    assert e.value.status == 400
+    assert not (tmp_path / "plan.stl").exists()
+
+
+def test_queue_full(service, plan, tmp_path):
+    server, url = service
+    assert server.try_acquire()
+    try:
+        with pytest.raises(ServiceError) as e:
+            convert_remote(url, plan, str(tmp_path / "plan.stl"), retries=0)
+        assert e.value.status == 503
+    finally:
+        server.release()
+    assert fetch_stats(url)["rejected"] == 1
+
+    # **名額在重試前空出來就會成功**
+    assert server.try_acquire()
+    threading.Timer(0.3, server.release).start()
+    result = convert_remote(url, plan, str(tmp_path / "plan.stl"), retries=2)
+    assert result["retries"] == 1
+
+
+def test_worker_died(service, plan, tmp_path):
+    server, url = service
+    broken = server.pool
+    for process in list(broken._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+    with pytest.raises(ServiceError) as e:
+        convert_remote(url, plan, str(tmp_path / "plan.stl"), retries=0)
+    assert e.value.status == 500
+    assert server.pool is not broken
+    # **換了行程池之後的請求正常轉換（回應送出後名額才釋放，可能要重試一次）**
+    assert convert_remote(url, plan, str(tmp_path / "plan.stl"), retries=2)["facets"] > 0
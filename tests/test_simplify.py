@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+from pipeline import ContourIndex
+from simplify import has_crossings, simplify_contours
+
+
+def _simplify(image, tolerance):
+    contours, hierarchy = cv2.findContours(image, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+    index = ContourIndex(contours, hierarchy[0])
+    return contours, index, simplify_contours(contours, index, tolerance)
+
+
+@pytest.mark.parametrize("tolerance", [1, 3, 6])
+def test_simplified_contours_do_not_cross(blobs, tolerance):
+    contours, index, simplified = _simplify(blobs[0], tolerance)
+    assert not has_crossings(list(contours))
+    assert not has_crossings(list(simplified))
+    assert sum(map(len, simplified)) < sum(map(len, contours))
+
+    # **每個原始點離簡化後的環不超過容差，方向不變**
+    for original, ring in zip(contours, simplified):
+        distances = [abs(cv2.pointPolygonTest(ring, (float(x), float(y)), True)) for x, y in original.reshape(-1, 2)]
+        assert max(distances) <= tolerance + 1e-9
+        assert np.sign(cv2.contourArea(ring, True)) == np.sign(cv2.contourArea(original, True))
+
+
+def test_hole_does_not_cut_through_island_of_another_group():
+    # **內洞有個 5 px 的凹口，洞裡的島（另一個外輪廓）伸進凹口；容差 6 會把凹口拉直而切過島**
+    image = np.zeros((200, 200), dtype=np.uint8)
+    cv2.rectangle(image, (10, 10), (190, 190), 255, -1)
+    cv2.rectangle(image, (30, 30), (170, 170), 0, -1)
+    image[25:30, 80:120] = 0
+    cv2.rectangle(image, (60, 40), (140, 160), 255, -1)
+    image[27:40, 95:105] = 255
+
+    contours, index, simplified = _simplify(image, 6)
+    assert len(index.holes) == 2
+    assert not has_crossings(list(simplified))
+
+
+def test_zero_tolerance_returns_input(blobs):
+    _, contours, hierarchy = blobs
+    assert simplify_contours(contours, ContourIndex(contours, hierarchy), 0) is contours
+
+
+def test_long_edges_are_checked_against_nearby_edges_only():
+    # **長牆與牆間的小點不相交；一個斜的小三角形穿過其中一道牆**
+    walls = [np.array([[[0, y]], [[4000, y]], [[4000, y + 1]], [[0, y + 1]]], np.int32) for y in range(0, 400, 4)]
+    specks = [np.array([[[x, 2]], [[x + 1, 2]], [[x + 1, 3]], [[x, 3]]], np.int32) for x in range(0, 4000, 10)]
+    assert not has_crossings(walls + specks)
+    assert has_crossings(walls + specks + [np.array([[[2000, 190]], [[2003, 198]], [[2006, 190]]], np.int32)])
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from pipeline import find_contours
+from tiles import tiled_contours
+
+
+def _groups(contours, hierarchy):
+    """與輪廓順序無關的比較形式：{外輪廓的點: 排序後的內洞點列表}"""
+    points = [tuple(map(tuple, c.reshape(-1, 2).tolist())) for c in contours]
+    groups = {points[i]: [] for i in np.flatnonzero(hierarchy[:, 3] == -1)}
+    for i in np.flatnonzero(hierarchy[:, 3] != -1):
+        groups[points[hierarchy[i, 3]]].append(points[i])
+    return {outer: sorted(holes) for outer, holes in groups.items()}
+
+
+@pytest.mark.parametrize("tile_size", [7, 16, 33, 200])
+def test_tiled_contours_match_whole_image(blobs, tile_size):
+    image = blobs[0]
+    contours, hierarchy = find_contours(image, 128)
+    tiled, tiled_hierarchy = tiled_contours(image, 128, tile_size)
+    assert len(tiled) == len(contours)
+    assert _groups(tiled, tiled_hierarchy) == _groups(contours, hierarchy)
@@ -0,0 +1,107 @@
+from collections import Counter
+
+import cv2
+import numpy as np
+import pytest
+
+from pipeline import ContourIndex, extrude_single_contour
+from voxel import contour_occupancy, quadtree_cells, quadtree_depth
+
+
+@pytest.mark.parametrize("grid_size", [1, 2.5, 4, 7])
+def test_occupancy_matches_point_polygon_test(blobs, grid_size):
+    _, contours, hierarchy = blobs
+    index = ContourIndex(contours, hierarchy)
+    for outer_id, hole_ids in index.holes.items():
+        outer, holes = contours[outer_id], [contours[i] for i in hole_ids]
+        x_min, y_min, occupancy = contour_occupancy(outer, holes, grid_size)
+
+        expected = np.zeros_like(occupancy)
+        for row, col in np.ndindex(occupancy.shape):
+            center = (x_min + col * grid_size + grid_size / 2, y_min + row * grid_size + grid_size / 2)
+            expected[row, col] = (cv2.pointPolygonTest(outer, center, False) >= 0
+                                  and all(cv2.pointPolygonTest(hole, center, False) < 0 for hole in holes))
+        np.testing.assert_array_equal(occupancy, expected)
+
+
+def _edges(faces):
+    """三角形的有向邊，頂點以座標表示"""
+    corners = [list(map(tuple, faces[:, k].tolist())) for k in range(3)]
+    return [edge for k in range(3) for edge in zip(corners[k], corners[(k + 1) % 3])]
+
+
+def _assert_watertight(faces):
+    """
+    封閉網格：每條有向邊都有同樣多條反方向的邊與它配對
+    （只以一條邊或一個點相接的格子會讓同一條邊出現兩次，仍然是封閉的）
+    """
+    edges = Counter(_edges(faces))
+    assert all(edges[b, a] == count for (a, b), count in edges.items())
+
+
+def _volume(faces):
+    """封閉網格的有號體積（CCW 朝外為正）"""
+    faces = faces.astype(np.float64)
+    return np.einsum("ij,ij->i", faces[:, 0], np.cross(faces[:, 1], faces[:, 2])).sum() / 6
+
+
+def test_surface_mesh_is_watertight_with_occupied_volume(blobs):
+    _, contours, hierarchy = blobs
+    index = ContourIndex(contours, hierarchy)
+    grid_size, z_height = 4, 10
+    for outer_id, hole_ids in index.holes.items():
+        faces = extrude_single_contour(outer_id, contours, hierarchy, z_height, grid_size, "surface", index=index)
+        _, _, occupancy = contour_occupancy(contours[outer_id], [contours[i] for i in hole_ids], grid_size)
+        if not occupancy.any():
+            assert len(faces) == 0
+            continue
+        _assert_watertight(faces)
+        assert _volume(faces) == pytest.approx(occupancy.sum() * grid_size ** 2 * z_height)
+
+
+def test_exact_mesh_is_watertight_with_polygon_volume(blobs):
+    _, contours, hierarchy = blobs
+    index = ContourIndex(contours, hierarchy)
+    z_height = 10
+    for outer_id in index.outer_ids:
+        if cv2.contourArea(contours[outer_id]) == 0:
+            continue
+        faces = extrude_single_contour(outer_id, contours, hierarchy, z_height, 4, "exact", index=index)
+        _assert_watertight(faces)
+        assert _volume(faces) == pytest.approx(index.net_areas[outer_id] * z_height)
+
+
+def test_quadtree_depth():
+    assert quadtree_depth(8, 1) == 3
+    assert quadtree_depth(8, 3) == 1
+    assert quadtree_depth(2, 4) == 0
+    assert quadtree_depth(6, 0.75) == 3
+    with pytest.raises(ValueError):
+        quadtree_depth(8, 0)
+
+
+@pytest.mark.parametrize("depth", [0, 1, 2, 3])
+def test_quadtree_cells_cover_occupancy_once(depth):
+    occupancy = np.random.default_rng(depth).random((37, 53)) < 0.8
+    occupancy[5:30, 8:40] = True  # **一塊大的全滿區域，才會合併出大格**
+    covered = np.zeros((37 + 8, 53 + 8), dtype=int)
+    for col, row, span in zip(*quadtree_cells(occupancy, depth)):
+        covered[row:row + span, col:col + span] += 1
+    np.testing.assert_array_equal(covered[:37, :53], occupancy)
+    assert not covered[37:].any() and not covered[:, 53:].any()
+
+
+@pytest.mark.parametrize("min_cell_size", [1, 2, 3])
+def test_quadtree_mesh_has_voxel_volume_at_finest_cell(blobs, min_cell_size):
+    _, contours, hierarchy = blobs
+    index = ContourIndex(contours, hierarchy)
+    grid_size, z_height = 8, 10
+    cell_size = grid_size / (1 << quadtree_depth(grid_size, min_cell_size))
+    for outer_id in index.outer_ids:
+        faces = extrude_single_contour(outer_id, contours, hierarchy, z_height, grid_size, "quadtree",
+                                       min_cell_size=min_cell_size, index=index)
+        voxels = extrude_single_contour(outer_id, contours, hierarchy, z_height, cell_size, "voxel", index=index)
+        assert len(faces) <= len(voxels)
+        if len(faces):
+            _assert_watertight(faces)
+        assert _volume(faces) == pytest.approx(_volume(voxels))
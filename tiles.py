@@ -0,0 +1,288 @@
+"""
+分塊處理超大平面圖：以記憶體映射讀取點陣，逐塊二值化並找輪廓，
+跨越接縫的輪廓由各塊的段落接起來（不重新取出整個元件），最後組成與 RETR_CCOMP 相同格式的層級
+"""
+import os
+
+import cv2
+import numpy as np
+
+from instrument import span
+
+RASTER_EXTENSIONS = (".npy", ".raw")
+DEFAULT_TILE_SIZE = 2048
+
+
+def open_raster(path, shape=None, dtype=np.uint8):
+    """
+    開啟點陣而不整張讀進記憶體
+    :param shape: .raw 檔需要 (H, W) 或 (H, W, C)；.npy 自帶形狀
+    :return: 唯讀的 np.memmap（一般圖片格式無法映射，退回 cv2.imread）
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.load(path, mmap_mode="r")
+    if ext == ".raw":
+        if shape is None:
+            raise ValueError(f"Raw raster needs a shape (H, W) or (H, W, C): {path}")
+        return np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(f"Cannot load image: {path}")
+    return image
+
+
+def binary_window(raster, threshold_value, y0, y1, x0, x1, band=DEFAULT_TILE_SIZE):
+    """
+    讀出 [y0:y1, x0:x1] 範圍的二值圖（前景 = 比 threshold 暗的像素），
+    逐條帶讀取，同時在記憶體中的只有一條帶的原始像素
+    """
+    binary = np.empty((y1 - y0, x1 - x0), dtype=np.uint8)
+    for top in range(y0, y1, band):
+        bottom = min(top + band, y1)
+        pixels = np.asarray(raster[top:bottom, x0:x1])
+        if pixels.ndim == 3:
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+        cv2.threshold(pixels, threshold_value, 255, cv2.THRESH_BINARY_INV, dst=binary[top - y0:bottom - y0])
+    return binary
+
+
+# **8 鄰居的方向碼，與 OpenCV 的鏈碼相同（逆時針遞增）：0 右、1 右上、2 上、3 左上、4 左、5 左下、6 下、7 右下**
+_STEPS = ((1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1))
+_DIRECTION = np.full(9, -1, dtype=np.int8)  # 以 (dy + 1) * 3 + (dx + 1) 查方向碼
+for _code, (_dx, _dy) in enumerate(_STEPS):
+    _DIRECTION[(_dy + 1) * 3 + _dx + 1] = _code
+LEFT, RIGHT = 4, 0
+
+
+def _direction(delta):
+    """相鄰兩點的位移 (N, 2) → 方向碼 (N,)"""
+    return _DIRECTION[(delta[:, 1] + 1) * 3 + delta[:, 0] + 1].astype(np.int16)
+
+
+def _passes(points):
+    """
+    CHAIN_APPROX_NONE 輪廓（循環）上每一次經過的點：
+    邊界追蹤在點上由前一點的方向逆時針掃到下一點，掃過的都是背景像素，這一段只由點的 3x3 鄰域決定
+    :return: (轉角, 掃過左邊鄰居, 掃過右邊鄰居)，皆為 (N,) bool；
+             CHAIN_APPROX_SIMPLE 只保留轉角，外輪廓 / 內洞的起點是掃過左 / 右鄰居中最先被逐列掃描到的一次
+    """
+    d_in = _direction(points - np.roll(points, 1, axis=0))
+    d_out = _direction(np.roll(points, -1, axis=0) - points)
+    back = (d_in + 4) % 8
+    sweep = (d_out - back) % 8
+    sweep[sweep == 0] = 8  # **前後是同一點（線段端點）時掃過一整圈**
+    left, right = (LEFT - back) % 8, (RIGHT - back) % 8
+    return d_in != d_out, (left > 0) & (left < sweep), (right > 0) & (right < sweep)
+
+
+def _first(points, mask, corner_index):
+    """mask 中逐列掃描最先的一次經過：(y, x, 它之後第一個轉角在本段的編號)；沒有時回傳 None"""
+    candidates = np.flatnonzero(mask)
+    if not len(candidates):
+        return None
+    k = candidates[np.lexsort((points[candidates, 0], points[candidates, 1]))[0]]
+    return int(points[k, 1]), int(points[k, 0]), int(corner_index[k])
+
+
+def _chain(points, corner, outer, hole):
+    """
+    一段連續的經過壓縮成轉角，並記下外輪廓 / 內洞起點的候選
+    :return: (轉角 (M, 2), 外輪廓起點, 內洞起點)
+    """
+    corner_index = np.cumsum(corner) - corner  # 每次經過之後（含本身）第一個轉角的編號
+    return points[corner], _first(points, outer, corner_index), _first(points, hole, corner_index)
+
+
+def _close(chains):
+    """
+    串起一圈的所有段落，依方向判斷外輪廓 / 內洞（OpenCV 的外輪廓面積 <= 0、內洞 > 0），
+    從起點之後第一個轉角開始排列（與 CHAIN_APPROX_SIMPLE 相同）
+    :return: (輪廓 (M, 1, 2) int32, 是否為內洞, 起點 (y, x))
+    """
+    corners = []
+    starts = ([], [])
+    offset = 0
+    for points, outer_start, hole_start in chains:
+        for start, found in zip((outer_start, hole_start), starts):
+            if start is not None:
+                found.append((start[0], start[1], start[2] + offset))
+        corners.append(points)
+        offset += len(points)
+    corners = np.concatenate(corners).astype(np.int32).reshape(-1, 1, 2)
+    is_hole = cv2.contourArea(corners, oriented=True) > 0
+    y, x, k = min(starts[1] if is_hole else starts[0])
+    return np.roll(corners, -k % len(corners), axis=0), is_hole, (y, x)
+
+
+class _Components:
+    """跨區塊的連通元件：各區塊的標籤加上偏移成為全域編號，接縫兩側相鄰的編號以 union-find 合併"""
+
+    def __init__(self):
+        self.parent = {}
+        self.count = 0
+
+    def add(self, count):
+        """
+        登記一個區塊的 count 個標籤（1..count）
+        :return: 偏移，全域編號 = 區塊標籤 + 偏移（背景 0 不變，見 to_global）
+        """
+        base = self.count
+        self.count += count
+        return base
+
+    @staticmethod
+    def to_global(labels, base):
+        return np.where(labels > 0, labels.astype(np.int64) + base, 0)
+
+    def find(self, label):
+        parent = self.parent
+        root = label
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while label != root:  # **路徑壓縮**
+            up = parent.get(label, label)
+            parent[label] = root
+            label = up
+        return root
+
+    def join(self, edge, neighbours):
+        """
+        edge 與 neighbours 沿接縫排列（同長度），8 連通：每個前景像素與對面相差 -1、0、1 的像素相連
+        """
+        pairs = []
+        for d in (-1, 0, 1):
+            a = edge[max(-d, 0):len(edge) - max(d, 0)]
+            b = neighbours[max(d, 0):len(neighbours) - max(-d, 0)]
+            both = (a > 0) & (b > 0)
+            pairs.append(np.stack((a[both], b[both]), axis=1))
+        for a, b in np.unique(np.concatenate(pairs), axis=0).tolist():
+            ra, rb = self.find(a), self.find(b)
+            if ra != rb:
+                self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def build_hierarchy(groups):
+    """
+    由 [(外輪廓, [內洞]), ...] 組出 RETR_CCOMP 格式：外輪廓彼此串成一層，內洞掛在各自的外輪廓下
+    :return: (contours, hierarchy (N, 4))；沒有輪廓時 hierarchy 為 None
+    """
+    contours = []
+    hierarchy = []
+    outer_ids = []
+    for outer, holes in groups:
+        outer_id = len(contours)
+        outer_ids.append(outer_id)
+        contours.append(outer)
+        hierarchy.append([-1, -1, outer_id + 1 if holes else -1, -1])
+        for k, hole in enumerate(holes):
+            hole_id = outer_id + 1 + k
+            contours.append(hole)
+            hierarchy.append([hole_id + 1 if k + 1 < len(holes) else -1, hole_id - 1 if k else -1, -1, outer_id])
+
+    if not contours:
+        return tuple(contours), None
+    hierarchy = np.array(hierarchy, dtype=np.int32)
+    hierarchy[outer_ids[:-1], 0] = outer_ids[1:]
+    hierarchy[outer_ids[1:], 1] = outer_ids[:-1]
+    return tuple(contours), hierarchy
+
+
+def tiled_contours(raster, threshold_value, tile_size=DEFAULT_TILE_SIZE):
+    """
+    分塊找輪廓，結果與整張圖 find_contours 相同（輪廓的點與起點相同，只有輪廓的順序不同），
+    記憶體只與區塊大小有關，跨越整張圖的連通元件（例如牆）也不需要整個取出：
+    每塊多讀一圈像素後以 CHAIN_APPROX_NONE 找輪廓，只保留點在本區塊內的經過，壓縮成轉角的段落；
+    段落以跨越接縫的那一步前後相接成完整的一圈，各塊的連通元件標籤在接縫以 union-find 合併，
+    決定內洞屬於哪個外輪廓
+    :return: (contours, hierarchy (N, 4))；沒有輪廓時 hierarchy 為 None
+    """
+    height, width = raster.shape[:2]
+    components = _Components()
+    loops = []  # [(元件編號, 輪廓, 是否為內洞, 起點)]
+    open_chains = {}  # {進入本段的一步 (x0, y0, x1, y1): (段落, 元件編號, 離開本段的一步)}
+    above = np.zeros(width, dtype=np.int64)  # 上一列區塊最下面一列的元件編號
+
+    for ty in range(0, height, tile_size):
+        below = np.zeros(width, dtype=np.int64)
+        left = None
+        for tx in range(0, width, tile_size):
+            ty1, tx1 = min(ty + tile_size, height), min(tx + tile_size, width)
+            # **多讀一圈：區塊內每個點的 3x3 鄰域都與整張圖相同**
+            y0, y1, x0, x1 = max(ty - 1, 0), min(ty1 + 1, height), max(tx - 1, 0), min(tx1 + 1, width)
+            with span("tile", x=tx, y=ty):
+                binary = binary_window(raster, threshold_value, y0, y1, x0, x1)
+                contours, _ = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+                count, labels = cv2.connectedComponents(binary[ty - y0:ty1 - y0, tx - x0:tx1 - x0], connectivity=8)
+            del binary
+            # **標籤維持區塊內的編號，只有接縫與輪廓的點換成全域編號**
+            base = components.add(count - 1)
+
+            # **與上方、左方區塊相鄰的前景屬於同一個元件**
+            if ty > 0:
+                lo, hi = max(tx - 1, 0), min(tx1 + 1, width)
+                edge = np.zeros(hi - lo, dtype=np.int64)
+                edge[tx - lo:tx1 - lo] = components.to_global(labels[0], base)
+                components.join(edge, above[lo:hi])
+            if left is not None:
+                components.join(components.to_global(labels[:, 0], base), left)
+            left = components.to_global(labels[:, -1], base)
+            below[tx:tx1] = components.to_global(labels[-1], base)
+
+            offset = np.array([x0, y0], dtype=np.int32)
+            for contour in contours:
+                points = contour.reshape(-1, 2) + offset
+                inside = ((points[:, 0] >= tx) & (points[:, 0] < tx1) & (points[:, 1] >= ty) & (points[:, 1] < ty1))
+                if len(points) == 1:
+                    if inside[0]:  # **單一像素**
+                        loops.append((int(labels[points[0, 1] - ty, points[0, 0] - tx]) + base,
+                                      points.reshape(-1, 1, 2).astype(np.int32), False,
+                                      (int(points[0, 1]), int(points[0, 0]))))
+                    continue
+                if not inside.any():
+                    continue
+                corner, outer, hole = _passes(points)
+                label = int(labels[points[np.argmax(inside), 1] - ty, points[np.argmax(inside), 0] - tx]) + base
+                if inside.all():
+                    loops.append((label,) + _close([_chain(points, corner, outer, hole)]))
+                    continue
+
+                # **從區塊外的一點開始，切出每一段連續在區塊內的經過**
+                shift = int(np.argmin(inside))
+                points, inside = np.roll(points, -shift, axis=0), np.roll(inside, -shift)
+                corner, outer, hole = (np.roll(a, -shift) for a in (corner, outer, hole))
+                change = np.diff(inside.astype(np.int8), append=np.int8(0))
+                starts = np.flatnonzero(change == 1) + 1
+                ends = np.flatnonzero(change == -1)
+                n = len(points)
+                for a, e in zip(starts.tolist(), ends.tolist()):
+                    part = slice(a, e + 1)
+                    entry = tuple(points[a - 1].tolist() + points[a].tolist())
+                    leave = tuple(points[e].tolist() + points[(e + 1) % n].tolist())
+                    label = int(labels[points[a, 1] - ty, points[a, 0] - tx]) + base
+                    open_chains[entry] = (_chain(points[part], corner[part], outer[part], hole[part]), label, leave)
+        above = below
+
+    # **段落依「離開的一步 = 下一段進入的一步」串成一圈**
+    with span("stitch", chains=len(open_chains)):
+        while open_chains:
+            entry, (chain, label, leave) = open_chains.popitem()
+            chains = [chain]
+            while leave != entry:
+                chain, _, leave = open_chains.pop(leave)
+                chains.append(chain)
+            loops.append((label,) + _close(chains))
+
+    outers = {}
+    holes = {}
+    for label, contour, is_hole, start in loops:
+        root = components.find(label)
+        if is_hole:
+            holes.setdefault(root, []).append((start, contour))
+        else:
+            outers[root] = (start, contour)
+
+    # **依起點（外輪廓為元件最上方最左邊的點）排序，結果與分塊大小無關**
+    groups = sorted(((start, outer, [hole for _, hole in sorted(holes.get(root, []), key=lambda h: h[0])])
+                     for root, (start, outer) in outers.items()), key=lambda g: g[0])
+    return build_hierarchy((outer, hole_list) for _, outer, hole_list in groups)
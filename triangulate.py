@@ -0,0 +1,446 @@
+"""多邊形（含內洞）三角剖分：耳切法 + 內洞橋接，用於精確拉伸"""
+import numpy as np
+
+
+def _cross(o, a, b):
+    """(a - o) x (b - o)"""
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def signed_area(points):
+    """鞋帶公式，逆時針 (CCW) 為正"""
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _remove_spikes(loop):
+    """只移除重複點與原路折返的尖刺（不動共線點，以保持與側牆的頂點一致）"""
+    pts = [tuple(p) for p in loop.tolist()]
+    changed = True
+    while changed and len(pts) >= 3:
+        changed = False
+        out = []
+        for p in pts:
+            if out and out[-1] == p:
+                changed = True
+                continue
+            if len(out) >= 2 and out[-2] == p:
+                out.pop()
+                changed = True
+                continue
+            out.append(p)
+        while len(out) >= 2 and out[0] == out[-1]:
+            out.pop()
+            changed = True
+        while len(out) >= 3 and out[1] == out[-1]:
+            out.pop(0)
+            changed = True
+        pts = out
+    return np.array(pts, dtype=np.float64).reshape(-1, 2)
+
+
+def clean_loop(contour):
+    """
+    整理輪廓點：移除重複點、共線點與來回折返的尖刺（零寬度線段）
+    :return: (N, 2) float64，少於 3 點時回傳空陣列
+    """
+    pts = [tuple(p) for p in contour.reshape(-1, 2).astype(np.float64)]
+
+    changed = True
+    while changed and len(pts) >= 3:
+        changed = False
+        out = []
+        n = len(pts)
+        for i in range(n):
+            prev = out[-1] if out else pts[i - 1]
+            nxt = pts[(i + 1) % n]
+            if pts[i] == prev or _cross(prev, pts[i], nxt) == 0:
+                changed = True
+                continue
+            out.append(pts[i])
+        # **頭尾可能重疊**
+        if len(out) >= 2 and out[0] == out[-1]:
+            out.pop()
+        pts = out
+
+    if len(pts) < 3:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.array(pts, dtype=np.float64)
+
+
+def _in_cone(prev, apex, nxt, point):
+    """point 是否落在 apex 頂點的內角範圍內（CCW 多邊形）"""
+    d1 = (nxt[0] - apex[0], nxt[1] - apex[1])
+    d2 = (prev[0] - apex[0], prev[1] - apex[1])
+    m = (point[0] - apex[0], point[1] - apex[1])
+    c1 = d1[0] * m[1] - d1[1] * m[0]
+    c2 = m[0] * d2[1] - m[1] * d2[0]
+    if d1[0] * d2[1] - d1[1] * d2[0] >= 0:
+        return c1 >= 0 and c2 >= 0
+    return c1 >= 0 or c2 >= 0
+
+
+def _bridge_hole(polygon, hole):
+    """
+    以 Eberly 的方法把內洞接到外輪廓上（外輪廓 CCW、內洞 CW）
+    :return: 合併後的單一多邊形（橋接點會重複出現）
+    """
+    m = int(np.argmax(hole[:, 0]))
+    mx, my = hole[m]
+
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+
+    # **從 M 往 +x 射線，找最近的外輪廓邊**
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crosses = ((a[:, 1] <= my) & (b[:, 1] > my)) | ((b[:, 1] <= my) & (a[:, 1] > my))
+        t = (my - a[:, 1]) / (b[:, 1] - a[:, 1])
+        xi = a[:, 0] + t * (b[:, 0] - a[:, 0])
+    xi = np.where(crosses & (xi >= mx), xi, np.inf)
+
+    # **水平邊剛好落在射線上時，取靠近 M 的端點**
+    on_ray = (a[:, 1] == my) & (a[:, 0] >= mx)
+    vertex_hit = np.where(on_ray, a[:, 0], np.inf)
+
+    edge = int(np.argmin(xi))
+    vertex = int(np.argmin(vertex_hit))
+    if vertex_hit[vertex] <= xi[edge]:
+        p = vertex
+    else:
+        if not np.isfinite(xi[edge]):
+            return None
+        # **取該邊 x 較大的端點作為候選可見點**
+        p = edge if a[edge, 0] >= b[edge, 0] else (edge + 1) % len(polygon)
+        ix = xi[edge]
+
+        # **若有反射頂點落在三角形 (M, I, P) 內，改取與射線夾角最小者**
+        px, py = polygon[p]
+        tri = ((mx, my), (ix, my), (px, py))
+        if _cross(*tri) < 0:
+            tri = (tri[0], tri[2], tri[1])
+        xs, ys = polygon[:, 0], polygon[:, 1]
+        inside = np.ones(len(polygon), dtype=bool)
+        for (ax, ay), (bx, by) in zip(tri, tri[1:] + tri[:1]):
+            inside &= (bx - ax) * (ys - ay) - (by - ay) * (xs - ax) >= 0
+        inside[p] = False
+        best = None
+        for i in np.nonzero(inside)[0].tolist():
+            prev_pt, pt, next_pt = polygon[i - 1], polygon[i], polygon[(i + 1) % len(polygon)]
+            if _cross(prev_pt, pt, next_pt) >= 0:
+                continue  # **只考慮反射頂點**
+            dx, dy = pt[0] - mx, pt[1] - my
+            key = (abs(dy) / max(dx, 1e-12), dx * dx + dy * dy)
+            if best is None or key < best[0]:
+                best = (key, i)
+        if best is not None:
+            p = best[1]
+
+    return _splice(polygon, p, hole, m, (mx, my))
+
+
+def _splice(polygon, p, hole, m, toward):
+    """在外輪廓第 p 點與內洞第 m 點之間橋接，合併成單一多邊形"""
+    # **同一座標可能因先前的橋接出現多次，選擇內角包含 toward 的那一個**
+    target = polygon[p]
+    n = len(polygon)
+    for i in np.nonzero((polygon[:, 0] == target[0]) & (polygon[:, 1] == target[1]))[0].tolist():
+        if _in_cone(polygon[i - 1], polygon[i], polygon[(i + 1) % n], toward):
+            p = i
+            break
+
+    hole_loop = np.concatenate([hole[m:], hole[:m + 1]])
+    if polygon[p, 0] == hole[m, 0] and polygon[p, 1] == hole[m, 1]:
+        # **內洞與外輪廓在此頂點接觸：零長度橋接**
+        hole_loop = hole_loop[1:-1]
+    return np.concatenate([polygon[:p + 1], hole_loop, polygon[p:]])
+
+
+def _bridge_touching(polygon, hole, polygon_points):
+    """內洞與目前多邊形有共用頂點時，直接在共用頂點處接合；沒有則回傳 None"""
+    for m, point in enumerate(map(tuple, hole.tolist())):
+        if point in polygon_points:
+            p = int(np.nonzero((polygon[:, 0] == point[0]) & (polygon[:, 1] == point[1]))[0][0])
+            return _splice(polygon, p, hole, m, hole[(m + 1) % len(hole)])
+    return None
+
+
+def _ear_clip(points):
+    """
+    耳切法三角剖分單一 CCW 多邊形
+    :return: (M, 3) 頂點索引
+    """
+    n = len(points)
+    if n < 3:
+        return np.empty((0, 3), dtype=np.int64)
+
+    xs = points[:, 0]
+    ys = points[:, 1]
+    prev = np.roll(np.arange(n), 1)
+    nxt = np.roll(np.arange(n), -1)
+    active = np.ones(n, dtype=bool)
+
+    # **每個頂點的轉向（> 0 為凸），只有反射或共線頂點可能擋住耳朵**
+    turn = (xs - xs[prev]) * (ys[nxt] - ys) - (ys - ys[prev]) * (xs[nxt] - xs)
+    reflex = np.flatnonzero(turn <= 0)
+
+    def is_ear(i):
+        p, q = prev[i], nxt[i]
+        if turn[i] <= 0:
+            return False
+        a, b, c = points[p], points[i], points[q]
+        candidates = reflex[(reflex != p) & (reflex != i) & (reflex != q)]
+        cx, cy = xs[candidates], ys[candidates]
+        inside = np.ones(len(candidates), dtype=bool)
+        for (ax, ay), (bx, by) in ((a, b), (b, c), (c, a)):
+            inside &= (bx - ax) * (cy - ay) - (by - ay) * (cx - ax) >= 0
+        if not inside.any():
+            return True
+        # **與耳朵頂點重合的橋接點只有在嚴格反射時才擋住**
+        candidates = candidates[inside]
+        corner = np.zeros(len(candidates), dtype=bool)
+        for px, py in (a, b, c):
+            corner |= (xs[candidates] == px) & (ys[candidates] == py)
+        return not np.where(corner, turn[candidates] < 0, True).any()
+
+    def update_turn(j):
+        pj, qj = prev[j], nxt[j]
+        turn[j] = (xs[j] - xs[pj]) * (ys[qj] - ys[j]) - (ys[j] - ys[pj]) * (xs[qj] - xs[j])
+
+    triangles = []
+    remaining = n
+    i = 0
+    stalled = 0
+    while remaining > 3:
+        clip = False
+        if is_ear(i):
+            clip = True
+        elif stalled > remaining:
+            # **退化輸入（自我接觸、共線）找不到耳朵時，強制切掉一個凸頂點以保證結束**
+            j = i
+            for _ in range(remaining):
+                if turn[j] > 0:
+                    break
+                j = nxt[j]
+            i = j
+            clip = True
+
+        if clip:
+            p, q = prev[i], nxt[i]
+            triangles.append((int(p), int(i), int(q)))
+            nxt[p] = q
+            prev[q] = p
+            active[i] = False
+            update_turn(p)
+            update_turn(q)
+            reflex = np.flatnonzero(active & (turn <= 0))
+            remaining -= 1
+            i = q
+            stalled = 0
+        else:
+            i = nxt[i]
+            stalled += 1
+
+    triangles.append((int(prev[i]), int(i), int(nxt[i])))
+    return np.array(triangles, dtype=np.int64)
+
+
+def _insert_touch_points(loops):
+    """
+    頂點剛好落在其他邊上（T 型接觸）時，把該頂點插入那條邊，
+    讓所有接觸都變成共用頂點，之後可在共用頂點處拆分 / 接合
+    """
+    points = np.unique(np.concatenate(loops), axis=0)
+    order = np.argsort(points[:, 0], kind="stable")
+    px, py = points[order, 0], points[order, 1]
+
+    result = []
+    for loop in loops:
+        out = []
+        for a, b in zip(loop, np.roll(loop, -1, axis=0)):
+            out.append(a)
+            lo = np.searchsorted(px, min(a[0], b[0]), side="left")
+            hi = np.searchsorted(px, max(a[0], b[0]), side="right")
+            if hi - lo <= 2:
+                continue
+            cx, cy = px[lo:hi], py[lo:hi]
+            dx, dy = b[0] - a[0], b[1] - a[1]
+            t = ((cx - a[0]) * dx + (cy - a[1]) * dy) / (dx * dx + dy * dy)
+            on_edge = ((cx - a[0]) * dy - (cy - a[1]) * dx == 0) & (t > 0) & (t < 1)
+            if on_edge.any():
+                hits = np.nonzero(on_edge)[0]
+                for k in hits[np.argsort(t[hits])].tolist():
+                    out.append(np.array([cx[k], cy[k]]))
+        result.append(np.array(out, dtype=np.float64))
+    return result
+
+
+def _trace_loops(loops):
+    """
+    重新整理邊界：相反方向的重疊邊互相抵銷（斜向零寬度通道、尖刺、內洞與外輪廓共用的邊），
+    剩下的有向邊在每個頂點取「最左轉」接續，使互相接觸的實體分開、接觸外輪廓的內洞直接接合。
+    :return: 多邊形列表（實體 CCW、內洞 CW）
+    """
+    edges = {}
+    for loop in loops:
+        pts = list(map(tuple, loop.tolist()))
+        for a, b in zip(pts, pts[1:] + pts[:1]):
+            if a == b:
+                continue
+            if edges.get((b, a), 0) > 0:
+                edges[(b, a)] -= 1
+            else:
+                edges[(a, b)] = edges.get((a, b), 0) + 1
+
+    outgoing = {}
+    for (a, b), count in edges.items():
+        outgoing.setdefault(a, []).extend([b] * count)
+
+    def turn(prev, cur, nxt):
+        d_in = (cur[0] - prev[0], cur[1] - prev[1])
+        d_out = (nxt[0] - cur[0], nxt[1] - cur[1])
+        cross = d_in[0] * d_out[1] - d_in[1] * d_out[0]
+        dot = d_in[0] * d_out[0] + d_in[1] * d_out[1]
+        return np.arctan2(cross, dot) if nxt != prev else -np.inf
+
+    result = []
+    for start in list(outgoing):
+        while outgoing.get(start):
+            loop = [start]
+            prev, cur = start, outgoing[start].pop()
+            while cur != start:
+                loop.append(cur)
+                candidates = outgoing[cur]
+                k = max(range(len(candidates)), key=lambda i: turn(prev, cur, candidates[i]))
+                prev, cur = cur, candidates.pop(k)
+            if len(loop) >= 3:
+                result.append(np.array(loop, dtype=np.float64))
+    return result
+
+
+def _point_in_polygon(point, polygon):
+    """奇偶規則判斷點是否在多邊形內（不含邊上）"""
+    px, py = point
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    crosses = (a[:, 1] > py) != (b[:, 1] > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xi = a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return int(np.count_nonzero(crosses & (px < xi))) % 2 == 1
+
+
+def _interior_point(loop):
+    """取一個嚴格落在簡單多邊形內部的點"""
+    n = len(loop)
+    v = int(np.argmin(loop[:, 0] * 1e6 + loop[:, 1]))  # **最左（再最上）點必為凸頂點**
+    a, b, c = loop[v - 1], loop[v], loop[(v + 1) % n]
+
+    tri = (a, b, c) if _cross(a, b, c) > 0 else (a, c, b)
+    inside = np.ones(n, dtype=bool)
+    for (ax, ay), (bx, by) in zip(tri, tri[1:] + tri[:1]):
+        inside &= (bx - ax) * (loop[:, 1] - ay) - (by - ay) * (loop[:, 0] - ax) > 0
+    if not inside.any():
+        return (a + b + c) / 3
+
+    # **三角形內有其他頂點：取離 v 最近者與 v 的中點**
+    idx = np.nonzero(inside)[0]
+    d = np.sum((loop[idx] - b) ** 2, axis=1)
+    return (b + loop[idx[int(np.argmin(d))]]) / 2
+
+
+def _polygon_groups(outer, holes):
+    """
+    將外輪廓與內洞拆成簡單多邊形後重新分組
+    :return: [(外輪廓 CCW, [內洞 CW])]
+    """
+    loops = [outer if signed_area(outer) > 0 else outer[::-1]]
+    loops += [h if signed_area(h) < 0 else h[::-1] for h in holes]
+
+    solids, cavities = [], []
+    for piece in _trace_loops(_insert_touch_points(loops)):
+        area = signed_area(piece)
+        if area > 0:
+            solids.append(piece)
+        elif area < 0:
+            cavities.append(piece)
+
+    groups = [(solid, []) for solid in solids]
+    areas = [signed_area(solid) for solid in solids]
+    order = np.argsort(areas)  # **由小到大，內洞歸給最小的包含者**
+    for cavity in cavities:
+        point = _interior_point(cavity)
+        for k in order.tolist():
+            if _point_in_polygon(point, solids[k]):
+                groups[k][1].append(cavity)
+                break
+    return groups
+
+
+def triangulate_polygon(outer, holes):
+    """
+    三角剖分帶內洞的多邊形（外輪廓 CCW、內洞 CW 的簡單多邊形）
+    :param outer: 外輪廓 (N, 2)
+    :param holes: 內洞列表 [(K, 2)]
+    :return: (vertices (V, 2), triangles (M, 3))，三角形為 CCW
+    """
+    if len(outer) < 3:
+        return np.empty((0, 2)), np.empty((0, 3), dtype=np.int64)
+
+    polygon = outer
+    polygon_points = set(map(tuple, outer.tolist()))
+
+    # **依最右點由右到左依序橋接；與目前多邊形接觸的內洞優先在接觸點接合**
+    remaining = sorted(holes, key=lambda h: -float(np.max(h[:, 0])))
+    hole_points = [set(map(tuple, h.tolist())) for h in remaining]
+    while remaining:
+        k = next((i for i, pts in enumerate(hole_points) if not pts.isdisjoint(polygon_points)), None)
+        if k is not None:
+            # **零長度接合可能留下原路折返的尖刺**
+            merged = _bridge_touching(polygon, remaining[k], polygon_points)
+            merged = _remove_spikes(merged) if merged is not None else None
+        else:
+            k = 0
+            merged = _bridge_hole(polygon, remaining[0])
+        remaining.pop(k)
+        polygon_points |= hole_points.pop(k)
+        if merged is not None:
+            polygon = merged
+
+    return polygon, _ear_clip(polygon)
+
+
+def extrude_polygon(outer_contour, hole_contours, z_height, fill_base=True, fill_top=True):
+    """
+    精確拉伸帶內洞的輪廓：頂 / 底面以三角剖分封面，側牆直接沿輪廓邊生成。
+    三角形數量只與頂點數有關，與面積無關。方向與體素立方體相同 (CCW 朝外)。
+    :return: (N, 3, 3) float32
+    """
+    outer = clean_loop(outer_contour)
+    if len(outer) < 3:
+        return np.empty((0, 3, 3), dtype=np.float32)
+    holes = [h for h in (clean_loop(c) for c in hole_contours) if len(h) >= 3]
+
+    faces = []
+
+    def point(xy, z):
+        return (float(xy[0]), float(xy[1]), z)
+
+    for solid, cavities in _polygon_groups(outer, holes):
+        vertices, triangles = triangulate_polygon(solid, cavities)
+
+        # **封頂 / 封底**
+        for i, j, k in triangles.tolist():
+            a, b, c = vertices[i], vertices[j], vertices[k]
+            if fill_top:
+                faces.append([point(a, z_height), point(b, z_height), point(c, z_height)])
+            if fill_base:
+                faces.append([point(a, 0), point(c, 0), point(b, 0)])
+
+        # **側牆：外輪廓 CCW、內洞 CW，實體都在行進方向左側**
+        for loop in [solid] + cavities:
+            for a, b in zip(loop, np.roll(loop, -1, axis=0)):
+                a0, b0 = point(a, 0), point(b, 0)
+                a1, b1 = point(a, z_height), point(b, z_height)
+                faces.append([a0, b0, b1])
+                faces.append([a0, b1, a1])
+
+    return np.array(faces, dtype=np.float32).reshape(-1, 3, 3)
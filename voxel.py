@@ -0,0 +1,325 @@
+"""棋盤格體素化：將輪廓（含內洞）轉為格點佔據表"""
+from itertools import groupby
+
+import cv2
+import numpy as np
+
+_SHIFT = 4  # **fillPoly / polylines 的小數位數（固定點 1/16 格）**
+_BAND_THICKNESS = 5  # **邊界帶寬度（格），帶內的格點改用精確測試**
+
+
+def _grid_shape(x_min, y_min, x_max, y_max, grid_size):
+    """與 range(min, max, grid_size) 相同的格數"""
+    nx = max(0, -(-(x_max - x_min) // grid_size))
+    ny = max(0, -(-(y_max - y_min) // grid_size))
+    return int(ny), int(nx)
+
+
+def _to_cell_space(contour, x0, y0, grid_size):
+    """把像素座標轉為「格中心 = 整數格點」的固定點座標"""
+    pts = contour.reshape(-1, 2).astype(np.float64)
+    pts[:, 0] = (pts[:, 0] - x0 - grid_size / 2) / grid_size
+    pts[:, 1] = (pts[:, 1] - y0 - grid_size / 2) / grid_size
+    return np.round(pts * (1 << _SHIFT)).astype(np.int32).reshape(-1, 1, 2)
+
+
+def _polygon_mask(contour, x0, y0, grid_size, shape):
+    """
+    回傳每個格中心是否落在 contour 內（含邊上），結果與 cv2.pointPolygonTest >= 0 一致。
+    先以 fillPoly 在格點解析度一次填滿，再只對邊界帶內的格點做精確測試。
+    """
+    ny, nx = shape
+    pts = _to_cell_space(contour, x0, y0, grid_size)
+
+    inside = np.zeros(shape, dtype=np.uint8)
+    cv2.fillPoly(inside, [pts], 1, lineType=cv2.LINE_8, shift=_SHIFT)
+
+    band = np.zeros(shape, dtype=np.uint8)
+    cv2.polylines(band, [pts], True, 1, thickness=_BAND_THICKNESS, lineType=cv2.LINE_8, shift=_SHIFT)
+
+    # **邊界附近 fillPoly 可能差一格，改用 pointPolygonTest 精確判斷**
+    rows, cols = np.nonzero(band)
+    for r, c in zip(rows.tolist(), cols.tolist()):
+        center = (x0 + c * grid_size + grid_size / 2, y0 + r * grid_size + grid_size / 2)
+        inside[r, c] = cv2.pointPolygonTest(contour, center, measureDist=False) >= 0
+
+    return inside.astype(bool)
+
+
+def contour_occupancy(outer_contour, hole_contours, grid_size):
+    """
+    計算輪廓（扣除內洞）的棋盤格佔據表
+    :param outer_contour: 外輪廓 (N, 1, 2)
+    :param hole_contours: 內洞輪廓列表
+    :param grid_size: 棋盤格大小（像素）
+    :return: (x_min, y_min, occupancy)，occupancy[row, col] 對應方格 (x_min + col * grid_size, y_min + row * grid_size)
+    """
+    x_min, y_min = (int(v) for v in np.min(outer_contour[:, 0, :], axis=0))
+    x_max, y_max = (int(v) for v in np.max(outer_contour[:, 0, :], axis=0))
+    shape = _grid_shape(x_min, y_min, x_max, y_max, grid_size)
+
+    if shape[0] == 0 or shape[1] == 0:
+        return x_min, y_min, np.zeros(shape, dtype=bool)
+
+    occupancy = _polygon_mask(outer_contour, x_min, y_min, grid_size, shape)
+
+    # **每個內洞只處理自己的外框範圍**
+    for hole in hole_contours:
+        hx_min, hy_min = np.min(hole[:, 0, :], axis=0)
+        hx_max, hy_max = np.max(hole[:, 0, :], axis=0)
+        c0 = max(0, int((hx_min - x_min) // grid_size) - 1)
+        r0 = max(0, int((hy_min - y_min) // grid_size) - 1)
+        c1 = min(shape[1], int((hx_max - x_min) // grid_size) + 2)
+        r1 = min(shape[0], int((hy_max - y_min) // grid_size) + 2)
+        if c0 >= c1 or r0 >= r1:
+            continue
+
+        sub_x0 = x_min + c0 * grid_size
+        sub_y0 = y_min + r0 * grid_size
+        in_hole = _polygon_mask(hole, sub_x0, sub_y0, grid_size, (r1 - r0, c1 - c0))
+        occupancy[r0:r1, c0:c1] &= ~in_hole
+
+    return x_min, y_min, occupancy
+
+
+# **單位立方體的 12 個三角形（所有面 CCW 朝外）**
+_P = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]
+_CUBE_FACES = np.array([
+    [_P[0], _P[2], _P[1]], [_P[0], _P[3], _P[2]],  # **底部 (XY 平面)**
+    [_P[4], _P[5], _P[6]], [_P[4], _P[6], _P[7]],  # **頂部 (XY 平面)**
+    [_P[0], _P[1], _P[5]], [_P[0], _P[5], _P[4]],  # **前面**
+    [_P[1], _P[2], _P[6]], [_P[1], _P[6], _P[5]],  # **右側**
+    [_P[2], _P[3], _P[7]], [_P[2], _P[7], _P[6]],  # **後面**
+    [_P[3], _P[0], _P[4]], [_P[3], _P[4], _P[7]],  # **左側**
+], dtype=np.float32)
+
+
+def cube_mesh(x_min, y_min, occupancy, grid_size, z_height):
+    """
+    為每個被佔據的方格建立立方體（一次以廣播產生全部面片）
+    :return: (N * 12, 3, 3) float32，方格順序以 x 為外層
+    """
+    cols, rows = np.nonzero(occupancy.T)
+    origins = np.zeros((len(cols), 1, 1, 3), dtype=np.float32)
+    origins[:, 0, 0, 0] = x_min + cols * grid_size
+    origins[:, 0, 0, 1] = y_min + rows * grid_size
+    scale = np.array([grid_size, grid_size, z_height], dtype=np.float32)
+    return (origins + _CUBE_FACES * scale).reshape(-1, 3, 3)
+
+
+def quadtree_depth(grid_size, min_cell_size):
+    """
+    四分樹層數：最上層格子 grid_size 最多能對半切幾次而不小於 min_cell_size
+    （grid_size 本身就小於 min_cell_size 時不細分）
+    """
+    if min_cell_size <= 0:
+        raise ValueError(f"min_cell_size must be positive: {min_cell_size}")
+    # **除以 2 的次方是精確的，逐層比較避免 log2 的捨入誤差**
+    depth = 0
+    while grid_size / (1 << (depth + 1)) >= min_cell_size:
+        depth += 1
+    return depth
+
+
+def quadtree_cells(occupancy, depth):
+    """
+    由下而上合併細格佔據表：2x2 子格全滿的格子往上合併，最上層為 2 ** depth 個細格
+    :param occupancy: 最細層的佔據表
+    :return: (cols, rows, spans)，以細格為單位的左上角與邊長，由大到小、同一層以 x 為外層
+    """
+    step = 1 << depth
+    ny, nx = occupancy.shape
+    full = np.zeros((-(-ny // step) * step, -(-nx // step) * step), dtype=bool)
+    full[:ny, :nx] = occupancy
+
+    levels = [full]
+    for _ in range(depth):
+        h, w = levels[-1].shape
+        levels.append(levels[-1].reshape(h // 2, 2, w // 2, 2).all(axis=(1, 3)))
+
+    cols, rows, spans = [], [], []
+    parent = np.zeros_like(levels[-1])
+    for k in range(depth, -1, -1):
+        # **父格已經是整塊的就不再輸出子格**
+        leaves = levels[k] & ~parent
+        c, r = np.nonzero(leaves.T)
+        cols.append(c << k)
+        rows.append(r << k)
+        spans.append(np.full(len(c), 1 << k))
+        parent = (levels[k] | parent).repeat(2, axis=0).repeat(2, axis=1)
+    return np.concatenate(cols), np.concatenate(rows), np.concatenate(spans)
+
+
+def quadtree_mesh(x_min, y_min, occupancy, cell_size, depth, z_height):
+    """
+    自適應四分樹體素：內部用大方格，只有跨越外輪廓或內洞邊界的格子細分到 cell_size，
+    佔據範圍與 cell_size 的均勻棋盤格完全相同
+    :param occupancy: cell_size 細格的佔據表
+    :return: (N * 12, 3, 3) float32
+    """
+    cols, rows, spans = quadtree_cells(occupancy, depth)
+    origins = np.zeros((len(cols), 1, 1, 3), dtype=np.float32)
+    origins[:, 0, 0, 0] = x_min + cols * cell_size
+    origins[:, 0, 0, 1] = y_min + rows * cell_size
+    scale = np.zeros((len(cols), 1, 1, 3), dtype=np.float32)
+    scale[:, 0, 0, 0] = scale[:, 0, 0, 1] = spans * cell_size
+    scale[:, 0, 0, 2] = z_height
+    return (origins + _CUBE_FACES * scale).reshape(-1, 3, 3)
+
+
+def _runs(mask):
+    """回傳 2D 布林陣列每一列中連續 True 的區段 (row, start, end)，end 不含"""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    diff = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(diff == 1)
+    _, ends = np.nonzero(diff == -1)
+    return zip(start_rows.tolist(), starts.tolist(), ends.tolist())
+
+
+def _merge_rectangles(occupancy):
+    """
+    貪婪合併：將每列的連續區段往下延伸成矩形（下一列有完全相同的區段才延伸）
+    :return: [(col0, row0, col1, row1)]，col1 / row1 不含
+    """
+    rects = []
+    open_runs = {}  # {(start, end): 起始列}
+    prev_row = -2
+
+    for row, group in groupby(_runs(occupancy), key=lambda run: run[0]):
+        runs = {(start, end) for _, start, end in group}
+
+        # **上一列的區段若沒有延續到這一列，就結束成矩形**
+        for key in list(open_runs):
+            if row != prev_row + 1 or key not in runs:
+                rects.append((key[0], open_runs.pop(key), key[1], prev_row + 1))
+
+        for key in runs:
+            open_runs.setdefault(key, row)
+        prev_row = row
+
+    for key, row0 in open_runs.items():
+        rects.append((key[0], row0, key[1], prev_row + 1))
+    return rects
+
+
+def _split_points(lookup, line, lo, hi):
+    """找出落在線段 (lo, hi) 之間的所有頂點座標（不含端點）"""
+    values = lookup.get(line)
+    if values is None:
+        return []
+    i = np.searchsorted(values, lo, side="right")
+    j = np.searchsorted(values, hi, side="left")
+    return values[i:j].tolist()
+
+
+def _cap_triangles(boundary, z, up):
+    """矩形封面：沒有 T 型接點時輸出 2 個三角形，否則由中心點扇形展開"""
+    if len(boundary) == 4:
+        p0, p1, p2, p3 = [(x, y, z) for x, y in boundary]
+        tris = [[p0, p1, p2], [p0, p2, p3]]
+    else:
+        cx = (boundary[0][0] + boundary[2][0]) / 2
+        cy = (boundary[0][1] + boundary[2][1]) / 2
+        center = (cx, cy, z)
+        pts = [(x, y, z) for x, y in boundary]
+        tris = [[center, pts[i], pts[(i + 1) % len(pts)]] for i in range(len(pts))]
+    if not up:
+        tris = [[a, c, b] for a, b, c in tris]
+    return tris
+
+
+def _wall_triangles(points, z_height):
+    """沿著 points（已排序、依朝外方向）拉出垂直牆面"""
+    tris = []
+    for (ux, uy), (vx, vy) in zip(points[:-1], points[1:]):
+        u0, v0 = (ux, uy, 0), (vx, vy, 0)
+        u1, v1 = (ux, uy, z_height), (vx, vy, z_height)
+        tris.append([u0, v0, v1])
+        tris.append([u0, v1, u1])
+    return tris
+
+
+def surface_mesh(x_min, y_min, occupancy, grid_size, z_height):
+    """
+    只輸出佔據表的外表面（內部共用面全部剔除），
+    頂面 / 底面以貪婪合併成大矩形，側牆合併成整段長牆。
+    所有面在 T 型接點處切分，輸出為封閉（watertight）網格，方向與 cube_mesh 相同 (CCW 朝外)。
+    :return: (N, 3, 3) float32
+    """
+    if not occupancy.any():
+        return np.empty((0, 3, 3), dtype=np.float32)
+
+    g = grid_size
+    occ = occupancy.astype(bool)
+    padded = np.pad(occ, 1)
+
+    # **水平牆（沿 x 方向）：第 k 條格線介於第 k-1 列與第 k 列之間**
+    above = padded[1:, 1:-1]  # 第 k 列
+    below = padded[:-1, 1:-1]  # 第 k-1 列
+    walls_neg_y = list(_runs(above & ~below))  # 朝 -y
+    walls_pos_y = list(_runs(below & ~above))  # 朝 +y
+
+    # **垂直牆（沿 y 方向）：轉置後同樣處理**
+    right = padded[1:-1, 1:].T  # 第 k 行
+    left = padded[1:-1, :-1].T  # 第 k-1 行
+    walls_neg_x = list(_runs(right & ~left))  # 朝 -x
+    walls_pos_x = list(_runs(left & ~right))  # 朝 +x
+
+    rects = _merge_rectangles(occ)
+
+    # **收集所有頂點（格點座標），用來切分 T 型接點**
+    by_row, by_col = {}, {}
+
+    def add_vertex(col, row):
+        by_row.setdefault(row, set()).add(col)
+        by_col.setdefault(col, set()).add(row)
+
+    for c0, r0, c1, r1 in rects:
+        for col, row in ((c0, r0), (c1, r0), (c1, r1), (c0, r1)):
+            add_vertex(col, row)
+    for line, start, end in walls_neg_y + walls_pos_y:
+        add_vertex(start, line)
+        add_vertex(end, line)
+    for line, start, end in walls_neg_x + walls_pos_x:
+        add_vertex(line, start)
+        add_vertex(line, end)
+
+    by_row = {k: np.array(sorted(v)) for k, v in by_row.items()}
+    by_col = {k: np.array(sorted(v)) for k, v in by_col.items()}
+
+    def to_xy(col, row):
+        return (x_min + col * g, y_min + row * g)
+
+    faces = []
+
+    # **頂面與底面**
+    for c0, r0, c1, r1 in rects:
+        boundary = [(c0, r0)]
+        boundary += [(c, r0) for c in _split_points(by_row, r0, c0, c1)]
+        boundary.append((c1, r0))
+        boundary += [(c1, r) for r in _split_points(by_col, c1, r0, r1)]
+        boundary.append((c1, r1))
+        boundary += [(c, r1) for c in reversed(_split_points(by_row, r1, c0, c1))]
+        boundary.append((c0, r1))
+        boundary += [(c0, r) for r in reversed(_split_points(by_col, c0, r0, r1))]
+
+        boundary = [to_xy(c, r) for c, r in boundary]
+        faces.extend(_cap_triangles(boundary, z_height, up=True))
+        faces.extend(_cap_triangles(boundary, 0, up=False))
+
+    # **側牆：依朝外方向排序頂點後拉伸**
+    for line, start, end in walls_neg_y:
+        cols = [start] + _split_points(by_row, line, start, end) + [end]
+        faces.extend(_wall_triangles([to_xy(c, line) for c in cols], z_height))
+    for line, start, end in walls_pos_y:
+        cols = [start] + _split_points(by_row, line, start, end) + [end]
+        faces.extend(_wall_triangles([to_xy(c, line) for c in reversed(cols)], z_height))
+    for line, start, end in walls_pos_x:
+        rows = [start] + _split_points(by_col, line, start, end) + [end]
+        faces.extend(_wall_triangles([to_xy(line, r) for r in rows], z_height))
+    for line, start, end in walls_neg_x:
+        rows = [start] + _split_points(by_col, line, start, end) + [end]
+        faces.extend(_wall_triangles([to_xy(line, r) for r in reversed(rows)], z_height))
+
+    return np.array(faces, dtype=np.float32).reshape(-1, 3, 3)
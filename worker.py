@@ -0,0 +1,75 @@
+"""背景處理執行緒：請求只保留最新一筆，過期的結果直接丟棄"""
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class LatestJobWorker(QThread):
+    """
+    單一背景執行緒，一次只做一個工作：
+    連續送出的請求會互相覆蓋，做完時若已有更新的請求，舊結果就不送回 UI
+    """
+
+    result_ready = pyqtSignal(int, object)  # (generation, 結果)
+    job_failed = pyqtSignal(int, str)  # (generation, 錯誤訊息)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = None  # (generation, fn, args, kwargs)
+        self._generation = 0
+        self._stopping = False
+
+    @property
+    def generation(self):
+        """最新請求的編號，結果的編號不等於它就是過期的"""
+        return self._generation
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        排入工作（覆蓋尚未開始的舊請求）
+        :return: 這次請求的 generation
+        """
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, fn, args, kwargs)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """作廢所有尚未送回的結果（例如 UI 已經同步算好最新結果）"""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def is_stale(self, generation):
+        return generation != self._generation
+
+    def stop(self):
+        """結束執行緒並等待目前的工作做完"""
+        with self._condition:
+            self._stopping = True
+            self._pending = None
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                generation, fn, args, kwargs = self._pending
+                self._pending = None
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self.is_stale(generation):
+                    self.job_failed.emit(generation, f"{type(e).__name__}: {e}")
+                continue
+
+            # **做完時已有更新的請求就不送回，避免 UI 處理過期的結果**
+            if not self.is_stale(generation):
+                self.result_ready.emit(generation, result)